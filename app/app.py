@@ -4,15 +4,17 @@ import shutil
 from typing import Optional
 import utils
 import web_cli
-from extract_text import ExtractText
-from flask import Flask, render_template, request, send_file, redirect
+from extract_text import ExtractText, get_capture_pool, get_capture_job_manager
+from capture_jobs import CaptureQueueFullError, format_server_sent_event
+from chunked_upload import UploadOffsetError, UploadSession
+from video_streaming import send_video
+from flask import Flask, Response, abort, render_template, request, redirect, stream_with_context
+from werkzeug.security import safe_join
 import html
 import glob
 
 # Initialise flask app
 app = Flask(__name__, static_url_path='/static', static_folder='static')
-# Current video
-filename: Optional[str] = None
 # Flag to check if the search process should be canceled
 cancel_search_flag: bool = False
 
@@ -31,13 +33,16 @@ def utility_processor():
 @app.route("/")
 def index():
     """
-    Return the home page view/template with setup progress and parsed video data
+    Return the home page view/template with setup progress, the videos in progress and one page of the video library,
+    sorted and filtered by the page, sort, filter and q query parameters
     :return: Rendered template for home page
     """
-    parsed_video_data = utils.parse_video_data()
-    return render_template("index.html",
-                           continue_watching=parsed_video_data["continue_watching"],
-                           all_videos=parsed_video_data["all_videos"], setup_progress=utils.get_setup_progress())
+    library_filter = {"sort": request.args.get("sort", "recent"), "filter": request.args.get("filter", "all"),
+                      "q": request.args.get("q", "").strip()}
+    library = utils.get_library_page(request.args.get("page", 1, type=int), library_filter["sort"],
+                                     library_filter["filter"] == "in_progress", library_filter["q"])
+    return render_template("index.html", continue_watching=utils.get_continue_watching(), library=library,
+                           library_filter=library_filter, setup_progress=utils.get_setup_progress())
 
 
 @app.route("/settings")
@@ -94,17 +99,31 @@ def upload():
     :return: Rendered template for upload page
     """
     return render_template("upload.html",
-                           use_youtube_downloader=eval(utils.config("Features", "use_youtube_downloader")))
+                           use_youtube_downloader=eval(utils.config("Features", "use_youtube_downloader")),
+                           upload_chunk_size=int(utils.config("Upload", "chunk_size_mb", fallback="8")) * 1024 * 1024)
 
 
-@app.route("/videos")
-def serve_video():
+@app.route("/videos", defaults={"video_filename": None})
+@app.route("/videos/<path:video_filename>")
+def serve_video(video_filename: Optional[str]):
     """
-    Serve local/downloaded video file to view/template
-    :return: Video file
+    Serve local/downloaded video file to view/template, with byte ranges for seeking and the video hash as ETag so
+    browsers revalidate cached videos instead of downloading them again
+    :param video_filename: Filename of the video, read from the "filename" query parameter if not in the path
+    :return: Video file, part of it for a Range request or 304 Not Modified
     """
-    video_path = f'{utils.get_vid_save_path()}{filename}'
-    return send_file(video_path)
+    video_filename = video_filename or request.args.get("filename")
+    video_path = safe_join(utils.get_vid_save_path(), video_filename) if video_filename else None
+    if video_path is None or not os.path.isfile(video_path):
+        abort(404)
+    video_hash = utils.get_video_hash(video_filename)
+    max_age = int(utils.config("VideoServing", "cache_max_age", fallback="3600"))
+    if video_hash is not None and not utils.verify_video_file(video_filename):
+        # The file changed since it was added, so its hash is stale and cannot be used as ETag
+        logging.warning(f"{video_filename} does not match the video it was added to the library as")
+        video_hash, max_age = None, 0
+    return send_video(request, video_path, etag=video_hash, max_age=max_age,
+                      block_size=int(utils.config("VideoServing", "send_block_size_kb", fallback="1024")) * 1024)
 
 
 @app.route("/upload/youtube/<video_id>")
@@ -115,17 +134,108 @@ def upload_youtube_id(video_id: str):
     :return: Redirect to appropriate page after downloading or failing
     """
     youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-    return redirect(utils.download_youtube_video(youtube_url))
+    redirect_url = utils.download_youtube_video(youtube_url, on_hashed=ExtractText.start_pre_ocr)
+    return redirect(start_pre_ocr_after_download(redirect_url))
+
+
+def requested_video(data: dict) -> Optional[str]:
+    """
+    Get the video an ajax request from the player is for. Each request names its video, so players of different
+    videos can share the server, including threaded and multi-process deployments.
+    :param data: Json body of the request
+    :return: Filename of the video or None if the request does not name a video in user data storage
+    """
+    video_filename = data.get("filename")
+    if not isinstance(video_filename, str) or not utils.filename_exists_in_userdata(video_filename):
+        logging.error(f"Request for unknown video {video_filename}")
+        return None
+    return video_filename
+
+
+def unknown_video_response() -> tuple:
+    return {"status": "invalid", "error": "The request must name a video in the library"}, 400
 
 
 @app.route('/capture_at_timestamp', methods=['POST'])
 def capture_at_timestamp():
     """
-    Ajax endpoint for capturing code at current timestamp
-    :return: Extracted and formatted code from timestamp
+    Ajax endpoint for capturing code at current timestamp. The capture runs in the background and its job id is
+    returned, each stage is streamed from /capture_jobs/<job_id>/events. If "wait" is true the request waits for the
+    formatted code instead.
+    :return: Dict containing the job id and status, or extracted and formatted code from timestamp
+    """
+    data = request.get_json()
+    video_filename = requested_video(data)
+    if video_filename is None:
+        return unknown_video_response()
+    if data.get("wait", False):
+        return ExtractText.extract_code_at_timestamp(video_filename, data.get('timestamp'))
+    try:
+        return ExtractText.submit_capture(video_filename, data.get('timestamp')).to_dict()
+    except CaptureQueueFullError as error:
+        logging.error(error)
+        return {"status": "busy", "error": "Too many captures in progress, try again shortly"}, 503
+
+
+@app.route('/capture_range', methods=['POST'])
+def capture_range():
+    """
+    Ajax endpoint for capturing code at many timestamps, given as a list of "timestamps" or a range from "start" to
+    "end" every "step" seconds. The captures run in the background as one job and its job id is returned, each capture
+    is streamed from /capture_jobs/<job_id>/events in timestamp order. If "wait" is true the request waits for every
+    capture instead.
+    :return: Dict containing the job id and status, or dict containing the list of captures
     """
     data = request.get_json()
-    return ExtractText.extract_code_at_timestamp(f"{filename}", data.get('timestamp'))
+    video_filename = requested_video(data)
+    if video_filename is None:
+        return unknown_video_response()
+    try:
+        if "timestamps" in data:
+            timestamps = [float(timestamp) for timestamp in data["timestamps"]]
+            ExtractText.check_batch_size(len(timestamps))
+            if min(timestamps) < 0:
+                raise ValueError("Timestamps must not be negative")
+        else:
+            timestamps = ExtractText.range_timestamps(float(data["start"]), float(data["end"]),
+                                                      float(data.get("step", 1)))
+    except (KeyError, TypeError, ValueError) as error:
+        return {"status": "invalid", "error": str(error)}, 400
+    if data.get("wait", False):
+        return {"captures": ExtractText.extract_code_at_timestamps(video_filename, timestamps)}
+    try:
+        return ExtractText.submit_capture_range(video_filename, timestamps).to_dict()
+    except CaptureQueueFullError as error:
+        logging.error(error)
+        return {"status": "busy", "error": "Too many captures in progress, try again shortly"}, 503
+
+
+@app.route("/capture_jobs/<job_id>")
+def capture_job(job_id):
+    """
+    Ajax endpoint for polling a capture job
+    :param job_id: Job id returned by /capture_at_timestamp or /capture_range
+    :return: Dict containing the job status, the data of each completed stage and the result once complete
+    """
+    job = get_capture_job_manager().get_job(job_id)
+    if job is None:
+        return {"status": "unknown"}, 404
+    return job.to_dict()
+
+
+@app.route("/capture_jobs/<job_id>/events")
+def capture_job_events(job_id):
+    """
+    Server-Sent Events stream of a capture job, sends an event for each stage (frame, raw_ocr, formatted, or capture
+    and captures for a capture range) as it completes followed by a done event
+    :param job_id: Job id returned by /capture_at_timestamp or /capture_range
+    :return: Event stream response
+    """
+    job = get_capture_job_manager().get_job(job_id)
+    if job is None:
+        return {"status": "unknown"}, 404
+    return Response(stream_with_context(format_server_sent_event(event) for event in job.stream()),
+                    mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.route("/send_to_ide", methods=["POST"])
@@ -134,9 +244,12 @@ def send_to_ide():
     Ajax endpoint for sending code snippet to IDE
     :return: String indicating success or failure
     """
-    code = request.get_json().get("code_snippet")
-    unescaped_code = html.unescape(code)
-    if utils.send_code_snippet_to_ide(filename, unescaped_code):
+    data = request.get_json()
+    video_filename = requested_video(data)
+    if video_filename is None:
+        return "fail"
+    unescaped_code = html.unescape(data.get("code_snippet"))
+    if utils.send_code_snippet_to_ide(video_filename, unescaped_code):
         return "success"
     else:
         return "fail"
@@ -149,11 +262,14 @@ def update_video_data():
     :return: String indicating success or failure
     """
     data = request.get_json()
+    video_filename = requested_video(data)
+    if video_filename is None:
+        return unknown_video_response()
     if "progress" in data:
-        utils.update_user_video_data(filename, progress=data["progress"])
+        utils.update_user_video_data(video_filename, progress=data["progress"])
         return "success"
     elif "capture" in data:
-        utils.update_user_video_data(filename, capture=data["capture"])
+        utils.update_user_video_data(video_filename, capture=data["capture"])
         return "success"
     else:
         logging.error("No compatible data type to update")
@@ -172,38 +288,204 @@ def upload_video():
     if file:
         if not os.path.exists(f"{utils.get_vid_save_path()}"):
             os.makedirs(f"{utils.get_vid_save_path()}")
+        # Release any pooled decoder still holding a previous file with the same name
+        get_capture_pool().discard(f"{utils.get_vid_save_path()}{file.filename}")
         file.save(f"{utils.get_vid_save_path()}" + file.filename)
-        global filename
-        filename = file.filename
-        file_hash = utils.hash_video_file(filename)
-        if utils.file_already_exists(file_hash):
-            return redirect(f"/play_video/{filename}")
-        video_title = request.form.get("videoTitle")
-        if video_title:
-            utils.add_video_to_user_data(filename, video_title, file_hash)
-        else:
-            utils.add_video_to_user_data(filename, filename, file_hash)
-        return redirect(f"/play_video/{filename}")
+        play_filename = utils.add_local_video(file.filename, request.form.get("videoTitle") or file.filename,
+                                              on_hashed=ExtractText.start_pre_ocr)
+        ExtractText.start_pre_ocr(play_filename)
+        return redirect(f"/play_video/{play_filename}")
     elif youtube_url:
-        return redirect(utils.download_youtube_video(youtube_url))
+        redirect_url = utils.download_youtube_video(youtube_url, on_hashed=ExtractText.start_pre_ocr)
+        return redirect(start_pre_ocr_after_download(redirect_url))
     logging.error("Failed to upload video file")
     return redirect("/upload")
 
 
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """
+    Ajax endpoint starting a chunked upload of a local video, the chunks are then sent to /uploads/<upload_id>
+    :return: Dict containing the upload id, the offset to send the first chunk from and the size of the video
+    """
+    data = request.get_json()
+    try:
+        session = utils.upload_manager.create(os.path.basename(data["filename"]), int(data["size"]),
+                                              data.get("title") or None, utils.get_hash_algorithm())
+    except (KeyError, TypeError, ValueError) as error:
+        return {"status": "invalid", "error": str(error)}, 400
+    return upload_status(session), 201
+
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    """
+    Ajax endpoint reporting how much of a chunked upload has been received, used to resume an interrupted upload
+    :param upload_id: Upload id returned by /uploads
+    :return: Dict containing the upload id, the offset to resume from and the size of the video
+    """
+    session = utils.upload_manager.get(upload_id)
+    if session is None:
+        return {"status": "unknown"}, 404
+    return upload_status(session)
+
+
+@app.route("/uploads/<upload_id>", methods=["PATCH"])
+def upload_chunk(upload_id):
+    """
+    Ajax endpoint receiving a chunk of a chunked upload, the request body is the chunk and the Upload-Offset header
+    the byte offset it starts at. Once the last chunk is received the video is added to the library, unless a video
+    with the same hash already exists.
+    :param upload_id: Upload id returned by /uploads
+    :return: Dict containing the offset to send the next chunk from, or the page to open once the upload is complete
+    """
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+        session = utils.upload_manager.write_chunk(upload_id, offset, request.stream, request.content_length)
+    except KeyError:
+        return {"status": "unknown"}, 404
+    except UploadOffsetError as error:
+        return {"status": "conflict", "offset": error.offset}, 409
+    except ValueError as error:
+        return {"status": "invalid", "error": str(error)}, 400
+    if not session.complete:
+        return upload_status(session)
+    return finish_upload(session)
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id):
+    """
+    Ajax endpoint cancelling a chunked upload
+    :param upload_id: Upload id returned by /uploads
+    :return: String indicating success
+    """
+    utils.upload_manager.cancel(upload_id)
+    return "success"
+
+
+def upload_status(session: UploadSession) -> dict:
+    """
+    Progress of a chunked upload for upload endpoints
+    :param session: Upload to report on
+    :return: Dict containing the upload id, status, offset and size
+    """
+    return {"upload_id": session.upload_id, "status": "complete" if session.complete else "uploading",
+            "offset": session.received, "size": session.size}
+
+
+def finish_upload(session: UploadSession) -> dict:
+    """
+    Add a fully received upload to the library. The hash was computed while the chunks were received, so a duplicate
+    of a video already in the library is discarded without being moved into the video directory.
+    :param session: Complete upload
+    :return: Dict containing the status (complete or duplicate) and the page to open, or the error if the video could
+    not be saved
+    """
+    video_hash = session.digest()
+    existing_filename = utils.get_user_data_store().filename_for_hash(video_hash)
+    if existing_filename is not None:
+        logging.info(f"Discarded upload of {session.filename}, it is a duplicate of {existing_filename}")
+        utils.upload_manager.cancel(session.upload_id)
+        return {"status": "duplicate", "redirect": f"/play_video/{existing_filename}"}
+    # Release any pooled decoder still holding a previous file with the same name
+    get_capture_pool().discard(f"{utils.get_vid_save_path()}{session.filename}")
+    try:
+        os.makedirs(utils.get_vid_save_path(), exist_ok=True)
+        utils.upload_manager.finish(session.upload_id, f"{utils.get_vid_save_path()}{session.filename}")
+    except OSError as error:
+        logging.error(f"Failed to move upload of {session.filename} to the video directory: {error}")
+        return {"status": "failed", "error": "The video could not be saved to the video directory"}, 500
+    play_filename = utils.add_local_video(session.filename, session.title or session.filename,
+                                          full_hash=video_hash)
+    ExtractText.start_pre_ocr(play_filename)
+    return {"status": "complete" if play_filename == session.filename else "duplicate",
+            "redirect": f"/play_video/{play_filename}"}
+
+
+def start_pre_ocr_after_download(redirect_url: str) -> str:
+    """
+    Start pre-OCR of a downloaded YouTube video
+    :param redirect_url: App url returned by utils.download_youtube_video()
+    :return: The same app url
+    """
+    if redirect_url.startswith("/play_video/"):
+        ExtractText.start_pre_ocr(redirect_url[len("/play_video/"):])
+    return redirect_url
+
+
+@app.route("/pre_ocr/<video_filename>")
+def pre_ocr_status(video_filename):
+    """
+    Ajax endpoint reporting the progress of pre-OCR for a video
+    :param video_filename: Filename of the video
+    :return: Dict containing job status and progress percentage
+    """
+    video_hash = ExtractText.get_video_hash(video_filename)
+    job = utils.pre_ocr_manager.get_job(video_hash) if video_hash is not None else None
+    if job is not None:
+        return job.to_dict()
+    timeline = utils.pre_ocr_manager.get_timeline(video_hash) if video_hash is not None else None
+    if timeline is not None:
+        return {"status": "complete" if timeline.complete else "cancelled", "scenes": len(timeline.segments)}
+    return {"status": "none"}
+
+
+@app.route("/pre_ocr/<video_filename>/start", methods=["POST"])
+def start_pre_ocr(video_filename):
+    """
+    Ajax endpoint starting pre-OCR of a video already in the library
+    :param video_filename: Filename of the video
+    :return: Dict containing job status and progress percentage
+    """
+    job = ExtractText.start_pre_ocr(video_filename)
+    return job.to_dict() if job is not None else pre_ocr_status(video_filename)
+
+
+@app.route("/pre_ocr/<video_filename>/cancel", methods=["POST"])
+def cancel_pre_ocr(video_filename):
+    """
+    Ajax endpoint cancelling pre-OCR of a video, scenes already found are kept
+    :param video_filename: Filename of the video
+    :return: String indicating success or failure
+    """
+    video_hash = ExtractText.get_video_hash(video_filename)
+    if video_hash is not None and utils.pre_ocr_manager.cancel(video_hash):
+        return "success"
+    return "fail"
+
+
 @app.route("/play_video/<play_filename>")
 def video(play_filename):
     """
-    Returns video player view/template with specified video
+    Returns video player view/template with specified video, played from the t query parameter in seconds if given
     :param play_filename: Filename/video to play
     :return: Rendered template of video player
     """
     if utils.filename_exists_in_userdata(play_filename):
-        global filename
-        filename = play_filename
-        return render_template("player.html", filename=filename, video_data=utils.get_video_data(filename))
+        video_data = utils.get_video_data(play_filename)
+        start_time = request.args.get("t", type=float)
+        if start_time is not None and start_time >= 0:
+            video_data["progress"] = start_time
+        return render_template("player.html", filename=play_filename, video_data=video_data)
     return redirect("/")
 
 
+@app.route("/search")
+def search():
+    """
+    Ajax endpoint searching the code captured from every video, given by the q query parameter, with an optional limit.
+    Results are limited to recent matches: only the newest [Search] max_candidates captures matching the query are
+    ranked, so older captures are not returned when more captures match.
+    :return: Dict containing the query and the ranked hits, each with the url playing its video from the capture
+    """
+    query = request.args.get("q", "").strip()
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), 100)
+    return {"query": query, "hits": utils.search_code(query, limit) if query else []}
+
+
 @app.route("/delete_video/<delete_filename>")
 def delete_video(delete_filename):
     """
@@ -233,6 +515,7 @@ def reset_settings():
     if os.path.exists('config.ini'):
         os.remove('config.ini')
     shutil.copy('config.example.ini', 'config.ini')
+    utils.config_cache.invalidate()
     current_settings = utils.get_current_settings()
     return render_template('settings.html', current_settings=current_settings)
 
@@ -278,6 +561,8 @@ if __name__ == "__main__":
     logging.basicConfig(filename="app.log", filemode="w", level=logging.DEBUG, format="%(levelname)s - %(message)s")
     print("[*] Starting OcrRoo Server")
     print(f"[*] OcrRoo Server running on http://{host}:{port}/")
+    print("[*] This is the development server, run serve.py to serve OcrRoo in production")
+    utils.start_library_indexing()
     app.run(host=host, port=port)
 else:
     logging.basicConfig(level=logging.DEBUG, format="%(levelname)s - %(message)s")
@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+
+class CaptureQueueFullError(Exception):
+    """
+    Raised when a capture job is submitted while the maximum number of jobs are already pending.
+    """
+
+
+class CaptureJob:
+    """
+    A capture running in the background. Each stage of the capture (e.g. frame, raw OCR, formatted code) is recorded
+    as it completes so clients can be sent partial results before the whole capture has finished.
+    """
+
+    def __init__(self, key: tuple, stages: Callable[[], Iterable[Tuple[str, object]]]):
+        """
+        :param key: Key used to deduplicate jobs, e.g. (filename, timestamp)
+        :param stages: Function returning an iterable of (stage name, data) pairs, run on a worker thread
+        """
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.stages = stages
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.events = []
+        self.finished_at: Optional[float] = None
+        self._condition = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("complete", "failed")
+
+    def result(self) -> Optional[object]:
+        """
+        Data of the latest stage recorded, the final result once the job is complete
+        """
+        with self._condition:
+            return self.events[-1][1] if self.events else None
+
+    def run(self) -> None:
+        """
+        Run every stage recording each result, executed on a worker thread
+        """
+        with self._condition:
+            self.status = "running"
+        try:
+            for stage, data in self.stages():
+                with self._condition:
+                    self.events.append((stage, data))
+                    self._condition.notify_all()
+            status = "complete"
+        except Exception as error:
+            logging.exception(error)
+            self.error = str(error)
+            status = "failed"
+        with self._condition:
+            self.status = status
+            self.finished_at = time.monotonic()
+            self._condition.notify_all()
+
+    def to_dict(self) -> dict:
+        """
+        Job status for status endpoints
+        """
+        with self._condition:
+            status = {"job_id": self.job_id, "status": self.status, "stages": dict(self.events)}
+            if self.status == "complete" and self.events:
+                status["result"] = self.events[-1][1]
+            if self.error is not None:
+                status["error"] = self.error
+            return status
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the job to finish
+        :param timeout: [Optional] Seconds to wait
+        :return: True if the job finished
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.done, timeout)
+
+    def stream(self, heartbeat: float = 15.0) -> Iterator[Optional[Tuple[str, object]]]:
+        """
+        Iterate over every stage as it completes, including stages completed before iteration started, ending with a
+        ("done", status) pair. None is yielded every heartbeat seconds while no stage completes.
+        :param heartbeat: Seconds between heartbeats
+        :return: Iterator of (stage name, data) pairs
+        """
+        position = 0
+        while True:
+            with self._condition:
+                if position == len(self.events) and not self.done:
+                    self._condition.wait(heartbeat)
+                events = self.events[position:]
+                done = self.done
+            position += len(events)
+            if not events and not done:
+                yield None
+            for event in events:
+                yield event
+            if done and position == len(self.events):
+                yield "done", {"status": self.status, "error": self.error}
+                return
+
+
+def format_server_sent_event(event: Optional[Tuple[str, object]]) -> str:
+    """
+    Format a stage of a capture job as a Server-Sent Event, None is formatted as a heartbeat comment
+    :param event: (stage name, data) pair or None
+    :return: Server-Sent Event as string
+    """
+    if event is None:
+        return ": heartbeat\n\n"
+    stage, data = event
+    return f"event: {stage}\ndata: {json.dumps(data)}\n\n"
+
+
+class CaptureJobManager:
+    """
+    Runs capture jobs on a bounded pool of threads. A capture submitted while an identical capture (same key) is
+    still queued or running is given the existing job instead of starting a new one.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 16, finished_job_ttl: float = 300.0):
+        """
+        :param workers: Number of captures run at once
+        :param max_pending: Maximum number of queued or running jobs
+        :param finished_job_ttl: Seconds finished jobs are kept for get_job()
+        """
+        self.max_pending = max_pending
+        self.finished_job_ttl = finished_job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="capture-job")
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _prune_jobs(self) -> None:
+        """
+        Forget finished jobs older than finished_job_ttl, must be called with the lock held
+        """
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.done and now - job.finished_at > self.finished_job_ttl:
+                del self._jobs[job_id]
+
+    def _run(self, job: CaptureJob) -> None:
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def submit(self, key: tuple, stages: Callable[[], Iterable[Tuple[str, object]]]) -> CaptureJob:
+        """
+        Queue a capture job
+        :param key: Key used to deduplicate jobs, e.g. (filename, timestamp)
+        :param stages: Function returning an iterable of (stage name, data) pairs
+        :return: New job, or the queued or running job with the same key
+        :raises CaptureQueueFullError: If max_pending jobs are already queued or running
+        """
+        with self._lock:
+            if key in self._active:
+                return self._active[key]
+            if len(self._active) >= self.max_pending:
+                raise CaptureQueueFullError(f"Capture queue is full ({self.max_pending} jobs pending)")
+            self._prune_jobs()
+            job = CaptureJob(key, stages)
+            self._jobs[job.job_id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[CaptureJob]:
+        """
+        Get a submitted job
+        :param job_id: Job id of the job
+        :return: CaptureJob or None if the id is unknown or has expired
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker threads, queued jobs are cancelled
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
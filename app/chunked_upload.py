@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+# Bytes read and hashed at a time when streaming uploads and hashing files
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# Supported video hash algorithms. md5 matches the hashes of videos already in the library, sha1 and sha256 are around
+# twice as fast on CPUs with SHA extensions
+HASH_ALGORITHMS = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=16),
+}
+
+
+def new_hasher(algorithm: str = "md5"):
+    """
+    Create a hash object for hashing videos
+    :param algorithm: Name of the algorithm, one of HASH_ALGORITHMS
+    :return: hashlib hash object
+    :raises ValueError: If the algorithm is not supported
+    """
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm \"{algorithm}\", expected one of {', '.join(HASH_ALGORITHMS)}")
+    return HASH_ALGORITHMS[algorithm]()
+
+
+def hash_file(path: Union[str, Path], algorithm: str = "md5", buffer_size: int = HASH_BUFFER_SIZE) -> str:
+    """
+    Hash a whole file
+    :param path: Path of the file
+    :param algorithm: Name of the algorithm, one of HASH_ALGORITHMS
+    :param buffer_size: Bytes read at a time
+    :return: Hex digest
+    """
+    hasher = new_hasher(algorithm)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(buffer_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class UploadOffsetError(Exception):
+    """
+    Raised when a chunk does not start where the upload left off, e.g. a client retrying a chunk that was already
+    received. The client should resume from offset.
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload continues from byte {offset}")
+        self.offset = offset
+
+
+class UploadSession:
+    """
+    A video being uploaded in chunks. Received bytes are appended to a part file and hashed as they arrive, so the
+    digest is known as soon as the last chunk is received without reading the file again.
+    """
+
+    def __init__(self, upload_id: str, filename: str, size: int, title: Optional[str] = None,
+                 hash_algorithm: str = "md5", received: int = 0, updated_at: Optional[float] = None):
+        """
+        :param upload_id: Unique id of the upload
+        :param filename: Filename the video is saved as
+        :param size: Total size of the video in bytes
+        :param title: [Optional] Title (alias) of the video
+        :param hash_algorithm: Algorithm the video is hashed with
+        :param received: Bytes received so far
+        :param updated_at: Time the last chunk was received
+        """
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.title = title
+        self.hash_algorithm = hash_algorithm
+        self.received = received
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.hasher = None
+        self.lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.size
+
+    def digest(self) -> Optional[str]:
+        """
+        Hash of the video once every byte has been received
+        :return: Hex digest or None if the upload is incomplete
+        """
+        return self.hasher.hexdigest() if self.complete and self.hasher is not None else None
+
+    def to_dict(self) -> dict:
+        return {"upload_id": self.upload_id, "filename": self.filename, "size": self.size, "title": self.title,
+                "hash_algorithm": self.hash_algorithm, "received": self.received, "updated_at": self.updated_at}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UploadSession":
+        return cls(data["upload_id"], data["filename"], data["size"], data.get("title"),
+                   data.get("hash_algorithm", "md5"), data["received"], data.get("updated_at"))
+
+
+class UploadManager:
+    """
+    Tracks chunked uploads, persisting each upload as a part file and a json file of its progress so an upload can be
+    resumed from where it stopped after a dropped connection or a restart of the app. Uploads idle for longer than
+    session_ttl are deleted.
+    """
+
+    def __init__(self, directory: Union[str, Path] = "data/uploads", session_ttl: float = 24 * 60 * 60,
+                 buffer_size: int = HASH_BUFFER_SIZE):
+        """
+        :param directory: Directory to store part files in
+        :param session_ttl: Seconds an idle upload is kept
+        :param buffer_size: Bytes read, written and hashed at a time
+        """
+        self.directory = Path(directory)
+        self.session_ttl = session_ttl
+        self.buffer_size = buffer_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.part"
+
+    def _session_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.json"
+
+    def _save_session(self, session: UploadSession) -> None:
+        with self._session_path(session.upload_id).open("w") as session_file:
+            json.dump(session.to_dict(), session_file)
+
+    def _load_session(self, upload_id: str) -> Optional[UploadSession]:
+        """
+        Load an upload persisted by an earlier run, trimming the part file to the last recorded offset
+        """
+        try:
+            with self._session_path(upload_id).open("r") as session_file:
+                session = UploadSession.from_dict(json.load(session_file))
+        except (json.JSONDecodeError, KeyError, OSError):
+            return None
+        part_path = self._part_path(upload_id)
+        if not part_path.exists():
+            return None
+        session.received = min(session.received, part_path.stat().st_size)
+        os.truncate(part_path, session.received)
+        return session
+
+    def _hasher(self, session: UploadSession):
+        """
+        Get the running hash of an upload, re-hashing the received bytes if the upload was resumed after a restart
+        """
+        if session.hasher is None:
+            session.hasher = new_hasher(session.hash_algorithm)
+            with self._part_path(session.upload_id).open("rb") as part_file:
+                for chunk in iter(lambda: part_file.read(self.buffer_size), b""):
+                    session.hasher.update(chunk)
+        return session.hasher
+
+    def prune(self) -> None:
+        """
+        Delete uploads that have been idle for longer than session_ttl
+        """
+        if not self.directory.exists():
+            return
+        now = time.time()
+        for session_path in self.directory.glob("*.json"):
+            session = self.get(session_path.stem)
+            if session is None or now - session.updated_at > self.session_ttl:
+                self.cancel(session_path.stem)
+
+    def create(self, filename: str, size: int, title: Optional[str] = None,
+               hash_algorithm: str = "md5") -> UploadSession:
+        """
+        Start a new upload
+        :param filename: Filename the video is saved as
+        :param size: Total size of the video in bytes
+        :param title: [Optional] Title (alias) of the video
+        :param hash_algorithm: Algorithm the video is hashed with
+        :return: New UploadSession
+        :raises ValueError: If the size is not positive or the hash algorithm is not supported
+        """
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        new_hasher(hash_algorithm)
+        self.prune()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        session = UploadSession(uuid.uuid4().hex, filename, size, title, hash_algorithm)
+        session.hasher = new_hasher(hash_algorithm)
+        self._part_path(session.upload_id).touch()
+        self._save_session(session)
+        with self._lock:
+            self._sessions[session.upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        """
+        Get an upload, loading it from disk if it was started by an earlier run
+        :param upload_id: Id of the upload
+        :return: UploadSession or None if the id is unknown
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None and upload_id.isalnum():
+                session = self._load_session(upload_id)
+                if session is not None:
+                    self._sessions[upload_id] = session
+            return session
+
+    def write_chunk(self, upload_id: str, offset: int, stream: BinaryIO, length: Optional[int] = None) -> UploadSession:
+        """
+        Append a chunk to an upload, hashing it as it is written. If the stream ends early (the connection dropped)
+        the bytes received so far are kept and the upload continues from there.
+        :param upload_id: Id of the upload
+        :param offset: Byte offset the chunk starts at, must equal the bytes received so far
+        :param stream: Stream to read the chunk from
+        :param length: [Optional] Length of the chunk, the stream is read until it ends or the upload is complete if
+        not given
+        :return: Updated UploadSession
+        :raises KeyError: If the upload is unknown
+        :raises UploadOffsetError: If the chunk does not start at the current offset or another chunk is being written
+        :raises ValueError: If the chunk runs past the size of the upload
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+        if not session.lock.acquire(blocking=False):
+            raise UploadOffsetError(session.received)
+        try:
+            if offset != session.received:
+                raise UploadOffsetError(session.received)
+            remaining = session.size - session.received if length is None else length
+            if remaining > session.size - session.received:
+                raise ValueError("Chunk runs past the end of the upload")
+            hasher = self._hasher(session)
+            try:
+                with self._part_path(upload_id).open("ab") as part_file:
+                    while remaining > 0:
+                        chunk = stream.read(min(self.buffer_size, remaining))
+                        if not chunk:
+                            break
+                        part_file.write(chunk)
+                        hasher.update(chunk)
+                        session.received += len(chunk)
+                        remaining -= len(chunk)
+            finally:
+                session.updated_at = time.time()
+                self._save_session(session)
+        finally:
+            session.lock.release()
+        return session
+
+    def finish(self, upload_id: str, destination: Union[str, Path]) -> None:
+        """
+        Move a complete upload to its destination. The video directory may be on another drive or filesystem than the
+        part file, in which case it is copied and then deleted. The upload is kept if the move fails, so it can be
+        finished again.
+        :param upload_id: Id of the upload
+        :param destination: Path to move the video to, replacing any existing file
+        :raises OSError: If the part file cannot be moved
+        """
+        shutil.move(self._part_path(upload_id), destination)
+        self._forget(upload_id)
+        logging.info(f"Finished upload {upload_id} to {destination}")
+
+    def cancel(self, upload_id: str) -> None:
+        """
+        Delete an upload and its part file
+        :param upload_id: Id of the upload
+        """
+        self._part_path(upload_id).unlink(missing_ok=True)
+        self._forget(upload_id)
+
+    def _forget(self, upload_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        self._session_path(upload_id).unlink(missing_ok=True)
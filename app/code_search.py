@@ -0,0 +1,368 @@
+import hashlib
+import html
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+# Words as split by the FTS5 unicode61 tokenizer, underscores separate words like any other punctuation
+TOKEN = re.compile(r"[^\W_]+")
+# BM25 term frequency saturation and length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    digest TEXT NOT NULL,
+    capture_content TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_postings_filename_digest ON postings (filename, digest);
+CREATE VIRTUAL TABLE IF NOT EXISTS capture_text USING fts5 (
+    capture_content, content = 'postings', content_rowid = 'id', tokenize = 'unicode61'
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    documents INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def tokenize(text: str) -> list:
+    """
+    Split text into lower case words the way the index does
+    :param text: Captured code or search query
+    :return: List of words
+    """
+    return TOKEN.findall(text.casefold())
+
+
+def build_match_query(terms: list) -> str:
+    """
+    Build an FTS5 MATCH expression matching captures containing every term
+    :param terms: Words from tokenize()
+    :return: MATCH expression
+    """
+    return " AND ".join(f'"{term}"' for term in terms)
+
+
+def highlight_snippet(content: str, terms: list, context_lines: int = 1) -> str:
+    """
+    Cut the lines around the first line of a capture containing a search term, escaped for HTML with every term
+    wrapped in <mark> tags
+    :param content: Captured code
+    :param terms: Words from tokenize()
+    :param context_lines: Number of lines kept either side of the matching line
+    :return: HTML string
+    """
+    lines = content.splitlines() or [""]
+    term_set = set(terms)
+    first = next((index for index, line in enumerate(lines) if term_set.intersection(tokenize(line))), 0)
+    snippet_lines = lines[max(first - context_lines, 0):first + context_lines + 1]
+    highlighted = []
+    for line in snippet_lines:
+        parts, position = [], 0
+        for word in TOKEN.finditer(line):
+            if word.group().casefold() in term_set:
+                parts.append(html.escape(line[position:word.start()]))
+                parts.append(f"<mark>{html.escape(word.group())}</mark>")
+                position = word.end()
+        parts.append(html.escape(line[position:]))
+        highlighted.append("".join(parts))
+    return "\n".join(highlighted)
+
+
+class CodeSearchIndex:
+    """
+    Full-text index of captured code, kept in its own SQLite database so it works with either user data storage
+    engine. Each capture is a posting of the video filename and timestamp it was captured at, so hits can jump straight
+    to that point of the video. The same code captured more than once in a video, e.g. by a capture range over a
+    static slide, is a single posting at the earliest timestamp.
+
+    An FTS5 table finds the captures containing every word of a query. The newest max_candidates of them are ranked
+    with BM25, using the number of captures containing each word kept in the terms table rather than the FTS5 bm25()
+    function, which counts them by reading the whole posting list of every word on each query. Ranking therefore costs
+    the same however many captures contain a common word like "print".
+
+    Captures are indexed as they are appended. The index is built from the user data once, on a background thread the
+    first time it is used. Captures added and videos deleted while it is being built are applied once it is built.
+    """
+
+    def __init__(self, database_path: Union[str, Path] = "data/code_search.db", max_candidates: int = 1000):
+        """
+        :param database_path: Path of the SQLite database file of the index
+        :param max_candidates: Maximum number of matching captures ranked by each search, newest first
+        """
+        self.database_path = Path(database_path)
+        self.max_candidates = max_candidates
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._build_lock = threading.Lock()
+        # Changes made while the index is built in the background, None when it is not being built
+        self._backlog: Optional[list] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get the connection for the current thread, creating the database and schema if required
+        :return: SQLite connection
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with self._schema_lock:
+            if not self._schema_ready:
+                connection.executescript(SCHEMA)
+                connection.commit()
+                self._schema_ready = True
+        self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        """
+        Close the connection for the current thread
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _meta(self, key: str) -> Optional[int]:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row is not None else None
+
+    @staticmethod
+    def _add_to_meta(connection: sqlite3.Connection, documents: int, tokens: int) -> None:
+        connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?) "
+                               "ON CONFLICT (key) DO UPDATE SET value = value + excluded.value",
+                               [("documents", documents), ("tokens", tokens)])
+
+    def is_built(self) -> bool:
+        """
+        Check if the index has been built from the user data
+        :return: True if build() has run
+        """
+        return self._meta("built") is not None
+
+    def build(self, all_videos: Optional[list]) -> int:
+        """
+        Replace the index with every capture of the user data in a single transaction
+        :param all_videos: List of video records from user data storage, None if there are no videos
+        :return: Number of captures indexed
+        """
+        connection = self._connection()
+        term_documents = Counter()
+        documents = tokens = 0
+        with connection:
+            connection.execute("INSERT INTO capture_text (capture_text) VALUES ('delete-all')")
+            for table in ("postings", "terms", "meta"):
+                connection.execute(f"DELETE FROM {table}")
+            for current_video in all_videos or []:
+                for capture in current_video["captures"]:
+                    words = self._insert(connection, current_video["filename"], capture)
+                    if words is not None:
+                        term_documents.update(set(words))
+                        documents += 1
+                        tokens += len(words)
+            connection.executemany("INSERT INTO terms (term, documents) VALUES (?, ?)", term_documents.items())
+            self._add_to_meta(connection, documents, tokens)
+            connection.execute("INSERT INTO meta (key, value) VALUES ('built', 1)")
+        logging.info(f"Indexed {documents} captures in {self.database_path}")
+        return documents
+
+    def is_building(self) -> bool:
+        """
+        Check if the index is being built in the background
+        :return: True until build_in_background() has finished
+        """
+        with self._build_lock:
+            return self._backlog is not None
+
+    def build_in_background(self, load_videos: Callable[[], Optional[list]]) -> Optional[threading.Thread]:
+        """
+        Build the index on a background thread, unless it is already being built
+        :param load_videos: Called on the background thread to get the video records from user data storage
+        :return: Thread building the index or None if it is already being built
+        """
+        with self._build_lock:
+            if self._backlog is not None:
+                return None
+            self._backlog = []
+        thread = threading.Thread(target=self._build_and_apply_backlog, args=(load_videos,),
+                                  name="code-search-build", daemon=True)
+        thread.start()
+        return thread
+
+    def _build_and_apply_backlog(self, load_videos: Callable[[], Optional[list]]) -> None:
+        """
+        Build the index then apply the changes made meanwhile in order. Captures both in the user data read by the
+        build and in the backlog are only indexed once, as the same code in a video is a single posting.
+        :param load_videos: Called to get the video records from user data storage
+        """
+        try:
+            # Another process may have built it since
+            if not self.is_built():
+                self.build(load_videos())
+        except sqlite3.Error as error:
+            logging.error(f"Failed to build code search index: {error}")
+        finally:
+            self._apply_backlog()
+
+    def _apply_backlog(self) -> None:
+        """
+        Apply the changes queued while the index was being built, in order, then stop queueing changes
+        """
+        while True:
+            with self._build_lock:
+                backlog = self._backlog
+                self._backlog = [] if backlog else None
+            if not backlog:
+                return
+            for operation, arguments in backlog:
+                try:
+                    operation(*arguments)
+                except sqlite3.Error as error:
+                    logging.error(f"Failed to update code search index: {error}")
+
+    def _defer(self, operation: Callable, *arguments) -> bool:
+        """
+        Queue a change to apply once the index is built if it is being built
+        :return: True if the change was queued
+        """
+        with self._build_lock:
+            if self._backlog is None:
+                return False
+            self._backlog.append((operation, arguments))
+            return True
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, filename: str, capture: dict) -> Optional[list]:
+        """
+        Insert a posting and its text, or move the posting of the same code in the video to the earlier timestamp, must
+        be called inside a transaction
+        :return: Words of the capture or None if the video already has a posting of the same code
+        """
+        content = capture["capture_content"]
+        digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+        existing = connection.execute("SELECT id, timestamp FROM postings WHERE filename = ? AND digest = ?",
+                                      (filename, digest)).fetchone()
+        if existing is not None:
+            if capture["timestamp"] < existing["timestamp"]:
+                connection.execute("UPDATE postings SET timestamp = ? WHERE id = ?",
+                                   (capture["timestamp"], existing["id"]))
+            return None
+        cursor = connection.execute(
+            "INSERT INTO postings (filename, timestamp, digest, capture_content) VALUES (?, ?, ?, ?)",
+            (filename, capture["timestamp"], digest, content))
+        connection.execute("INSERT INTO capture_text (rowid, capture_content) VALUES (?, ?)",
+                           (cursor.lastrowid, content))
+        return tokenize(content)
+
+    def add_capture(self, filename: str, capture: dict) -> None:
+        """
+        Index a capture appended to a video
+        :param filename: Filename of the video
+        :param capture: Capture dict containing the timestamp and capture_content
+        """
+        if not self._defer(self._add_capture, filename, dict(capture)):
+            self._add_capture(filename, capture)
+
+    def _add_capture(self, filename: str, capture: dict) -> None:
+        connection = self._connection()
+        with connection:
+            words = self._insert(connection, filename, capture)
+            if words is None:
+                return
+            connection.executemany(
+                "INSERT INTO terms (term, documents) VALUES (?, 1) "
+                "ON CONFLICT (term) DO UPDATE SET documents = documents + 1", [(term,) for term in set(words)])
+            self._add_to_meta(connection, 1, len(words))
+
+    def delete_video(self, filename: str) -> None:
+        """
+        Remove every capture of a video from the index
+        :param filename: Filename of the video
+        """
+        if not self._defer(self._delete_video, filename):
+            self._delete_video(filename)
+
+    def _delete_video(self, filename: str) -> None:
+        connection = self._connection()
+        with connection:
+            rows = connection.execute("SELECT id, capture_content FROM postings WHERE filename = ?",
+                                      (filename,)).fetchall()
+            if not rows:
+                return
+            term_documents = Counter()
+            tokens = 0
+            for row in rows:
+                words = tokenize(row["capture_content"])
+                term_documents.update(set(words))
+                tokens += len(words)
+            connection.executemany(
+                "INSERT INTO capture_text (capture_text, rowid, capture_content) VALUES ('delete', ?, ?)",
+                [(row["id"], row["capture_content"]) for row in rows])
+            connection.execute("DELETE FROM postings WHERE filename = ?", (filename,))
+            connection.executemany("UPDATE terms SET documents = documents - ? WHERE term = ?",
+                                   [(count, term) for term, count in term_documents.items()])
+            connection.execute("DELETE FROM terms WHERE documents <= 0")
+            self._add_to_meta(connection, -len(rows), -tokens)
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        Search the captured code for captures containing every word of a query, ranked by BM25. Only the newest
+        max_candidates matching captures are ranked, so when more captures match older ones are left out even if they
+        would rank higher.
+        :param query: Search query, punctuation is ignored
+        :param limit: Maximum number of hits
+        :return: List of hits, best first, each a dict of filename, timestamp, score and snippet as HTML
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT id, filename, timestamp, capture_content FROM postings WHERE id IN "
+            "(SELECT rowid FROM capture_text WHERE capture_text MATCH ? ORDER BY rowid DESC LIMIT ?)",
+            (build_match_query(terms), self.max_candidates)).fetchall()
+        if not rows:
+            return []
+        documents = max(self._meta("documents") or 0, 1)
+        average_length = max((self._meta("tokens") or 0) / documents, 1)
+        term_documents = dict(connection.execute(
+            f"SELECT term, documents FROM terms WHERE term IN ({', '.join('?' * len(terms))})", terms).fetchall())
+        idf = {term: math.log(1 + (documents - term_documents.get(term, 0) + 0.5) / (term_documents.get(term, 0) + 0.5))
+               for term in terms}
+        scored = []
+        for row in rows:
+            words = tokenize(row["capture_content"])
+            counts = Counter(words)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * len(words) / average_length)
+            score = sum(idf[term] * counts[term] * (BM25_K1 + 1) / (counts[term] + norm) for term in terms)
+            scored.append((-score, row["timestamp"], row))
+        scored.sort(key=lambda hit: hit[:2])
+        return [{"filename": row["filename"], "timestamp": timestamp, "score": round(-negative_score, 4),
+                 "snippet": highlight_snippet(row["capture_content"], terms)}
+                for negative_score, timestamp, row in scored[:limit]]
+
+    def count(self) -> int:
+        """
+        Number of distinct captures in the index
+        :return: Count of captures
+        """
+        return self._meta("documents") or 0
@@ -1,10 +1,159 @@
-import openai
+import atexit
 import cv2
 import pytesseract
 import logging
-from typing import Union
+import threading
+from collections import deque
+from typing import Iterator, Optional, Tuple, Union
 import utils
 from utils import config
+from video_capture_pool import VideoCapturePool
+from video_seek import seek_frame, seek_frames
+from ocr_cache import OcrCache, hamming_distance, perceptual_hash, settings_fingerprint
+from pre_ocr import PreOcrJob
+from ocr_worker_pool import OCR_ERRORS, OcrWorkerPool, OcrQueueFullError
+from capture_jobs import CaptureJob, CaptureJobManager
+from frame_preprocessing import RegionCache, detect_text_regions, text_strokes, to_grayscale
+from llm_client import LlmClient
+from llm_cache import LlmCache
+
+# Pool of open video decoders shared by all captures, created on first use by get_capture_pool()
+capture_pool: Union[VideoCapturePool, None] = None
+capture_pool_lock = threading.Lock()
+
+
+def get_capture_pool() -> VideoCapturePool:
+    """
+    Get the process wide pool of open video decoders, sized by the [VideoDecoding] config section
+    :return: VideoCapturePool object
+    """
+    global capture_pool
+    with capture_pool_lock:
+        if capture_pool is None:
+            capture_pool = VideoCapturePool(max_size=int(config("VideoDecoding", "pool_size", fallback="4")),
+                                            idle_timeout=float(config("VideoDecoding", "idle_timeout",
+                                                                      fallback="300")))
+            atexit.register(capture_pool.close)
+        return capture_pool
+
+
+# Cache of capture results shared by all captures, created on first use by get_ocr_cache()
+ocr_cache: Union[OcrCache, None] = None
+ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Union[OcrCache, None]:
+    """
+    Get the process wide capture result cache configured by the [OcrCache] config section
+    :return: OcrCache object or None if the cache is disabled
+    """
+    global ocr_cache
+    if config("OcrCache", "enabled", fallback="True") != "True":
+        return None
+    with ocr_cache_lock:
+        if ocr_cache is None:
+            ocr_cache = OcrCache(directory=config("OcrCache", "directory", fallback="data/ocr_cache"),
+                                 memory_entries=int(config("OcrCache", "memory_entries", fallback="256")),
+                                 disk_size_limit=int(config("OcrCache", "disk_size_mb", fallback="100")) * 1024 * 1024,
+                                 phash_distance=int(config("OcrCache", "phash_distance", fallback="3")))
+        return ocr_cache
+
+
+# Pool of OCR worker processes shared by all captures, created on first use by get_ocr_worker_pool()
+ocr_worker_pool: Union[OcrWorkerPool, None] = None
+ocr_worker_pool_lock = threading.Lock()
+
+
+def get_ocr_worker_pool() -> OcrWorkerPool:
+    """
+    Get the process wide pool of OCR workers configured by the [OcrWorkers] config section, a worker count of 0 uses
+    one worker per core
+    :return: OcrWorkerPool object
+    """
+    global ocr_worker_pool
+    with ocr_worker_pool_lock:
+        if ocr_worker_pool is None:
+            ocr_worker_pool = OcrWorkerPool(workers=int(config("OcrWorkers", "workers", fallback="0")) or None,
+                                            max_pending=int(config("OcrWorkers", "max_pending", fallback="0")) or None,
+                                            timeout=float(config("OcrWorkers", "timeout", fallback="30")))
+            atexit.register(ocr_worker_pool.shutdown)
+        return ocr_worker_pool
+
+
+# Text regions detected per video layout, reused by captures in the same layout
+region_cache = RegionCache()
+
+# Background capture jobs, created on first use by get_capture_job_manager()
+capture_job_manager: Union[CaptureJobManager, None] = None
+capture_job_manager_lock = threading.Lock()
+
+
+def get_capture_job_manager() -> CaptureJobManager:
+    """
+    Get the process wide manager of background capture jobs, accepting as many pending captures as the OCR worker
+    pool
+    :return: CaptureJobManager object
+    """
+    global capture_job_manager
+    with capture_job_manager_lock:
+        if capture_job_manager is None:
+            capture_job_manager = CaptureJobManager(
+                workers=int(config("OcrWorkers", "capture_threads", fallback="4")),
+                max_pending=get_ocr_worker_pool().max_pending)
+            atexit.register(capture_job_manager.shutdown)
+        return capture_job_manager
+
+
+# Client formatting OCR text with OpenAI, created on first use by get_llm_client()
+llm_client: Union[LlmClient, None] = None
+llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> Union[LlmClient, None]:
+    """
+    Get the process wide OpenAI client configured by the [OpenAI] config section, recreated when the API key changes
+    :return: LlmClient object or None if no API key is set
+    """
+    global llm_client
+    api_key = config("AppSettings", "openai_api_key")
+    with llm_client_lock:
+        if llm_client is not None and llm_client.api_key != api_key:
+            llm_client.close()
+            llm_client = None
+        if llm_client is None and api_key and api_key != "your_openai_api_key_here":
+            llm_client = LlmClient(api_key,
+                                   base_url=config("OpenAI", "base_url", fallback="https://api.openai.com/v1"),
+                                   model=config("OpenAI", "model", fallback="gpt-3.5-turbo"),
+                                   timeout=float(config("OpenAI", "timeout", fallback="15")),
+                                   deadline=float(config("OpenAI", "deadline", fallback="30")),
+                                   max_retries=int(config("OpenAI", "max_retries", fallback="3")),
+                                   max_concurrency=int(config("OpenAI", "max_concurrency", fallback="4")),
+                                   batch_window=float(config("OpenAI", "batch_window_ms", fallback="50")) / 1000,
+                                   max_batch_size=int(config("OpenAI", "max_batch_size", fallback="8")))
+            atexit.register(llm_client.close)
+        return llm_client
+
+
+# Cache of code formatted by OpenAI, created on first use by get_llm_cache()
+llm_cache: Union[LlmCache, None] = None
+llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Union[LlmCache, None]:
+    """
+    Get the process wide cache of code formatted by OpenAI configured by the [LlmCache] config section
+    :return: LlmCache object or None if the cache is disabled
+    """
+    global llm_cache
+    if config("LlmCache", "enabled", fallback="True") != "True":
+        return None
+    with llm_cache_lock:
+        if llm_cache is None:
+            llm_cache = LlmCache(directory=config("LlmCache", "directory", fallback="data/llm_cache"),
+                                 ttl=float(config("LlmCache", "ttl_hours", fallback="720")) * 60 * 60,
+                                 memory_entries=int(config("LlmCache", "memory_entries", fallback="256")),
+                                 disk_size_limit=int(config("LlmCache", "disk_size_mb", fallback="50")) * 1024 * 1024)
+        return llm_cache
 
 
 class ExtractText:
@@ -26,31 +175,546 @@ class ExtractText:
         :param timestamp: Time stamp of the frame to extract
         :return: Formatted code as a string
         """
+        formatted_text = "ERROR"
+        try:
+            for stage, data in ExtractText.capture_stages(filename, timestamp):
+                if stage == "formatted":
+                    formatted_text = data
+        except OCR_ERRORS as error:
+            logging.error(f"Unable to extract code from frame @ {timestamp}s in file {filename}: {error!r}")
+        return formatted_text
+
+    @staticmethod
+    def capture_stages(filename: str, timestamp: float) -> Iterator[Tuple[str, object]]:
+        """
+        Run a capture, yielding each stage as it completes: "frame" once the frame is decoded, "raw_ocr" with the raw
+        OCR text, "formatting" with how OpenAI formatted the text (see format_raw_ocr()) and "formatted" with the
+        formatted code. Stages skipped because of a cached result are not yielded.
+        :param filename: File path of the video to extract the frame from
+        :param timestamp: Time stamp of the frame to extract
+        :return: Iterator of (stage name, data) pairs
+        """
+        capture = ExtractText.prepare_capture(filename, timestamp)
+        if "result" in capture:
+            yield "formatted", capture["result"]
+            return
+        if "raw_text" not in capture:
+            yield "frame", {"timestamp": timestamp, "frame_index": capture["frame_index"]}
+            capture["raw_text"] = ExtractText.ocr_frame(capture.pop("frame"), capture["video_hash"])
+        yield "raw_ocr", capture["raw_text"]
+        formatted_text = ExtractText.finish_capture(capture)
+        yield "formatting", {"openai": capture["openai"], "llm_cache_hit": capture["openai"] == "cache_hit"}
+        yield "formatted", formatted_text
+
+    @staticmethod
+    def submit_capture(filename: str, timestamp: float) -> CaptureJob:
+        """
+        Start a capture in the background, a capture of the same frame that is still in progress is reused
+        :param filename: File path of the video to extract the frame from
+        :param timestamp: Time stamp of the frame to extract
+        :return: CaptureJob reporting each stage of the capture
+        :raises CaptureQueueFullError: If too many captures are in progress
+        """
+        return get_capture_job_manager().submit((filename, round(timestamp, 2)),
+                                                lambda: ExtractText.capture_stages(filename, timestamp))
+
+    @staticmethod
+    def prepare_capture(filename: str, timestamp: float) -> dict:
+        """
+        Run the steps of a capture before OCR: cache and pre-OCR timeline lookups and frame extraction
+        :param filename: File path of the video to extract the frame from
+        :param timestamp: Time stamp of the frame to extract
+        :return: Capture dict containing "result" if the capture is already resolved, otherwise "raw_text" or the
+        "frame" to OCR, and the cache details used by finish_capture()
+        """
+        capture = ExtractText.lookup_capture(filename, timestamp, ExtractText.get_video_hash(filename),
+                                             ExtractText.get_video_fps(filename), ExtractText.ocr_settings())
+        if "result" in capture or "raw_text" in capture:
+            return capture
         frame = ExtractText.extract_frame_at_timestamp(filename, timestamp)
-        if frame is not None:
-            extracted_text = pytesseract.image_to_string(frame)
-            logging.info(f"Successfully extracted code from frame @ {timestamp}s in file {filename}")
-            return ExtractText.format_raw_ocr_string(extracted_text)
-        else:
+        if frame is None:
             logging.error(f"Unable to extract code from frame @ {timestamp}s in file {filename}")
-            return "ERROR"
+            capture["result"] = "ERROR"
+            return capture
+        if not ExtractText.lookup_similar_frame(capture, frame):
+            capture["frame"] = frame
+        return capture
+
+    @staticmethod
+    def lookup_capture(filename: str, timestamp: float, video_hash: Union[str, None], fps: Union[float, None],
+                       settings: dict) -> dict:
+        """
+        Look a capture up in the capture cache and the pre-OCR timeline of the video
+        :param filename: File path of the video
+        :param timestamp: Time stamp of the frame
+        :param video_hash: Hash of the video or None if it is not in the library
+        :param fps: Frame rate of the video or None if it is unknown
+        :param settings: Capture settings from ocr_settings()
+        :return: Capture dict containing "result" or "raw_text" if either was found
+        """
+        cache = get_ocr_cache()
+        frame_index = int(timestamp * fps) if fps is not None else None
+        capture = {"filename": filename, "timestamp": timestamp, "video_hash": video_hash, "frame_index": frame_index,
+                   "fps": fps, "settings": settings, "cache_key": None, "frame_hash": None}
+        if cache is not None and video_hash is not None and frame_index is not None:
+            capture["cache_key"] = cache.make_key(video_hash, frame_index, settings)
+            cached_text = cache.get(capture["cache_key"])
+            if cached_text is not None:
+                logging.info(f"Using cached code for frame @ {timestamp}s in file {filename}")
+                capture["result"] = cached_text
+                return capture
+        if video_hash is not None and config("PreOcr", "enabled", fallback="False") == "True":
+            timeline_text = utils.pre_ocr_manager.lookup(video_hash, timestamp,
+                                                         settings_fingerprint(ExtractText.raw_ocr_settings()))
+            if timeline_text is not None:
+                logging.info(f"Using pre-OCR timeline for frame @ {timestamp}s in file {filename}")
+                capture["raw_text"] = timeline_text
+        return capture
+
+    @staticmethod
+    def lookup_similar_frame(capture: dict, frame) -> bool:
+        """
+        Look the frame of a capture up in the capture cache by perceptual hash, resolving the capture if a nearby frame
+        of the video looks the same
+        :param capture: Capture dict from lookup_capture()
+        :param frame: Frame of the capture
+        :return: True if the capture was resolved
+        """
+        if capture["cache_key"] is None:
+            return False
+        cache = get_ocr_cache()
+        capture["frame_hash"] = perceptual_hash(frame)
+        similar_frame_window = int(float(config("OcrCache", "similar_frame_window", fallback="5")) * capture["fps"])
+        similar_text = cache.find_similar(capture["video_hash"], capture["settings"], capture["frame_hash"],
+                                          capture["frame_index"], similar_frame_window)
+        if similar_text is None:
+            return False
+        logging.info(f"Using cached code from a similar frame for frame @ {capture['timestamp']}s in file "
+                     f"{capture['filename']}")
+        cache.put(capture["cache_key"], similar_text)
+        capture["result"] = similar_text
+        return True
+
+    @staticmethod
+    def extract_code_at_timestamps(filename: str, timestamps: list) -> list:
+        """
+        Extract formatted code from a video file at several timestamps
+        :param filename: File path of the video to extract the frames from
+        :param timestamps: Time stamps of the frames to extract
+        :return: List of capture dicts from capture_range_stages() in ascending timestamp order
+        """
+        captures = []
+        for stage, data in ExtractText.capture_range_stages(filename, timestamps):
+            if stage == "captures":
+                captures = data
+        return captures
+
+    @staticmethod
+    def submit_capture_range(filename: str, timestamps: list) -> CaptureJob:
+        """
+        Start a capture of several timestamps in the background, an identical capture still in progress is reused
+        :param filename: File path of the video to extract the frames from
+        :param timestamps: Time stamps of the frames to extract
+        :return: CaptureJob reporting each capture as it completes
+        :raises CaptureQueueFullError: If too many captures are in progress
+        """
+        key = (filename, tuple(sorted({round(timestamp, 2) for timestamp in timestamps})))
+        return get_capture_job_manager().submit(key, lambda: ExtractText.capture_range_stages(filename, timestamps))
+
+    @staticmethod
+    def capture_range_stages(filename: str, timestamps: list) -> Iterator[Tuple[str, object]]:
+        """
+        Capture code at several timestamps of a video, yielding a "capture" stage for each timestamp in ascending order
+        followed by a "captures" stage with the list of every capture. The frames are decoded in a single pass with
+        one decoder while the OCR of earlier frames runs in parallel on the OCR worker pool. A frame that looks the
+        same as the previous frame read (same perceptual hash within the cache distance) reuses its code instead of
+        being OCR'd again.
+        :param filename: File path of the video to extract the frames from
+        :param timestamps: Time stamps of the frames to extract
+        :return: Iterator of (stage name, data) pairs, each capture a dict containing timestamp, frame_index, code and
+        duplicate_of (timestamp of the capture the code was copied from or None)
+        """
+        video_hash = ExtractText.get_video_hash(filename)
+        settings = ExtractText.ocr_settings()
+        cache = get_ocr_cache()
+        phash_distance = cache.phash_distance if cache is not None else \
+            int(config("OcrCache", "phash_distance", fallback="3"))
+        pool = get_ocr_worker_pool()
+        keyframes = ExtractText.get_keyframes(filename)
+        captures, pending = [], deque()
+        source = None
+        try:
+            with get_capture_pool().acquire(f"{utils.get_vid_save_path()}{filename}") as cap:
+                if cap is None:
+                    logging.error(f"Failed to open {filename} stream")
+                    frames = ((timestamp, None) for timestamp in sorted(timestamps))
+                    fps = None
+                else:
+                    frames = seek_frames(cap, timestamps, keyframes)
+                    fps = cap.get(cv2.CAP_PROP_FPS) or None
+                for timestamp, frame in frames:
+                    capture = ExtractText.lookup_capture(filename, timestamp, video_hash, fps, settings)
+                    source = ExtractText.queue_range_frame(capture, frame, source, phash_distance)
+                    pending.append(capture)
+                    # Keep up to two frames per worker in flight, finishing captures in order as their OCR completes
+                    yield from ExtractText.drain_range_captures(pending, captures, pool.workers * 2)
+            yield from ExtractText.drain_range_captures(pending, captures)
+        finally:
+            for capture in pending:
+                for job_id in capture.get("job_ids", []):
+                    pool.forget(job_id)
+        yield "captures", captures
+
+    @staticmethod
+    def queue_range_frame(capture: dict, frame, source: Optional[dict], phash_distance: int) -> Optional[dict]:
+        """
+        Mark the capture of a frame of a capture range as a duplicate of the previous distinct frame, or queue its OCR
+        if it has no cached result
+        :param capture: Capture dict from lookup_capture()
+        :param frame: Decoded frame or None if it could not be read
+        :param source: Capture of the previous distinct frame or None
+        :param phash_distance: Maximum perceptual hash distance of frames that look the same
+        :return: Capture the next frame is compared with
+        """
+        if frame is None:
+            if "result" not in capture and "raw_text" not in capture:
+                logging.error(f"Unable to extract code from frame @ {capture['timestamp']}s in file "
+                              f"{capture['filename']}")
+                capture["result"] = "ERROR"
+            return source
+        capture["frame_hash"] = perceptual_hash(frame)
+        if source is not None and hamming_distance(source["frame_hash"], capture["frame_hash"]) <= phash_distance:
+            capture["duplicate_of"] = source
+            return source
+        if "result" not in capture and "raw_text" not in capture \
+                and not ExtractText.lookup_similar_frame(capture, frame):
+            capture["job_ids"] = ExtractText.submit_ocr(capture, frame)
+        return capture
+
+    @staticmethod
+    def drain_range_captures(pending: deque, captures: list,
+                             max_in_flight: Optional[int] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Finish the pending captures of a capture range in timestamp order, while the first has finished OCR or more
+        than max_in_flight captures are waiting for OCR
+        :param pending: Queue of captures waiting to be finished, finished captures are removed
+        :param captures: List the finished captures are appended to
+        :param max_in_flight: [Optional] Number of captures left waiting for OCR, None finishes every pending capture
+        :return: Iterator of ("capture", capture dict) pairs
+        """
+        pool = get_ocr_worker_pool()
+        while pending and (max_in_flight is None or pool.done(pending[0].get("job_ids", []))
+                           or len([queued for queued in pending if "job_ids" in queued]) > max_in_flight):
+            captures.append(ExtractText.finish_range_capture(pending.popleft()))
+            yield "capture", captures[-1]
 
     @staticmethod
-    def format_raw_ocr_string(extracted_text: str) -> str:
+    def submit_ocr(capture: dict, frame) -> list:
+        """
+        Queue the OCR of the frame of a capture on the OCR worker pool
+        :param capture: Capture dict from lookup_capture()
+        :param frame: Frame to read text from
+        :return: List of OCR job ids, empty if the OCR queue stayed full
+        """
+        try:
+            return get_ocr_worker_pool().submit_many(ExtractText.ocr_calls(frame, capture["video_hash"]))
+        except OcrQueueFullError as error:
+            logging.error(f"Unable to extract code from frame @ {capture['timestamp']}s in file "
+                          f"{capture['filename']}: {error}")
+            capture["result"] = "ERROR"
+            return []
+
+    @staticmethod
+    def finish_range_capture(capture: dict) -> dict:
+        """
+        Wait for the OCR of a capture queued by capture_range_stages() and format the result
+        :param capture: Capture dict
+        :return: Dict containing timestamp, frame_index, code, duplicate_of and openai, how OpenAI formatted the code
+        (see format_raw_ocr(), None if the code was not formatted by this capture)
+        """
+        source = capture.get("duplicate_of")
+        if source is not None:
+            capture["result"] = source["result"]
+            capture["openai"] = source.get("openai")
+            if capture["cache_key"] is not None and source["result"] != "ERROR" and capture["openai"] != "failed":
+                get_ocr_cache().put(capture["cache_key"], capture["result"])
+        elif "job_ids" in capture and "result" not in capture:
+            try:
+                capture["raw_text"] = ExtractText.join_region_texts(get_ocr_worker_pool().collect(capture["job_ids"]))
+            except OCR_ERRORS as error:
+                logging.error(f"Unable to extract code from frame @ {capture['timestamp']}s in file "
+                              f"{capture['filename']}: {error}")
+                capture["result"] = "ERROR"
+        if "result" not in capture:
+            capture["result"] = ExtractText.finish_capture(capture)
+        return {"timestamp": capture["timestamp"], "frame_index": capture["frame_index"], "code": capture["result"],
+                "duplicate_of": source["timestamp"] if source is not None else None, "openai": capture.get("openai")}
+
+    @staticmethod
+    def range_timestamps(start: float, end: float, step: float) -> list:
+        """
+        List the timestamps from start to end (inclusive) every step seconds
+        :param start: First timestamp in seconds
+        :param end: Last timestamp in seconds
+        :param step: Seconds between timestamps
+        :return: List of timestamps
+        :raises ValueError: If the range is empty, the step is not positive or the range has too many timestamps
+        """
+        if step <= 0 or start < 0 or end < start:
+            raise ValueError("Invalid timestamp range")
+        count = int((end - start) / step + 1e-9) + 1
+        ExtractText.check_batch_size(count)
+        return [round(start + index * step, 3) for index in range(count)]
+
+    @staticmethod
+    def check_batch_size(count: int) -> None:
+        """
+        Check the number of timestamps of a batch capture against the max_batch_captures option of the [OcrWorkers]
+        config section
+        :param count: Number of timestamps
+        :raises ValueError: If there are no timestamps or more than max_batch_captures
+        """
+        max_captures = int(config("OcrWorkers", "max_batch_captures", fallback="500"))
+        if not 0 < count <= max_captures:
+            raise ValueError(f"{count} timestamps requested, between 1 and {max_captures} can be captured at once")
+
+    @staticmethod
+    def finish_capture(capture: dict) -> str:
+        """
+        Format the raw OCR text of a capture and cache the result, recording how OpenAI formatted it in
+        capture["openai"]
+        :param capture: Capture dict from prepare_capture() containing "raw_text"
+        :return: Formatted code as a string
+        """
+        logging.info(f"Successfully extracted code from frame @ {capture['timestamp']}s in file {capture['filename']}")
+        formatted_text, capture["openai"] = ExtractText.format_raw_ocr(capture["raw_text"])
+        cache = get_ocr_cache()
+        # Raw text returned because OpenAI did not answer is not cached, so a later capture formats it again
+        if cache is not None and capture["cache_key"] is not None and capture["openai"] != "failed":
+            cache.put(capture["cache_key"], formatted_text, capture["video_hash"], capture["settings"],
+                      capture["frame_hash"], capture["frame_index"])
+        return formatted_text
+
+    @staticmethod
+    def ocr_settings() -> dict:
+        """
+        Get every setting that influences the result of a capture, used to key cached results
+        :return: Dict of settings
+        """
+        return {
+            **ExtractText.raw_ocr_settings(),
+            "language": config("UserSettings", "programming_language"),
+            "formatting": dict(config()["Formatting"]),
+        }
+
+    @staticmethod
+    def raw_ocr_settings() -> dict:
+        """
+        Get the settings that influence the raw OCR text of a frame, used to key pre-OCR timelines
+        :return: Dict of settings
+        """
+        return {
+            "ocr_language": "eng",
+            "ocr_engine": ExtractText.ocr_engine(),
+            "ocr_engine_options": ExtractText.ocr_engine_options(),
+            "tesseract_config": ExtractText.tesseract_config(),
+            "preprocessing": ExtractText.preprocessing_settings(),
+            "regions": {
+                "enabled": config("OCR", "region_detection", fallback="True") == "True",
+                "min_share": config("OCR", "min_region_share", fallback="0.4"),
+                "max_regions": config("OCR", "max_regions", fallback="4"),
+            },
+        }
+
+    @staticmethod
+    def preprocessing_settings() -> dict:
+        """
+        Get the frame preprocessing options from the [OCR] config section
+        :return: Keyword arguments for preprocess_frame()
+        """
+        return {
+            "grayscale": config("OCR", "grayscale", fallback="True") == "True",
+            "invert_dark_theme": config("OCR", "invert_dark_theme", fallback="True") == "True",
+            "crop_code_region": config("OCR", "crop_code_region", fallback="True") == "True",
+            "rescale": config("OCR", "rescale", fallback="True") == "True",
+            "target_text_height": int(config("OCR", "target_text_height", fallback="32")),
+            "adaptive_threshold": config("OCR", "adaptive_threshold", fallback="True") == "True",
+            "threshold_block_size": int(config("OCR", "threshold_block_size", fallback="31")),
+            "threshold_c": int(config("OCR", "threshold_c", fallback="15")),
+        }
+
+    @staticmethod
+    def tesseract_config() -> str:
+        """
+        Get the extra tesseract command line options from the [OCR] config section
+        :return: Tesseract options as string
+        """
+        return f"--dpi {config('OCR', 'dpi', fallback='300')}"
+
+    @staticmethod
+    def ocr_engine() -> str:
+        """
+        Get the OCR engine from the [OCR] config section, auto uses an in-process tesseract engine where installed,
+        see ocr_engines.OCR_ENGINES for the engines that can be selected
+        :return: Name of the OCR engine
+        """
+        return config("OCR", "engine", fallback="auto")
+
+    @staticmethod
+    def ocr_engine_options() -> dict:
+        """
+        Get the settings of the selected OCR engine from the [OCR] config section, only the opencv_dnn engine has any
+        :return: Dict of the settings that are set
+        """
+        if ExtractText.ocr_engine() != "opencv_dnn":
+            return {}
+        options = {
+            "dnn_model": config("OCR", "dnn_model", fallback=""),
+            "dnn_vocabulary": config("OCR", "dnn_vocabulary", fallback=""),
+            "dnn_input_width": config("OCR", "dnn_input_width", fallback="100"),
+            "dnn_input_height": config("OCR", "dnn_input_height", fallback="32"),
+            "dnn_rgb_input": config("OCR", "dnn_rgb_input", fallback="False"),
+        }
+        return {name: value for name, value in options.items() if value}
+
+    @staticmethod
+    def ocr_frame(frame, video_hash: str = None) -> str:
+        """
+        Preprocess and run OCR on a frame in the OCR worker pool and wait for the result. If region detection is
+        enabled each text region of the frame is OCR'd in parallel and the text joined in reading order.
+        :param frame: Frame to read text from
+        :param video_hash: [Optional] Hash of the video, used to reuse the regions detected in the same layout
+        :return: Raw OCR text
+        :raises OcrQueueFullError: If the OCR queue stayed full for the pool timeout
+        :raises OcrTimeoutError: If OCR did not finish within the pool timeout
+        """
+        return ExtractText.join_region_texts(get_ocr_worker_pool().run_many(ExtractText.ocr_calls(frame, video_hash)))
+
+    @staticmethod
+    def ocr_calls(frame, video_hash: str = None) -> list:
+        """
+        Build the OCR worker pool calls reading a frame, one per text region or one for the whole frame if no regions
+        were found
+        :param frame: Frame to read text from
+        :param video_hash: [Optional] Hash of the video, used to reuse the regions detected in the same layout
+        :return: List of argument tuples for the OCR worker pool
+        """
+        preprocessing = ExtractText.preprocessing_settings()
+        tesseract_cmd = pytesseract.pytesseract.tesseract_cmd
+        engine, engine_options = ExtractText.ocr_engine(), ExtractText.ocr_engine_options()
+        regions = ExtractText.detect_regions(frame, video_hash)
+        if not regions:
+            return [(frame, tesseract_cmd, ExtractText.tesseract_config(), preprocessing, engine, engine_options)]
+        region_preprocessing = {**preprocessing, "crop_code_region": False}
+        logging.info(f"OCR'ing {len(regions)} regions covering "
+                     f"{sum(width * height for _, _, width, height in regions)} of {frame.shape[0] * frame.shape[1]} "
+                     f"pixels")
+        return [(frame[y:y + height, x:x + width], tesseract_cmd, ExtractText.tesseract_config(), region_preprocessing,
+                 engine, engine_options)
+                for x, y, width, height in regions]
+
+    @staticmethod
+    def join_region_texts(texts: list) -> str:
+        """
+        Join the OCR text of the regions of a frame in reading order
+        :param texts: Raw OCR text of each region
+        :return: Raw OCR text of the frame
+        """
+        return texts[0] if len(texts) == 1 else "\n".join(text.rstrip() for text in texts)
+
+    @staticmethod
+    def detect_regions(frame, video_hash: str = None) -> list:
+        """
+        Find the text regions of a frame as configured by the [OCR] config section, reusing the regions of an earlier
+        frame of the video with the same layout
+        :param frame: Frame to find text regions in
+        :param video_hash: [Optional] Hash of the video, regions are not cached without it
+        :return: List of regions as (x, y, width, height), empty if region detection is disabled or found no text
+        """
+        if config("OCR", "region_detection", fallback="True") != "True":
+            return []
+        gray = to_grayscale(frame)
+        strokes = text_strokes(gray)
+        cache_key = f"{video_hash}:{gray.shape}" if video_hash is not None else None
+        regions = region_cache.get(cache_key, strokes) if cache_key is not None else None
+        if regions is None:
+            regions = detect_text_regions(gray, min_share=float(config("OCR", "min_region_share", fallback="0.4")),
+                                          max_regions=int(config("OCR", "max_regions", fallback="4")),
+                                          strokes=strokes)
+            if cache_key is not None and regions:
+                region_cache.put(cache_key, strokes, regions)
+        return regions
+
+    @staticmethod
+    def start_pre_ocr(filename: str) -> Union[PreOcrJob, None]:
+        """
+        Start pre-OCR of a whole video on a background thread if enabled by the [PreOcr] config section. Captures of
+        the video are then looked up in its timeline instead of being OCR'd on demand.
+        :param filename: Filename of the video
+        :return: PreOcrJob tracking the video or None if pre-OCR is disabled or the video is not in the library
+        """
+        if config("PreOcr", "enabled", fallback="False") != "True":
+            return None
+        video_hash = ExtractText.get_video_hash(filename)
+        if video_hash is None:
+            return None
+        settings_key = settings_fingerprint(ExtractText.raw_ocr_settings())
+        timeline = utils.pre_ocr_manager.get_timeline(video_hash)
+        if timeline is not None and timeline.complete and timeline.settings_key == settings_key:
+            return None
+        job = PreOcrJob(video_hash, f"{utils.get_vid_save_path()}{filename}",
+                        lambda frame: ExtractText.ocr_frame(frame, video_hash), settings_key,
+                        sample_interval=float(config("PreOcr", "sample_interval", fallback="1")),
+                        scene_threshold=float(config("PreOcr", "scene_threshold", fallback="0.002")))
+        return utils.pre_ocr_manager.start(job)
+
+    @staticmethod
+    def get_video_hash(filename: str) -> Union[str, None]:
+        """
+        Get the hash of a video in the users library
+        :param filename: Filename of the video
+        :return: Video hash or None if the video is not in the library
+        """
+        current_video = utils.get_user_data_store().get_video(filename)
+        return current_video["video_hash"] if current_video is not None else None
+
+    @staticmethod
+    def get_video_fps(filename: str) -> Union[float, None]:
+        """
+        Get the frame rate of a video without decoding any frames
+        :param filename: Filename of the video
+        :return: Frames per second or None if the video could not be opened
+        """
+        with get_capture_pool().acquire(f"{utils.get_vid_save_path()}{filename}") as cap:
+            if cap is None:
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS)
+        return fps if fps and fps > 0 else None
+
+    @staticmethod
+    def format_raw_ocr(extracted_text: str) -> Tuple[str, str]:
         """
         Attempts to format a given string to match given programming language
         :param extracted_text: Raw OCR text to format
-        :return: Formatted text as string
+        :return: Formatted text as string and how OpenAI formatted it: "disabled" if OpenAI analysis is off,
+        "cache_hit" if the formatted code was cached, "formatted" if the API formatted it or "failed" if the API
+        failed, leaving the text unformatted
         """
         language = config("UserSettings", "programming_language")
         formatted_text = extracted_text
-        if config("Formatting", "openai_analysis"):
-            formatted_text = ExtractText.openai_format_raw_ocr(formatted_text, language)
-        if config("Formatting", "remove_backticks"):
+        openai_status = "disabled"
+        if config("Formatting", "openai_analysis") == "True":
+            openai_text, cache_hit = ExtractText.openai_format_raw_ocr(formatted_text, language)
+            if openai_text is None:
+                openai_status = "failed"
+            else:
+                openai_status = "cache_hit" if cache_hit else "formatted"
+                formatted_text = openai_text
+        if config("Formatting", "remove_backticks") == "True":
             formatted_text = formatted_text.replace("```", "")
-        if config("Formatting", "remove_language_name"):
+        if config("Formatting", "remove_language_name") == "True":
             formatted_text = formatted_text.replace(language, "", 1)
-        return formatted_text
+        return formatted_text, openai_status
 
     @staticmethod
     def extract_frame_at_timestamp(filename: str, timestamp: float) -> Union[cv2.VideoCapture, None]:
@@ -60,14 +724,13 @@ class ExtractText:
         :param timestamp: Timestamp to extract the frame from
         :return: Returns capture frame or None
         """
-        cap = cv2.VideoCapture(f"{utils.get_vid_save_path()}{filename}")
-        if not cap.isOpened():
-            logging.error(f"Failed to open {filename} stream")
-            return None
-        cap.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
-        ret, frame = cap.read()
-        if ret:
-            cap.release()
+        keyframes = ExtractText.get_keyframes(filename)
+        with get_capture_pool().acquire(f"{utils.get_vid_save_path()}{filename}") as cap:
+            if cap is None:
+                logging.error(f"Failed to open {filename} stream")
+                return None
+            frame = seek_frame(cap, timestamp, keyframes)
+        if frame is not None:
             logging.info(f"Successfully captured frame @ {timestamp}s in file {filename}")
             return frame
         else:
@@ -75,47 +738,42 @@ class ExtractText:
             return None
 
     @staticmethod
-    def openai_format_raw_ocr(extracted_text: str, language: str) -> str:
+    def get_keyframes(filename: str) -> Union[list, None]:
         """
-        "Given an input of potentially raw OCR capture from a video containing Python code, your task is to correct
-        and format the code. Ensure the code's indentation and syntax are accurate. Exclude any content that isn't
-        valid Python code. If no recognizable Python content is detected, return 'ERROR'. Do not provide
-        explanations, leading or trailing backticks, or specify the language in your response. Simply return the
-        corrected code. Avoid making extensive alterations; the goal is to retain the original intent of the capture
-        as closely as possible."
-
-        prompt = f"Fix up the following {language} code snippet: '{extracted_text}'" response =
-        openai.ChatCompletion.create( model="gpt-3.5-turbo", messages=[ {"role": "system", "content": "Given an input
-        of potentially raw OCR capture from a video containing code, your task is to correct and format the code.
-        Ensure the code's indentation and syntax are accurate. Exclude any content that isn't valid for the specified
-        language. If no recognizable content is detected, return 'ERROR'. Do not provide explanations, leading or
-        trailing backticks, or specify the language in your response. Simply return the corrected code. Avoid making
-        extensive alterations; the goal is to retain the original intent of the capture as closely as possible."},
-        {"role": "user", "content": prompt} ] ) return response.choices[0].message['content']
+        Get the keyframe index of a video, starting a background build if the video does not have one yet
+        :param filename: Filename of the video
+        :return: Sorted list of keyframe timestamps or None
+        """
+        video_hash = ExtractText.get_video_hash(filename)
+        if video_hash is None:
+            return None
+        keyframes = utils.keyframe_index_store.get(video_hash)
+        if keyframes is None:
+            utils.build_keyframe_index(video_hash, filename)
+        return keyframes
 
-        Format given text using OpenAI language model API
+    @staticmethod
+    def openai_format_raw_ocr(extracted_text: str, language: str) -> Tuple[Union[str, None], bool]:
+        """
+        Format given text using OpenAI language model API. Text already formatted, give or take whitespace and common
+        OCR errors, is served from the LLM cache without calling the API. Captures formatted at the same time are
+        sent in one request.
         :param extracted_text: Raw extracted text to format
         :param language: Programming language to format the raw text as
-        :return: Formatted code as string
+        :return: Formatted code as string, or None if no API key is set or the API failed or did not answer within
+        the [OpenAI] deadline, and whether the code came from the LLM cache
         """
-        try:
-            prompt = f"Fix up the following {language} code snippet, fix up any indentation errors, syntax errors, " \
-                     f"and anything else that is incorrect: '{extracted_text}'"
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system",
-                     "content": f"You are a coding assistant. You reply only in {language} code "
-                                "that is correct and formatted. Do NOT reply with any explanation, "
-                                f"only code. If you are given something that is not {language} code, "
-                                "you must NOT include it in your response. If nothing is present, "
-                                "simply return 'ERROR' and nothing else. Do NOT return leading or "
-                                "trailing"
-                                "backticks and do NOT return the language before the code snippet."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message['content']
-        except openai.OpenAIError as error:
-            logging.exception(error)
-            return extracted_text
+        cache = get_llm_cache()
+        key = LlmCache.make_key(extracted_text, language, config("OpenAI", "model", fallback="gpt-3.5-turbo"))
+        if cache is not None:
+            formatted_text = cache.get(key)
+            if formatted_text is not None:
+                return formatted_text, True
+        client = get_llm_client()
+        if client is None:
+            logging.error("OpenAI analysis is enabled but no OpenAI API key is set")
+            return None, False
+        formatted_text = client.format_code(extracted_text, language)
+        if cache is not None and formatted_text is not None:
+            cache.put(key, formatted_text)
+        return formatted_text, False
@@ -0,0 +1,226 @@
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Scale factors outside these bounds are clamped, so badly estimated text heights cannot blow up the frame
+MIN_SCALE = 0.5
+MAX_SCALE = 4.0
+# Blocks with fewer stroke pixels per pixel than this are outlines (face cam, video player) rather than text
+MIN_STROKE_DENSITY = 0.05
+
+
+def to_grayscale(frame: np.ndarray) -> np.ndarray:
+    """
+    Convert a BGR frame to grayscale, grayscale frames are returned unchanged
+    """
+    return frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def is_dark_theme(gray: np.ndarray) -> bool:
+    """
+    Check if a frame shows light text on a dark background
+    :param gray: Grayscale frame
+    :return: True if the background is dark
+    """
+    return float(np.median(gray)) < 128
+
+
+def text_mask(gray: np.ndarray) -> np.ndarray:
+    """
+    Binarise a frame so text (whichever of dark or light pixels is in the minority) is white
+    :param gray: Grayscale frame
+    :return: Binary mask
+    """
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return mask if cv2.countNonZero(mask) < mask.size / 2 else cv2.bitwise_not(mask)
+
+
+def text_strokes(gray: np.ndarray) -> np.ndarray:
+    """
+    Find text strokes by their strong local gradient
+    :param gray: Grayscale frame
+    :return: Binary mask of stroke pixels
+    """
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, strokes = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return strokes
+
+
+def strokes_outside(strokes: np.ndarray, regions: List[Tuple[int, int, int, int]]) -> int:
+    """
+    Count the stroke pixels that are not inside any of the regions
+    :param strokes: Stroke mask from text_strokes()
+    :param regions: List of regions as (x, y, width, height)
+    :return: Number of stroke pixels outside the regions
+    """
+    outside = strokes.copy()
+    for x, y, width, height in regions:
+        outside[y:y + height, x:x + width] = 0
+    return cv2.countNonZero(outside)
+
+
+def detect_text_regions(gray: np.ndarray, min_share: float = 0.4, max_regions: int = 4, padding: int = 10,
+                        strokes: Optional[np.ndarray] = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Find text-dense rectangular regions of a frame, e.g. the editor pane and terminal. Characters are joined into
+    lines and lines into blocks with a morphological close of the text strokes. Blocks with few strokes compared to the
+    densest block (file tree labels, UI chrome) and sparse blocks (outlines of a face cam or video player) are dropped.
+    :param gray: Grayscale frame
+    :param min_share: Minimum stroke count of a region as a fraction of the stroke count of the densest region
+    :param max_regions: Maximum number of regions returned, the densest are kept
+    :param padding: Pixels added around each region
+    :param strokes: [Optional] Stroke mask of the frame if it has already been computed
+    :return: List of regions as (x, y, width, height) in reading order (top to bottom, left to right)
+    """
+    if strokes is None:
+        strokes = text_strokes(gray)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(gray.shape[1] // 50, 3), max(gray.shape[0] // 12, 3)))
+    blocks = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    scored = []
+    for contour in contours:
+        x, y, width, height = cv2.boundingRect(contour)
+        stroke_count = cv2.countNonZero(strokes[y:y + height, x:x + width])
+        if stroke_count >= MIN_STROKE_DENSITY * width * height:
+            scored.append((stroke_count, (x, y, width, height)))
+    scored.sort(reverse=True)
+    if not scored:
+        return []
+    regions = []
+    for stroke_count, (x, y, width, height) in scored[:max_regions]:
+        if stroke_count < scored[0][0] * min_share:
+            break
+        x, y = max(x - padding, 0), max(y - padding, 0)
+        regions.append((x, y, min(width + 2 * padding, gray.shape[1] - x),
+                        min(height + 2 * padding, gray.shape[0] - y)))
+    return sorted(regions, key=lambda region: (region[1], region[0]))
+
+
+class RegionCache:
+    """
+    Text regions detected per video layout. A frame reuses the regions of a cached layout if its text strokes still
+    fall inside them, so captures later in the same scene or layout skip region detection and OCR the same crops. Once
+    text appears outside the cached regions (a terminal opens, code scrolls past the region) the frame is re-detected.
+    """
+
+    def __init__(self, layouts_per_video: int = 8, tolerance: float = 0.02):
+        """
+        :param layouts_per_video: Maximum number of layouts remembered per video
+        :param tolerance: Allowed growth of strokes outside the regions, as a fraction of the strokes inside them
+        """
+        self.layouts_per_video = layouts_per_video
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self._layouts = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, strokes: np.ndarray) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Get cached regions that still fit a frame
+        :param key: Video hash (and any settings the regions depend on)
+        :param strokes: Stroke mask of the frame from text_strokes()
+        :return: List of regions or None
+        """
+        with self._lock:
+            layouts = list(self._layouts.get(key, []))
+        for regions, outside, inside in reversed(layouts):
+            if strokes_outside(strokes, regions) <= outside + inside * self.tolerance:
+                with self._lock:
+                    self.hits += 1
+                return regions
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, strokes: np.ndarray, regions: List[Tuple[int, int, int, int]]) -> None:
+        """
+        Cache the regions detected for a frame
+        :param key: Video hash (and any settings the regions depend on)
+        :param strokes: Stroke mask of the frame from text_strokes()
+        :param regions: Regions detected in the frame
+        """
+        outside = strokes_outside(strokes, regions)
+        inside = cv2.countNonZero(strokes) - outside
+        with self._lock:
+            layouts = self._layouts.setdefault(key, [])
+            layouts.append((regions, outside, inside))
+            del layouts[:-self.layouts_per_video]
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters
+        :return: Dict containing hits and misses
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def detect_code_region(gray: np.ndarray, padding: int = 10) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the most text-dense rectangular region of a frame, e.g. the editor pane
+    :param gray: Grayscale frame
+    :param padding: Pixels added around the detected region
+    :return: Region as (x, y, width, height) or None if no text was found
+    """
+    regions = detect_text_regions(gray, min_share=1.0, max_regions=1, padding=padding)
+    return regions[0] if regions else None
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """
+    Estimate the height in pixels of the characters in a frame from the median height of its connected components
+    :param gray: Grayscale frame
+    :return: Character height or None if too few characters were found
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(text_mask(gray), connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    heights = heights[(areas >= 8) & (heights >= 4) & (heights <= gray.shape[0] / 4)]
+    if len(heights) < 10:
+        return None
+    return float(np.median(heights))
+
+
+def preprocess_frame(frame: np.ndarray, grayscale: bool = True, invert_dark_theme: bool = True,
+                     crop_code_region: bool = True, rescale: bool = True, target_text_height: int = 32,
+                     adaptive_threshold: bool = True, threshold_block_size: int = 31,
+                     threshold_c: int = 15) -> np.ndarray:
+    """
+    Prepare a frame for OCR. Tesseract is fastest and most accurate on dark text on a light background, with
+    characters around 30 pixels high and none of the surrounding UI. Inversion and thresholding work on grayscale
+    frames so either one implies grayscale.
+    :param frame: BGR frame
+    :param grayscale: Convert to grayscale
+    :param invert_dark_theme: Invert frames showing light text on a dark background
+    :param crop_code_region: Crop to the most text-dense region of the frame
+    :param rescale: Scale the frame so characters are target_text_height pixels high
+    :param target_text_height: Character height in pixels to scale to
+    :param adaptive_threshold: Binarise the frame with a locally adaptive threshold
+    :param threshold_block_size: Size of the neighbourhood used by the adaptive threshold, must be odd
+    :param threshold_c: Constant subtracted from the neighbourhood mean by the adaptive threshold
+    :return: Preprocessed frame
+    """
+    gray = to_grayscale(frame)
+    image = gray if grayscale or invert_dark_theme or adaptive_threshold else frame
+    if crop_code_region:
+        region = detect_code_region(gray)
+        if region is not None:
+            x, y, width, height = region
+            gray = gray[y:y + height, x:x + width]
+            image = image[y:y + height, x:x + width]
+    if invert_dark_theme and is_dark_theme(gray):
+        image = cv2.bitwise_not(image)
+    if rescale:
+        text_height = estimate_text_height(gray)
+        if text_height is not None:
+            scale = min(max(target_text_height / text_height, MIN_SCALE), MAX_SCALE)
+            if abs(scale - 1) > 0.1:
+                image = cv2.resize(image, None, fx=scale, fy=scale,
+                                   interpolation=cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA)
+    if adaptive_threshold:
+        image = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                      threshold_block_size | 1, threshold_c)
+    return np.ascontiguousarray(image)
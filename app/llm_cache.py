@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+# Characters OCR commonly reads as one another, folded to one character in cache keys
+OCR_CONFUSIONS = str.maketrans({
+    "0": "o", "O": "o",
+    "1": "l", "I": "l", "|": "l",
+    "‘": "'", "’": "'", "`": "'", "´": "'",
+    "“": '"', "”": '"',
+    "–": "-", "—": "-",
+    " ": " ", "​": "",
+})
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_ocr_text(text: str) -> str:
+    """
+    Normalise OCR text for use in a cache key, so captures of the same code that only differ by OCR noise share a key.
+    Runs of whitespace are collapsed to a single space and characters OCR commonly confuses (0/O, 1/l/I/|, curly and
+    straight quotes, dashes) are folded together.
+    :param text: Raw OCR text
+    :return: Normalised text
+    """
+    return WHITESPACE.sub(" ", text.translate(OCR_CONFUSIONS)).strip()
+
+
+class LlmCache:
+    """
+    Cache of code formatted by the LLM, keyed by the normalised OCR text, programming language and model, with an in
+    memory LRU tier and a size capped on-disk tier. Entries expire ttl seconds after they are written.
+
+    Captures of the same code in nearby frames, or of the same slide in another video, produce OCR text that only
+    differs by noise the normalisation removes, so they are formatted without calling the API.
+    """
+
+    def __init__(self, directory: Union[str, Path, None] = "data/llm_cache", ttl: float = 30 * 24 * 60 * 60,
+                 memory_entries: int = 256, disk_size_limit: int = 50 * 1024 * 1024):
+        """
+        :param directory: Directory of the on-disk tier, None disables the disk tier
+        :param ttl: Seconds an entry is used after it is written
+        :param memory_entries: Maximum number of entries kept in memory
+        :param disk_size_limit: Maximum total size in bytes of the on-disk tier
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_size_limit = disk_size_limit
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._disk_sizes: Optional["OrderedDict[str, int]"] = None
+        self._disk_total = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(text: str, language: str, model: str) -> str:
+        """
+        Build the cache key for a snippet
+        :param text: Raw OCR text
+        :param language: Programming language the text is formatted as
+        :param model: Model formatting the text
+        :return: Cache key as hex string
+        """
+        return hashlib.sha256(f"{model}\0{language}\0{normalize_ocr_text(text)}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load_disk_index(self) -> None:
+        """
+        Scan the on-disk tier once, ordering entries oldest first, must be called with the lock held
+        """
+        if self._disk_sizes is not None:
+            return
+        self._disk_sizes = OrderedDict()
+        self._disk_total = 0
+        if self.directory is None or not self.directory.exists():
+            return
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            size = entry.stat().st_size
+            self._disk_sizes[entry.name[:-5]] = size
+            self._disk_total += size
+
+    def _remember_memory(self, key: str, created: float, text: str) -> None:
+        """
+        Add an entry to the memory tier evicting the least recently used entry, must be called with the lock held
+        """
+        self._memory[key] = (created, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        """
+        Remove an entry from both tiers, must be called with the lock held
+        """
+        self._memory.pop(key, None)
+        if self._disk_sizes is not None and key in self._disk_sizes:
+            self._disk_total -= self._disk_sizes.pop(key)
+            self._entry_path(key).unlink(missing_ok=True)
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        """
+        Look up a key in the memory tier then the disk tier, must be called with the lock held
+        :return: Tuple of the time the entry was written and the formatted text, or None
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory is None:
+            return None
+        self._load_disk_index()
+        if key not in self._disk_sizes:
+            return None
+        try:
+            with self._entry_path(key).open("r", encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+            created, text = entry["created"], entry["text"]
+        except (json.JSONDecodeError, KeyError, OSError):
+            self._forget(key)
+            return None
+        self._disk_sizes.move_to_end(key)
+        self._remember_memory(key, created, text)
+        return created, text
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get formatted code that has not expired
+        :param key: Cache key from make_key()
+        :return: Formatted code or None
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self._forget(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, text: str) -> None:
+        """
+        Store formatted code in both tiers, evicting the oldest disk entries above the size limit
+        :param key: Cache key from make_key()
+        :param text: Formatted code
+        """
+        created = time.time()
+        with self._lock:
+            self._remember_memory(key, created, text)
+            if self.directory is None:
+                return
+            self._load_disk_index()
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                encoded = json.dumps({"created": created, "text": text}).encode("utf-8")
+                self._entry_path(key).write_bytes(encoded)
+            except OSError as error:
+                logging.error(f"Failed to write LLM cache entry {key}: {error}")
+                return
+            self._disk_total += len(encoded) - self._disk_sizes.pop(key, 0)
+            self._disk_sizes[key] = len(encoded)
+            while self._disk_total > self.disk_size_limit and self._disk_sizes:
+                evicted_key, size = self._disk_sizes.popitem(last=False)
+                self._disk_total -= size
+                self._entry_path(evicted_key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters
+        :return: Dict containing hits, misses and disk tier size in bytes
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "disk_bytes": self._disk_total}
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import httpx
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+# Responses retried with backoff, any other error status fails the request straight away
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def system_prompt(language: str) -> str:
+    return f"You are a coding assistant. You reply only in {language} code that is correct and formatted. Do NOT " \
+           f"reply with any explanation, only code. If you are given something that is not {language} code, you " \
+           "must NOT include it in your response. If nothing is present, simply return 'ERROR' and nothing else. " \
+           "Do NOT return leading or trailing backticks and do NOT return the language before the code snippet."
+
+
+def snippet_prompt(text: str, language: str) -> str:
+    return f"Fix up the following {language} code snippet, fix up any indentation errors, syntax errors, and " \
+           f"anything else that is incorrect: '{text}'"
+
+
+def batch_prompt(texts: list, language: str) -> str:
+    return f"Fix up each of the following {len(texts)} {language} code snippets, fix up any indentation errors, " \
+           "syntax errors, and anything else that is incorrect. Reply with only a JSON array of " \
+           f"{len(texts)} strings, the fixed snippets in the same order: {json.dumps(texts)}"
+
+
+def parse_batch_reply(content: str, count: int) -> Optional[list]:
+    """
+    Parse the reply to a batch_prompt()
+    :param content: Content of the reply
+    :param count: Number of snippets in the batch
+    :return: List of formatted snippets or None if the reply is not a JSON array of count strings
+    """
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`").partition("\n")[2]
+    try:
+        snippets = json.loads(content)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(snippets, list) or len(snippets) != count or not all(isinstance(s, str) for s in snippets):
+        return None
+    return snippets
+
+
+def retry_delay(attempt: int, backoff: float, retry_after: Optional[str] = None) -> float:
+    """
+    Seconds to wait before retrying a request, exponential in the attempt with jitter, or the server's Retry-After
+    :param attempt: Number of the attempt that failed, starting at 0
+    :param backoff: Delay after the first attempt
+    :param retry_after: [Optional] Retry-After header of the failed response
+    :return: Seconds to wait
+    """
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+    return backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+class FormatRequest:
+    """
+    A snippet waiting to be formatted.
+    """
+
+    def __init__(self, text: str, language: str, future: asyncio.Future):
+        self.text = text
+        self.language = language
+        self.future = future
+
+
+class LlmClient:
+    """
+    Client formatting OCR text with the OpenAI chat completions API. Requests are sent by an asyncio event loop
+    running on a background thread, over a pool of keep-alive connections, with a per-request timeout, retries with
+    exponential backoff and a limit on concurrent requests. Snippets requested within batch_window of each other are
+    sent together in one request.
+
+    format_code() can be called from any thread and gives up if formatting fails or does not finish within the
+    deadline, so a slow or unavailable API never holds up a capture for longer than that.
+    """
+
+    def __init__(self, api_key: str, base_url: str = OPENAI_BASE_URL, model: str = "gpt-3.5-turbo",
+                 timeout: float = 15.0, deadline: float = 30.0, max_retries: int = 3, backoff: float = 0.5,
+                 max_concurrency: int = 4, batch_window: float = 0.05, max_batch_size: int = 8):
+        """
+        :param api_key: OpenAI API key
+        :param base_url: Base url of the API, e.g. a local stub server for testing
+        :param model: Chat model formatting the snippets
+        :param timeout: Seconds each request may take
+        :param deadline: Seconds format_code() waits for a snippet, including retries, before giving up
+        :param max_retries: Times a request that timed out or failed with a retryable status is retried
+        :param backoff: Seconds waited before the first retry, doubled for each further retry
+        :param max_concurrency: Maximum number of requests in flight
+        :param batch_window: Seconds to wait for more snippets to send in the same request, 0 disables batching
+        :param max_batch_size: Maximum number of snippets sent in one request
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.requests_sent = 0
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._semaphore = None
+        self._queue = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """
+        Start the event loop thread on first use
+        """
+        with self._lock:
+            if self._loop is None:
+                started = threading.Event()
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, args=(started,), name="llm-client",
+                                                daemon=True)
+                self._thread.start()
+                started.wait()
+            return self._loop
+
+    def _run_loop(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout, headers={"Authorization": f"Bearer {self.api_key}"},
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._batch_requests())
+        started.set()
+        self._loop.run_forever()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, self._client.aclose(), return_exceptions=True))
+        self._loop.close()
+
+    def format_code(self, text: str, language: str) -> Optional[str]:
+        """
+        Format a snippet, waiting at most deadline seconds
+        :param text: Raw OCR text to format
+        :param language: Programming language to format the text as
+        :return: Formatted code or None if formatting failed or timed out
+        """
+        future = asyncio.run_coroutine_threadsafe(self.format_code_async(text, language), self._ensure_started())
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            future.cancel()
+            logging.error(f"Formatting with {self.model} did not finish within {self.deadline}s")
+        except (httpx.HTTPError, IndexError, KeyError, TypeError, ValueError) as error:
+            logging.error(f"Formatting with {self.model} failed: {error}")
+        return None
+
+    async def format_code_async(self, text: str, language: str) -> str:
+        """
+        Format a snippet, must be awaited on the client's event loop
+        :param text: Raw OCR text to format
+        :param language: Programming language to format the text as
+        :return: Formatted code
+        :raises httpx.HTTPError: If the request failed after all retries
+        """
+        request = FormatRequest(text, language, asyncio.get_running_loop().create_future())
+        await self._queue.put(request)
+        return await request.future
+
+    async def _batch_requests(self) -> None:
+        """
+        Collect queued snippets into batches of the same language and send each batch
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            window_end = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = window_end - loop.time()
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                elif remaining <= 0:
+                    break
+                else:
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            by_language = defaultdict(list)
+            for request in batch:
+                by_language[request.language].append(request)
+            for language, requests in by_language.items():
+                loop.create_task(self._send_batch(language, requests))
+
+    async def _send_batch(self, language: str, requests: list) -> None:
+        """
+        Format a batch of snippets, sending snippets one by one if the reply to the batch cannot be parsed
+        """
+        requests = [request for request in requests if not request.future.done()]
+        try:
+            results = None
+            if len(requests) > 1:
+                reply = await self._complete(batch_prompt([request.text for request in requests], language), language)
+                results = parse_batch_reply(reply, len(requests))
+                if results is None:
+                    logging.warning(f"Could not parse the reply to a batch of {len(requests)} snippets, sending them "
+                                    "one by one")
+            if results is None:
+                results = await asyncio.gather(*(self._complete(snippet_prompt(request.text, language), language)
+                                                 for request in requests))
+            for request, result in zip(requests, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+        except Exception as error:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(error)
+
+    async def _complete(self, prompt: str, language: str) -> str:
+        """
+        Send a chat completion request, retrying timeouts, connection errors and retryable statuses
+        :return: Content of the reply
+        :raises httpx.HTTPError: If the request failed after all retries
+        """
+        body = {"model": self.model, "messages": [{"role": "system", "content": system_prompt(language)},
+                                                  {"role": "user", "content": prompt}]}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    self.requests_sent += 1
+                    response = await self._client.post("/chat/completions", json=body)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+                retry_after = response.headers.get("Retry-After")
+                logging.warning(f"Chat completion failed with status {response.status_code}, retrying")
+            except (httpx.TimeoutException, httpx.TransportError) as error:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Chat completion failed, retrying: {error!r}")
+            await asyncio.sleep(retry_delay(attempt, self.backoff, retry_after))
+
+    def close(self) -> None:
+        """
+        Close the connection pool and stop the event loop thread
+        """
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
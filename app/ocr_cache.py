@@ -0,0 +1,219 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+
+
+def perceptual_hash(frame: np.ndarray, hash_size: int = 16) -> int:
+    """
+    Calculate a difference hash (dHash) of a frame. Visually identical frames, e.g. the same slide with compression
+    noise, produce hashes with a small hamming distance.
+    :param frame: BGR or grayscale frame
+    :param hash_size: Width/height of the hash grid, the hash has hash_size * hash_size bits
+    :return: Perceptual hash as int
+    """
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    resized = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (resized[:, 1:] > resized[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(first_hash: int, second_hash: int) -> int:
+    """
+    Number of differing bits between two perceptual hashes
+    """
+    return bin(first_hash ^ second_hash).count("1")
+
+
+def settings_fingerprint(settings: dict) -> str:
+    """
+    Stable short fingerprint of the OCR/formatting settings that influence a result
+    :param settings: Settings dict
+    :return: Hex fingerprint
+    """
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class OcrCache:
+    """
+    Content addressed cache of capture results with an in memory LRU tier and a size capped on-disk tier.
+
+    Results are keyed by (video hash, frame index, settings fingerprint) so repeat captures of the same frame, by any
+    user, skip decoding and OCR entirely. Frames are also indexed by perceptual hash per video and settings, so
+    visually identical frames a few seconds apart share one OCR result. A whole-frame hash cannot tell a single typed
+    character from a blinking cursor, which is why similar frame matches are limited to a short window of frames.
+    """
+
+    def __init__(self, directory: Union[str, Path, None] = "data/ocr_cache", memory_entries: int = 256,
+                 disk_size_limit: int = 100 * 1024 * 1024, phash_distance: int = 3, phash_entries: int = 512):
+        """
+        :param directory: Directory of the on-disk tier, None disables the disk tier
+        :param memory_entries: Maximum number of results kept in memory
+        :param disk_size_limit: Maximum total size in bytes of the on-disk tier
+        :param phash_distance: Maximum hamming distance for two frames to be treated as identical
+        :param phash_entries: Maximum number of perceptual hashes remembered per video and settings
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self.memory_entries = memory_entries
+        self.disk_size_limit = disk_size_limit
+        self.phash_distance = phash_distance
+        self.phash_entries = phash_entries
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._phashes = {}
+        self._disk_sizes: Optional["OrderedDict[str, int]"] = None
+        self._disk_total = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(video_hash: str, frame_index: int, settings: dict) -> str:
+        """
+        Build the cache key for a frame
+        :param video_hash: Hash of the video
+        :param frame_index: Index of the frame in the video
+        :param settings: OCR/formatting settings (engine options, language, ...) that influence the result
+        :return: Cache key as hex string
+        """
+        return hashlib.sha256(f"{video_hash}:{frame_index}:{settings_fingerprint(settings)}".encode("utf-8")) \
+            .hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}.txt"
+
+    def _load_disk_index(self) -> None:
+        """
+        Scan the on-disk tier once, ordering entries oldest first, must be called with the lock held
+        """
+        if self._disk_sizes is not None:
+            return
+        self._disk_sizes = OrderedDict()
+        self._disk_total = 0
+        if self.directory is None or not self.directory.exists():
+            return
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".txt")),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            size = entry.stat().st_size
+            self._disk_sizes[entry.name[:-4]] = size
+            self._disk_total += size
+
+    def _remember_memory(self, key: str, text: str) -> None:
+        """
+        Add a result to the memory tier evicting the least recently used entry, must be called with the lock held
+        """
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """
+        Look up a key in the memory tier then the disk tier, must be called with the lock held
+        :param key: Cache key
+        :return: Cached result or None
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory is None:
+            return None
+        self._load_disk_index()
+        if key not in self._disk_sizes:
+            return None
+        try:
+            text = self._entry_path(key).read_text(encoding="utf-8")
+        except OSError:
+            self._disk_total -= self._disk_sizes.pop(key)
+            return None
+        self._disk_sizes.move_to_end(key)
+        self._remember_memory(key, text)
+        return text
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get a cached result
+        :param key: Cache key from make_key()
+        :return: Cached result or None
+        """
+        with self._lock:
+            text = self._lookup(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return text
+
+    def find_similar(self, video_hash: str, settings: dict, frame_hash: int, frame_index: int,
+                     max_frame_distance: int) -> Optional[str]:
+        """
+        Get the result of a previously captured nearby frame of the same video that looks identical
+        :param video_hash: Hash of the video
+        :param settings: OCR/formatting settings that influence the result
+        :param frame_hash: Perceptual hash of the frame
+        :param frame_index: Index of the frame in the video
+        :param max_frame_distance: Maximum number of frames between the two frames
+        :return: Cached result or None
+        """
+        with self._lock:
+            for other_hash, other_index, key in reversed(
+                    self._phashes.get((video_hash, settings_fingerprint(settings)), [])):
+                if abs(frame_index - other_index) <= max_frame_distance \
+                        and hamming_distance(frame_hash, other_hash) <= self.phash_distance:
+                    text = self._lookup(key)
+                    if text is not None:
+                        self.similar_hits += 1
+                        return text
+        return None
+
+    def put(self, key: str, text: str, video_hash: Optional[str] = None, settings: Optional[dict] = None,
+            frame_hash: Optional[int] = None, frame_index: Optional[int] = None) -> None:
+        """
+        Store a result in both tiers and optionally index it by perceptual hash
+        :param key: Cache key from make_key()
+        :param text: Result to cache
+        :param video_hash: [Optional] Hash of the video, required for perceptual hash dedupe
+        :param settings: [Optional] Settings used, required for perceptual hash dedupe
+        :param frame_hash: [Optional] Perceptual hash of the frame
+        :param frame_index: [Optional] Index of the frame, required for perceptual hash dedupe
+        """
+        with self._lock:
+            self._remember_memory(key, text)
+            if None not in (frame_hash, frame_index, video_hash, settings):
+                phashes = self._phashes.setdefault((video_hash, settings_fingerprint(settings)), [])
+                phashes.append((frame_hash, frame_index, key))
+                del phashes[:-self.phash_entries]
+            if self.directory is None:
+                return
+            self._load_disk_index()
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                encoded = text.encode("utf-8")
+                self._entry_path(key).write_bytes(encoded)
+            except OSError as error:
+                logging.error(f"Failed to write OCR cache entry {key}: {error}")
+                return
+            self._disk_total += len(encoded) - self._disk_sizes.pop(key, 0)
+            self._disk_sizes[key] = len(encoded)
+            while self._disk_total > self.disk_size_limit and self._disk_sizes:
+                evicted_key, size = self._disk_sizes.popitem(last=False)
+                self._disk_total -= size
+                self._entry_path(evicted_key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters
+        :return: Dict containing hits, similar frame hits, misses and disk tier size in bytes
+        """
+        with self._lock:
+            return {"hits": self.hits, "similar_hits": self.similar_hits, "misses": self.misses,
+                    "disk_bytes": self._disk_total}
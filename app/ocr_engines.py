@@ -0,0 +1,412 @@
+import inspect
+import logging
+import os
+import shlex
+import statistics
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy
+import pytesseract
+try:
+    from frame_preprocessing import is_dark_theme, to_grayscale
+except ModuleNotFoundError:
+    from app.frame_preprocessing import is_dark_theme, to_grayscale
+
+# Engines by name, filled in by register_ocr_engine()
+OCR_ENGINES = {}
+# "auto" resolves to the first of these engines that can be loaded
+OCR_ENGINE_PREFERENCE = ("tesserocr", "pytesseract")
+
+
+def parse_tesseract_config(tesseract_config: str) -> dict:
+    """
+    Parse tesseract command line options into the settings of an in-process engine
+    :param tesseract_config: Tesseract options, e.g. "--dpi 300 --psm 6 -c preserve_interword_spaces=1"
+    :return: Dict containing language, psm, oem, dpi (None when not given) and a dict of variables
+    """
+    options = {"language": None, "psm": None, "oem": None, "dpi": None, "variables": {}}
+    tokens = shlex.split(tesseract_config)
+    index = 0
+    while index < len(tokens):
+        option = tokens[index]
+        value = tokens[index + 1] if index + 1 < len(tokens) else None
+        if option in ("--psm", "--oem", "--dpi") and value is not None:
+            options[option[2:]] = int(value)
+        elif option == "-l" and value is not None:
+            options["language"] = value
+        elif option == "-c" and value is not None and "=" in value:
+            name, _, variable_value = value.partition("=")
+            options["variables"][name] = variable_value
+        else:
+            logging.warning(f"Ignoring unsupported tesseract option {option}")
+            index += 1
+            continue
+        index += 2
+    return options
+
+
+def join_words(words: List[dict], indent: bool = False) -> str:
+    """
+    Join recognised words into text, one line per line id and a blank line between paragraphs
+    :param words: Word boxes in reading order, each with a "line" key of (block, paragraph, line) numbers
+    :param indent: Indent each line by the spaces that fit between the left-most word and its first word
+    :return: Text
+    """
+    if not words:
+        return ""
+    char_width = statistics.median(word["width"] / len(word["text"]) for word in words) if indent else 0
+    margin = min(word["left"] for word in words)
+    lines = []
+    previous_line = None
+    for word in words:
+        if word["line"] != previous_line:
+            if previous_line is not None and word["line"][:2] != previous_line[:2]:
+                lines.append("")
+            lines.append(" " * round((word["left"] - margin) / char_width) if indent and char_width else "")
+            lines[-1] += word["text"]
+            previous_line = word["line"]
+        else:
+            lines[-1] += " " + word["text"]
+    return "\n".join(lines)
+
+
+def register_ocr_engine(engine_class):
+    """
+    Class decorator adding an OcrEngine to the engines selectable with the engine setting of the [OCR] config section
+    :raises TypeError: If the engine does not implement every abstract method of OcrEngine
+    """
+    if inspect.isabstract(engine_class):
+        raise TypeError(f"OCR engine {engine_class.__name__} does not implement "
+                        f"{', '.join(sorted(engine_class.__abstractmethods__))}")
+    OCR_ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+
+class OcrResult:
+    """
+    Text read from an image by an OcrEngine.
+    """
+
+    def __init__(self, text: str, confidence: float, boxes: List[dict], elapsed: float):
+        """
+        :param text: Raw OCR text
+        :param confidence: Mean confidence of the recognised words from 0 to 100
+        :param boxes: Recognised words as dicts containing text, left, top, width, height and confidence
+        :param elapsed: Seconds recognition took
+        """
+        self.text = text
+        self.confidence = confidence
+        self.boxes = boxes
+        self.elapsed = elapsed
+
+
+class OcrEngine(ABC):
+    """
+    Engine reading text from an image, a numpy array as returned by OpenCV. Engines implement recognize().
+    """
+    name = ""
+
+    def __init__(self, options: Optional[dict] = None):
+        """
+        :param options: [Optional] Engine settings, e.g. tesseract_cmd or the dnn_ settings of the [OCR] config section
+        :raises ImportError: If a library the engine needs is not installed
+        :raises RuntimeError: If the engine cannot be loaded, e.g. a model is missing
+        """
+        self.options = options or {}
+
+    @abstractmethod
+    def recognize(self, image, tesseract_config: str = "") -> OcrResult:
+        """
+        Read the text in an image, with the confidence and bounding box of every word
+        :param image: Image to read text from
+        :param tesseract_config: [Optional] Tesseract command line options
+        :return: OcrResult object
+        """
+
+    def image_to_string(self, image, tesseract_config: str = "") -> str:
+        """
+        Read the text in an image
+        :param image: Image to read text from
+        :param tesseract_config: [Optional] Tesseract command line options
+        :return: Raw OCR text
+        """
+        return self.recognize(image, tesseract_config).text
+
+    def close(self) -> None:
+        """
+        Release the resources held by the engine
+        """
+
+
+@register_ocr_engine
+class PytesseractEngine(OcrEngine):
+    """
+    Runs the tesseract executable through pytesseract, which writes every image to a temporary file and starts a new
+    tesseract process loading the language model for each call.
+    """
+    name = "pytesseract"
+
+    def __init__(self, options: Optional[dict] = None):
+        super().__init__(options)
+        if self.options.get("tesseract_cmd"):
+            pytesseract.pytesseract.tesseract_cmd = self.options["tesseract_cmd"]
+
+    def recognize(self, image, tesseract_config: str = "") -> OcrResult:
+        start = time.perf_counter()
+        data = pytesseract.image_to_data(image, config=tesseract_config, output_type=pytesseract.Output.DICT)
+        words = [{"text": text.strip(), "left": data["left"][index], "top": data["top"][index],
+                  "width": data["width"][index], "height": data["height"][index],
+                  "confidence": float(data["conf"][index]),
+                  "line": (data["block_num"][index], data["par_num"][index], data["line_num"][index])}
+                 for index, text in enumerate(data["text"]) if text.strip() and float(data["conf"][index]) >= 0]
+        confidence = statistics.mean(word["confidence"] for word in words) if words else 0.0
+        return OcrResult(join_words(words), confidence, words, time.perf_counter() - start)
+
+    def image_to_string(self, image, tesseract_config: str = "") -> str:
+        return pytesseract.image_to_string(image, config=tesseract_config)
+
+
+@register_ocr_engine
+class TesserocrEngine(OcrEngine):
+    """
+    Runs tesseract in-process through the tesserocr binding of the tesseract API. The language model is loaded once
+    per language and engine mode and kept for the life of the process, and frames are passed as in-memory pixel
+    buffers, so no temporary files are written and no process is started per call.
+    """
+    name = "tesserocr"
+
+    def __init__(self, options: Optional[dict] = None):
+        super().__init__(options)
+        import tesserocr
+        self.tesserocr = tesserocr
+        self.tessdata_path = None
+        if self.options.get("tesseract_cmd"):
+            tessdata_path = os.path.join(os.path.dirname(self.options["tesseract_cmd"]), "tessdata")
+            if os.path.isdir(tessdata_path):
+                self.tessdata_path = tessdata_path
+        self._apis = {}
+        self._lock = threading.Lock()
+
+    def _get_api(self, language: str, oem: Optional[int]):
+        """
+        Get the API instance of a language and engine mode, loading the model on first use, must be called with the
+        lock held
+        """
+        key = (language, oem)
+        if key not in self._apis:
+            kwargs = {"lang": language}
+            if self.tessdata_path is not None:
+                kwargs["path"] = self.tessdata_path
+            if oem is not None:
+                kwargs["oem"] = self.tesserocr.OEM(oem)
+            logging.info(f"Loading tesseract model {language} in process {os.getpid()}")
+            self._apis[key] = self.tesserocr.PyTessBaseAPI(**kwargs)
+        return self._apis[key]
+
+    def _set_image(self, image, tesseract_config: str):
+        """
+        Pass an image and the tesseract options to the API, must be called with the lock held
+        :return: API instance holding the image
+        """
+        options = parse_tesseract_config(tesseract_config)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image = numpy.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        api = self._get_api(options["language"] or "eng", options["oem"])
+        api.SetPageSegMode(self.tesserocr.PSM(options["psm"]) if options["psm"] is not None
+                           else self.tesserocr.PSM.AUTO)
+        for name, value in options["variables"].items():
+            api.SetVariable(name, value)
+        api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        if options["dpi"] is not None:
+            api.SetSourceResolution(options["dpi"])
+        return api
+
+    def recognize(self, image, tesseract_config: str = "") -> OcrResult:
+        start = time.perf_counter()
+        level = self.tesserocr.RIL.WORD
+        with self._lock:
+            api = self._set_image(image, tesseract_config)
+            text = api.GetUTF8Text()
+            words = []
+            for word in self.tesserocr.iterate_level(api.GetIterator(), level):
+                left, top, right, bottom = word.BoundingBox(level)
+                words.append({"text": word.GetUTF8Text(level), "left": left, "top": top, "width": right - left,
+                              "height": bottom - top, "confidence": word.Confidence(level)})
+            confidence = float(api.MeanTextConf())
+            api.Clear()
+        return OcrResult(text, confidence, words, time.perf_counter() - start)
+
+    def image_to_string(self, image, tesseract_config: str = "") -> str:
+        with self._lock:
+            api = self._set_image(image, tesseract_config)
+            text = api.GetUTF8Text()
+            api.Clear()
+        return text
+
+    def close(self) -> None:
+        with self._lock:
+            for api in self._apis.values():
+                api.End()
+            self._apis.clear()
+
+
+def find_word_boxes(gray) -> List[Tuple[int, int, int, int]]:
+    """
+    Find the words of a grayscale image of text by merging the character strokes of each word
+    :param gray: Grayscale image
+    :return: Word boxes as (x, y, width, height) tuples
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if not is_dark_theme(gray):
+        binary = cv2.bitwise_not(binary)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary)
+    heights = [stats[label, cv2.CC_STAT_HEIGHT] for label in range(1, count) if stats[label, cv2.CC_STAT_AREA] > 4]
+    if not heights:
+        return []
+    char_height = statistics.median(heights)
+    # Gaps between the characters of a word are narrower than a space, which is about half a character high
+    kernel = numpy.ones((max(int(char_height / 3), 1), max(int(char_height * 0.4), 2)), numpy.uint8)
+    contours, _ = cv2.findContours(cv2.dilate(binary, kernel), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [box for box in (cv2.boundingRect(contour) for contour in contours) if box[3] >= char_height / 3]
+
+
+def group_lines(boxes: List[Tuple[int, int, int, int]]) -> List[dict]:
+    """
+    Order word boxes into lines of text, lines further apart than usual start a new paragraph
+    :param boxes: Word boxes as (x, y, width, height) tuples
+    :return: Word boxes in reading order as dicts containing left, top, width, height and line
+    """
+    lines = []
+    for box in sorted(boxes, key=lambda box: box[1] + box[3] / 2):
+        centre = box[1] + box[3] / 2
+        if lines and abs(centre - lines[-1]["centre"]) < lines[-1]["height"] / 2:
+            lines[-1]["boxes"].append(box)
+        else:
+            lines.append({"centre": centre, "height": box[3], "boxes": [box]})
+    pitches = [line["centre"] - previous["centre"] for previous, line in zip(lines, lines[1:])]
+    pitch = min(pitches) if pitches else 0
+    words = []
+    paragraph = 0
+    for index, line in enumerate(lines):
+        if index > 0 and pitches[index - 1] > pitch * 1.5:
+            paragraph += 1
+        for x, y, width, height in sorted(line["boxes"]):
+            words.append({"left": x, "top": y, "width": width, "height": height, "line": (0, paragraph, index)})
+    return words
+
+
+def ctc_greedy_decode(scores, vocabulary: List[str]) -> Tuple[str, float]:
+    """
+    Decode the output of a CTC text recognition model by taking the best class of each time step, dropping blanks
+    (class 0) and repeats
+    :param scores: Logits or log probabilities of shape (time steps, 1, classes) or (time steps, classes)
+    :param vocabulary: Character of each class after the blank
+    :return: Tuple of the text and the mean probability of its characters from 0 to 100
+    """
+    scores = scores.reshape(-1, scores.shape[-1]).astype(numpy.float32)
+    probabilities = numpy.exp(scores - scores.max(axis=1, keepdims=True))
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    characters, confidences = [], []
+    previous = 0
+    for best, probability in zip(probabilities.argmax(axis=1), probabilities.max(axis=1)):
+        if best != previous and 0 < best <= len(vocabulary):
+            characters.append(vocabulary[best - 1])
+            confidences.append(probability)
+        previous = best
+    return "".join(characters), float(numpy.mean(confidences)) * 100 if confidences else 0.0
+
+
+@register_ocr_engine
+class OpenCvDnnEngine(OcrEngine):
+    """
+    Reads text with a CTC text recognition model (e.g. the CRNN model of the OpenCV text recognition sample) run by the
+    OpenCV DNN module on the CPU. Words are found by merging character strokes and recognised one by one, and lines
+    are indented by the offset of their first word so the layout of code is kept. Tesseract options are ignored.
+    """
+    name = "opencv_dnn"
+
+    def __init__(self, options: Optional[dict] = None):
+        super().__init__(options)
+        model, vocabulary = self.options.get("dnn_model"), self.options.get("dnn_vocabulary")
+        if not model or not vocabulary:
+            raise RuntimeError("set dnn_model and dnn_vocabulary in the [OCR] config section")
+        try:
+            self.net = cv2.dnn.readNet(model)
+            with open(vocabulary, encoding="utf-8") as vocabulary_file:
+                self.vocabulary = [line.rstrip("\n") for line in vocabulary_file if line.rstrip("\n")]
+        except (cv2.error, OSError) as error:
+            raise RuntimeError(f"could not load {model}: {error}") from error
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = (int(self.options.get("dnn_input_width", 100)),
+                           int(self.options.get("dnn_input_height", 32)))
+        self.rgb_input = str(self.options.get("dnn_rgb_input", False)) == "True"
+        self._lock = threading.Lock()
+
+    def read_word(self, crop) -> Tuple[str, float]:
+        """
+        Recognise the word in a grayscale crop
+        :return: Tuple of the text and its confidence from 0 to 100
+        """
+        if self.rgb_input:
+            crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+        mean = (127.5, 127.5, 127.5) if self.rgb_input else 127.5
+        blob = cv2.dnn.blobFromImage(crop, 1 / 127.5, self.input_size, mean, swapRB=self.rgb_input)
+        with self._lock:
+            self.net.setInput(blob)
+            scores = self.net.forward()
+        return ctc_greedy_decode(scores, self.vocabulary)
+
+    def recognize(self, image, tesseract_config: str = "") -> OcrResult:
+        start = time.perf_counter()
+        gray = to_grayscale(image)
+        words = []
+        for word in group_lines(find_word_boxes(gray)):
+            padding = max(word["height"] // 8, 1)
+            crop = gray[max(word["top"] - padding, 0):word["top"] + word["height"] + padding,
+                        max(word["left"] - padding, 0):word["left"] + word["width"] + padding]
+            word["text"], word["confidence"] = self.read_word(crop)
+            if word["text"]:
+                words.append(word)
+        confidence = statistics.mean(word["confidence"] for word in words) if words else 0.0
+        return OcrResult(join_words(words, indent=True), confidence, words, time.perf_counter() - start)
+
+
+# Engines loaded by this process, kept so the models stay loaded between calls
+engines = {}
+engines_lock = threading.Lock()
+
+
+def get_ocr_engine(name: str = "auto", options: Optional[dict] = None) -> OcrEngine:
+    """
+    Get the process wide OCR engine of a name, pytesseract is used if the engine cannot be loaded
+    :param name: auto or the name of a registered engine, e.g. tesserocr, pytesseract or opencv_dnn
+    :param options: [Optional] Engine settings, e.g. tesseract_cmd or the dnn_ settings of the [OCR] config section
+    :return: OcrEngine object
+    """
+    options = options or {}
+    key = (name, tuple(sorted(options.items())))
+    with engines_lock:
+        if key in engines:
+            return engines[key]
+        candidates = OCR_ENGINE_PREFERENCE if name == "auto" else (name, PytesseractEngine.name)
+        engine = None
+        for candidate in candidates:
+            if candidate not in OCR_ENGINES:
+                logging.warning(f"Unknown OCR engine {candidate}, falling back to pytesseract")
+                continue
+            try:
+                engine = OCR_ENGINES[candidate](options)
+                break
+            except (ImportError, RuntimeError) as error:
+                log = logging.info if name == "auto" else logging.warning
+                log(f"OCR engine {candidate} is not available ({error}), falling back to pytesseract")
+        engines[key] = engine
+        return engine
@@ -0,0 +1,308 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+import pytesseract
+
+try:
+    from frame_preprocessing import preprocess_frame
+    from ocr_engines import get_ocr_engine
+except ModuleNotFoundError:
+    from app.frame_preprocessing import preprocess_frame
+    from app.ocr_engines import get_ocr_engine
+
+
+class OcrQueueFullError(Exception):
+    """
+    Raised when an OCR job is submitted while every worker is busy and the queue is full.
+    """
+
+
+class OcrTimeoutError(Exception):
+    """
+    Raised when an OCR job does not finish within the pool timeout.
+    """
+
+
+class OcrJobNotFoundError(Exception):
+    """
+    Raised when collecting an OCR job that is unknown, was forgotten or has expired.
+    """
+
+
+# Errors running OCR on the pool can fail with: the queue stayed full, the job timed out or expired, a worker process
+# died, or the OCR engine failed inside the worker, e.g. tesseract exited with an error or is not installed
+OCR_ERRORS = (OcrQueueFullError, OcrTimeoutError, OcrJobNotFoundError, BrokenExecutor, pytesseract.TesseractError,
+              RuntimeError, OSError)
+
+
+def tesseract_ocr(image, tesseract_cmd: Optional[str] = None, tesseract_config: str = "",
+                  preprocessing: Optional[dict] = None, engine: str = "auto",
+                  engine_options: Optional[dict] = None) -> str:
+    """
+    Preprocess an image and run tesseract on it, executed inside a worker process. The OCR engine is kept by the worker,
+    so an in-process engine loads its model once per worker rather than once per capture.
+    :param image: Image to read text from
+    :param tesseract_cmd: [Optional] Path of the tesseract executable configured in the parent process
+    :param tesseract_config: [Optional] Extra tesseract command line options
+    :param preprocessing: [Optional] Keyword arguments for preprocess_frame(), None skips preprocessing
+    :param engine: [Optional] Name of the OCR engine, see ocr_engines.get_ocr_engine()
+    :param engine_options: [Optional] Settings of the OCR engine, e.g. its model files
+    :return: Raw OCR text
+    """
+    if preprocessing is not None:
+        image = preprocess_frame(image, **preprocessing)
+    options = {**(engine_options or {}), **({"tesseract_cmd": tesseract_cmd} if tesseract_cmd else {})}
+    return get_ocr_engine(engine, options).image_to_string(image, tesseract_config)
+
+
+def spawn_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Create a process pool whose workers are spawned rather than forked, forking a multi-threaded web server is unsafe
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+class OcrJob:
+    """
+    An OCR job submitted to an OcrWorkerPool.
+    """
+
+    def __init__(self, job_id: str, future: Future, context: Optional[dict] = None):
+        """
+        :param job_id: Unique id of the job
+        :param future: Future resolving to the raw OCR text
+        :param context: [Optional] Caller data kept with the job, e.g. what to do with the result
+        """
+        self.job_id = job_id
+        self.future = future
+        self.context = context if context is not None else {}
+        self.submitted_at = time.monotonic()
+
+    @property
+    def status(self) -> str:
+        if self.future.done():
+            return "failed" if self.future.cancelled() or self.future.exception() is not None else "complete"
+        return "running" if self.future.running() else "queued"
+
+
+class OcrWorkerPool:
+    """
+    Pool of long-lived OCR worker processes with a bounded queue.
+
+    At most max_pending jobs are queued or running at once. Further submissions either wait for a free slot or are
+    rejected with OcrQueueFullError, so bursts of captures cannot pile up unbounded work. Jobs can be waited on
+    directly with run() or submitted for a job id and collected later with get_job().
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None, timeout: float = 30.0,
+                 ocr_function: Callable[..., str] = tesseract_ocr,
+                 executor_factory: Callable[[int], Executor] = spawn_process_pool, finished_job_ttl: float = 300.0):
+        """
+        :param workers: Number of worker processes, defaults to the number of cores
+        :param max_pending: Maximum number of queued or running jobs, defaults to four per worker
+        :param timeout: Seconds to wait for a free slot and for a result in run()
+        :param ocr_function: Picklable function run by the workers
+        :param executor_factory: Function creating the executor for a number of workers
+        :param finished_job_ttl: Seconds finished jobs are kept for get_job()
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self.ocr_function = ocr_function
+        self.executor_factory = executor_factory
+        self.finished_job_ttl = finished_job_ttl
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._executor: Optional[Executor] = None
+        self._jobs = {}
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        """
+        Start the workers on first use, must be called with the lock held
+        """
+        if self._executor is None:
+            self._executor = self.executor_factory(self.workers)
+        return self._executor
+
+    def _replace_broken_executor(self, executor: Executor) -> None:
+        """
+        Discard an executor whose worker died (e.g. tesseract crashed), new workers are started on the next submit
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        logging.error("OCR worker process died, restarting OCR workers")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release_slot(self, future: Future) -> None:
+        self._slots.release()
+        with self._lock:
+            self.completed += 1
+
+    def _prune_jobs(self) -> None:
+        """
+        Forget finished jobs older than finished_job_ttl, must be called with the lock held
+        """
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.future.done() and now - job.submitted_at > self.finished_job_ttl:
+                del self._jobs[job_id]
+
+    def submit(self, *args, context: Optional[dict] = None, block: bool = False) -> str:
+        """
+        Queue an OCR job
+        :param args: Arguments for the OCR function, e.g. the frame to read
+        :param context: [Optional] Caller data kept with the job
+        :param block: Wait up to the pool timeout for a free slot instead of failing immediately
+        :return: Job id
+        :raises OcrQueueFullError: If no slot is free
+        """
+        if not self._slots.acquire(blocking=block, timeout=self.timeout if block else None):
+            with self._lock:
+                self.rejected += 1
+            raise OcrQueueFullError(f"OCR queue is full ({self.max_pending} jobs pending)")
+        try:
+            with self._lock:
+                executor = self._get_executor()
+            try:
+                future = executor.submit(self.ocr_function, *args)
+            except BrokenExecutor:
+                self._replace_broken_executor(executor)
+                with self._lock:
+                    future = self._get_executor().submit(self.ocr_function, *args)
+            job = OcrJob(uuid.uuid4().hex, future, context)
+            with self._lock:
+                self._prune_jobs()
+                self._jobs[job.job_id] = job
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release_slot)
+        return job.job_id
+
+    def get_job(self, job_id: str) -> Optional[OcrJob]:
+        """
+        Get a submitted job
+        :param job_id: Job id returned by submit()
+        :return: OcrJob or None if the id is unknown or has expired
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id: str) -> None:
+        """
+        Drop a job, cancelling it if it has not started yet
+        :param job_id: Job id returned by submit()
+        """
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.future.cancel()
+
+    def run(self, *args) -> str:
+        """
+        Run an OCR job and wait for its result
+        :param args: Arguments for the OCR function, e.g. the frame to read
+        :return: Raw OCR text
+        :raises OcrQueueFullError: If no slot became free within the pool timeout
+        :raises OcrTimeoutError: If the job did not finish within the pool timeout
+        """
+        return self.run_many([args])[0]
+
+    def run_many(self, calls: list) -> list:
+        """
+        Run several OCR jobs in parallel and wait for all of their results
+        :param calls: List of argument tuples for the OCR function, e.g. one per region of a frame
+        :return: List of raw OCR text in the same order as calls
+        :raises OcrQueueFullError: If no slot became free within the pool timeout
+        :raises OcrTimeoutError: If the jobs did not all finish within the pool timeout
+        """
+        return self.collect(self.submit_many(calls))
+
+    def submit_many(self, calls: list) -> list:
+        """
+        Queue several OCR jobs, waiting up to the pool timeout for each free slot
+        :param calls: List of argument tuples for the OCR function
+        :return: List of job ids in the same order as calls, to be passed to collect()
+        :raises OcrQueueFullError: If no slot became free within the pool timeout, jobs already queued are dropped
+        """
+        job_ids = []
+        try:
+            for args in calls:
+                job_ids.append(self.submit(*args, block=True))
+        except Exception:
+            for job_id in job_ids:
+                self.forget(job_id)
+            raise
+        return job_ids
+
+    def done(self, job_ids: list) -> bool:
+        """
+        Check if every job of a submit_many() call has finished
+        :param job_ids: Job ids returned by submit_many()
+        :return: True if collect() would not wait
+        """
+        with self._lock:
+            jobs = [self._jobs.get(job_id) for job_id in job_ids]
+        return all(job is None or job.future.done() for job in jobs)
+
+    def collect(self, job_ids: list) -> list:
+        """
+        Wait for the results of jobs queued by submit_many(), the jobs are forgotten afterwards
+        :param job_ids: Job ids returned by submit_many()
+        :return: List of raw OCR text in the same order as job_ids
+        :raises OcrTimeoutError: If the jobs did not all finish within the pool timeout
+        :raises OcrJobNotFoundError: If a job is unknown, was forgotten or has expired
+        """
+        try:
+            with self._lock:
+                jobs = [self._jobs.get(job_id) for job_id in job_ids]
+            for job_id, job in zip(job_ids, jobs):
+                if job is None:
+                    raise OcrJobNotFoundError(f"OCR job {job_id} is unknown or has expired")
+            deadline = time.monotonic() + self.timeout
+            return [job.future.result(timeout=max(deadline - time.monotonic(), 0)) for job in jobs]
+        except FutureTimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise OcrTimeoutError(f"OCR did not finish within {self.timeout}s")
+        except BrokenExecutor:
+            with self._lock:
+                executor = self._executor
+            if executor is not None:
+                self._replace_broken_executor(executor)
+            raise
+        finally:
+            for job_id in job_ids:
+                self.forget(job_id)
+
+    def shutdown(self) -> None:
+        """
+        Stop the workers, queued jobs are cancelled
+        """
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logging.info(f"Shut down OCR worker pool ({self.completed} jobs completed, {self.rejected} rejected)")
+
+    def stats(self) -> dict:
+        """
+        Returns pool counters
+        :return: Dict containing worker count, pending jobs and completed, rejected and timed out job counts
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.future.done())
+            return {"workers": self.workers, "pending": pending, "completed": self.completed,
+                    "rejected": self.rejected, "timed_out": self.timed_out}
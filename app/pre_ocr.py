@@ -0,0 +1,315 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import cv2
+import numpy as np
+
+# Size frames are reduced to before they are compared
+DIFFERENCE_FRAME_SIZE = (320, 180)
+# Grayscale difference above which a pixel counts as changed
+PIXEL_CHANGE_THRESHOLD = 40
+
+
+def reduce_frame(frame: np.ndarray) -> np.ndarray:
+    """
+    Reduce a frame to a small grayscale image for cheap frame differencing
+    :param frame: BGR frame
+    :return: Reduced grayscale frame
+    """
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), DIFFERENCE_FRAME_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def changed_ratio(reference: np.ndarray, reduced: np.ndarray) -> float:
+    """
+    Fraction of pixels that changed between two reduced frames
+    :param reference: Reduced reference frame
+    :param reduced: Reduced frame to compare
+    :return: Ratio between 0 and 1
+    """
+    return np.count_nonzero(cv2.absdiff(reference, reduced) > PIXEL_CHANGE_THRESHOLD) / reduced.size
+
+
+class Timeline:
+    """
+    Per-video timeline of scenes and their raw OCR text, each segment covers [start, end] seconds.
+    """
+
+    def __init__(self, settings_key: str, segments: Optional[list] = None, complete: bool = False):
+        """
+        :param settings_key: Fingerprint of the OCR settings the text was produced with
+        :param segments: List of {"start", "end", "text"} dicts sorted by start
+        :param complete: True if the whole video was scanned
+        """
+        self.settings_key = settings_key
+        self.segments = segments if segments is not None else []
+        self.complete = complete
+        self._starts = [segment["start"] for segment in self.segments]
+
+    def add_segment(self, start: float, end: float, text: str) -> None:
+        """
+        Append a new segment, segments must be added in order
+        """
+        self.segments.append({"start": start, "end": end, "text": text})
+        self._starts.append(start)
+
+    def extend_last(self, end: float) -> None:
+        """
+        Extend the end of the latest segment
+        """
+        if self.segments:
+            self.segments[-1]["end"] = end
+
+    def lookup(self, timestamp: float) -> Optional[str]:
+        """
+        Get the OCR text of the scene shown at a timestamp
+        :param timestamp: Timestamp in seconds
+        :return: Raw OCR text or None if the timestamp is not covered by a scanned segment
+        """
+        position = bisect.bisect_right(self._starts, timestamp) - 1
+        if position < 0:
+            return None
+        segment = self.segments[position]
+        return segment["text"] if timestamp <= segment["end"] else None
+
+    def to_dict(self) -> dict:
+        return {"settings_key": self.settings_key, "complete": self.complete, "segments": self.segments}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Timeline":
+        return cls(data["settings_key"], data["segments"], data.get("complete", False))
+
+
+class PreOcrJob:
+    """
+    Background job that samples a video, detects scene changes by frame differencing and OCRs only the first frame of
+    each distinct scene. Frames are compared against the reference frame of the current scene rather than the previous
+    sample, so gradual edits (e.g. live typing) eventually start a new scene.
+    """
+
+    def __init__(self, video_hash: str, video_path: str, ocr_frame: Callable[[np.ndarray], str], settings_key: str,
+                 sample_interval: float = 1.0, scene_threshold: float = 0.002):
+        """
+        :param video_hash: Hash of the video
+        :param video_path: Path of the video
+        :param ocr_frame: Function returning the raw OCR text of a frame
+        :param settings_key: Fingerprint of the OCR settings used by ocr_frame
+        :param sample_interval: Seconds between sampled frames
+        :param scene_threshold: Fraction of changed pixels that starts a new scene
+        """
+        self.video_hash = video_hash
+        self.video_path = video_path
+        self.ocr_frame = ocr_frame
+        self.sample_interval = sample_interval
+        self.scene_threshold = scene_threshold
+        self.timeline = Timeline(settings_key)
+        self.status = "pending"
+        self.progress = 0.0
+        self.scanned_until = 0.0
+        self.frames_ocred = 0
+        self.frames_sampled = 0
+        self._cancel_event = threading.Event()
+        # Set by PreOcrManager once the job has ended and its timeline has been persisted
+        self.finished = threading.Event()
+
+    def cancel(self) -> None:
+        """
+        Request the job to stop, the scenes found so far are kept
+        """
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def to_dict(self) -> dict:
+        """
+        Job status for status endpoints
+        """
+        return {"status": self.status, "progress": round(self.progress * 100, 1), "scenes": len(self.timeline.segments),
+                "frames_sampled": self.frames_sampled, "frames_ocred": self.frames_ocred}
+
+    def run(self) -> None:
+        """
+        Scan the video, decoding sequentially and only converting/OCRing sampled frames
+        """
+        self.status = "running"
+        capture = cv2.VideoCapture(self.video_path)
+        try:
+            if not capture.isOpened():
+                logging.error(f"Pre-OCR failed to open {self.video_path}")
+                self.status = "failed"
+                return
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25
+            frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 1
+            frame_step = max(int(round(self.sample_interval * fps)), 1)
+            reference = None
+            frame_index = 0
+            start_time = time.perf_counter()
+            while not self.cancelled:
+                if not capture.grab():
+                    break
+                if frame_index % frame_step == 0:
+                    ret, frame = capture.retrieve()
+                    if not ret:
+                        break
+                    timestamp = frame_index / fps
+                    reduced = reduce_frame(frame)
+                    self.frames_sampled += 1
+                    if reference is None or changed_ratio(reference, reduced) > self.scene_threshold:
+                        reference = reduced
+                        self.timeline.add_segment(timestamp, timestamp, self.ocr_frame(frame))
+                        self.frames_ocred += 1
+                    else:
+                        self.timeline.extend_last(timestamp)
+                    self.scanned_until = timestamp
+                    self.progress = min(frame_index / frame_count, 1.0)
+                frame_index += 1
+            if self.cancelled:
+                self.status = "cancelled"
+            else:
+                self.status = "complete"
+                self.progress = 1.0
+                self.timeline.complete = True
+            logging.info(f"Pre-OCR of {self.video_path} {self.status}: {self.frames_ocred} of {self.frames_sampled} "
+                         f"sampled frames OCR'd in {time.perf_counter() - start_time:.1f}s")
+        except Exception as error:
+            logging.exception(error)
+            self.status = "failed"
+        finally:
+            capture.release()
+
+
+class PreOcrManager:
+    """
+    Runs pre-OCR jobs on background threads (one at a time by default) and persists their timelines as json files
+    named by video hash.
+    """
+
+    def __init__(self, directory: Union[str, Path] = "data/timelines", max_concurrent_jobs: int = 1):
+        """
+        :param directory: Directory to persist timelines in
+        :param max_concurrent_jobs: Maximum number of jobs running at once
+        """
+        self.directory = Path(directory)
+        self._jobs = {}
+        self._timelines = {}
+        self._lock = threading.Lock()
+        self._job_slots = threading.Semaphore(max_concurrent_jobs)
+
+    def _timeline_path(self, video_hash: str) -> Path:
+        return self.directory / f"{video_hash}.json"
+
+    def save_timeline(self, video_hash: str, timeline: Timeline) -> None:
+        """
+        Persist a timeline
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._timeline_path(video_hash).open("w") as timeline_file:
+            json.dump(timeline.to_dict(), timeline_file)
+        with self._lock:
+            self._timelines[video_hash] = timeline
+
+    def get_timeline(self, video_hash: str) -> Optional[Timeline]:
+        """
+        Get the timeline of a video, including the partial timeline of a running job
+        :param video_hash: Hash of the video
+        :return: Timeline or None
+        """
+        with self._lock:
+            job = self._jobs.get(video_hash)
+            if job is not None and job.status in ("running", "complete", "cancelled"):
+                return job.timeline
+            if video_hash in self._timelines:
+                return self._timelines[video_hash]
+        timeline_path = self._timeline_path(video_hash)
+        if not timeline_path.exists():
+            return None
+        try:
+            with timeline_path.open("r") as timeline_file:
+                timeline = Timeline.from_dict(json.load(timeline_file))
+        except (json.JSONDecodeError, KeyError, OSError) as error:
+            logging.error(f"Failed to read timeline {timeline_path}: {error}")
+            return None
+        with self._lock:
+            self._timelines[video_hash] = timeline
+        return timeline
+
+    def lookup(self, video_hash: str, timestamp: float, settings_key: str) -> Optional[str]:
+        """
+        Get the pre-OCR'd text shown at a timestamp
+        :param video_hash: Hash of the video
+        :param timestamp: Timestamp in seconds
+        :param settings_key: Fingerprint of the current OCR settings, timelines built with other settings are ignored
+        :return: Raw OCR text or None
+        """
+        timeline = self.get_timeline(video_hash)
+        if timeline is None or timeline.settings_key != settings_key:
+            return None
+        return timeline.lookup(timestamp)
+
+    def _finish(self, job: PreOcrJob) -> None:
+        """
+        Persist the timeline when a job ends, unless the video was deleted while the job was running
+        """
+        with self._lock:
+            if self._jobs.get(job.video_hash) is not job:
+                return
+        if job.status in ("complete", "cancelled"):
+            self.save_timeline(job.video_hash, job.timeline)
+
+    def _run(self, job: PreOcrJob) -> None:
+        try:
+            with self._job_slots:
+                if job.cancelled:
+                    job.status = "cancelled"
+                    return
+                job.run()
+            self._finish(job)
+        finally:
+            job.finished.set()
+
+    def start(self, job: PreOcrJob) -> PreOcrJob:
+        """
+        Queue a job on a background thread, an already queued or running job for the same video is returned instead
+        :param job: Job to start
+        :return: The job tracking the video
+        """
+        with self._lock:
+            current_job = self._jobs.get(job.video_hash)
+            if current_job is not None and current_job.status in ("pending", "running"):
+                return current_job
+            self._jobs[job.video_hash] = job
+        threading.Thread(target=self._run, args=(job,), name=f"pre-ocr-{job.video_hash}", daemon=True).start()
+        return job
+
+    def get_job(self, video_hash: str) -> Optional[PreOcrJob]:
+        with self._lock:
+            return self._jobs.get(video_hash)
+
+    def cancel(self, video_hash: str) -> bool:
+        """
+        Cancel the job for a video
+        :param video_hash: Hash of the video
+        :return: True if a pending or running job was cancelled
+        """
+        job = self.get_job(video_hash)
+        if job is None or job.status not in ("pending", "running"):
+            return False
+        job.cancel()
+        return True
+
+    def delete(self, video_hash: str) -> None:
+        """
+        Cancel any job for a video and delete its timeline
+        :param video_hash: Hash of the video
+        """
+        self.cancel(video_hash)
+        with self._lock:
+            self._jobs.pop(video_hash, None)
+            self._timelines.pop(video_hash, None)
+        self._timeline_path(video_hash).unlink(missing_ok=True)
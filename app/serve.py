@@ -0,0 +1,107 @@
+import logging
+import os
+import utils
+
+# Connections the operating system queues for waitress while all of its threads are busy
+WAITRESS_BACKLOG = 1024
+
+
+def configure_logging(level: str, log_file: str) -> None:
+    """
+    Configure logging before the app is imported, so the app's own DEBUG configuration is not applied
+    :param level: Name of the log level, e.g. INFO
+    :param log_file: File to log to, stderr if empty
+    """
+    logging.basicConfig(filename=log_file or None, level=getattr(logging, level, logging.INFO),
+                        format="%(asctime)s %(levelname)s [%(process)d:%(threadName)s] %(name)s - %(message)s")
+
+
+def choose_server(server: str) -> str:
+    """
+    Resolve the configured server, "auto" picks gunicorn where it is installed and supported, otherwise waitress
+    :param server: Configured server, auto, gunicorn or waitress
+    :return: gunicorn or waitress
+    """
+    if server != "auto":
+        return server
+    if os.name != "nt":
+        try:
+            import gunicorn  # noqa: F401
+            return "gunicorn"
+        except ModuleNotFoundError:
+            pass
+    return "waitress"
+
+
+def run_gunicorn(application, settings: dict) -> None:
+    """
+    Serve the app with gunicorn worker processes. The app and config are loaded before the workers are forked, so
+    workers start without importing the app again. Background work is started in each worker after it is forked, as
+    threads started in the master would not run in the workers.
+    :param application: Flask app
+    :param settings: Settings from utils.get_server_settings()
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class GunicornApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{settings['host']}:{settings['port']}")
+            self.cfg.set("workers", settings["workers"])
+            self.cfg.set("threads", settings["threads"])
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("keepalive", settings["keepalive"])
+            self.cfg.set("timeout", settings["timeout"])
+            self.cfg.set("graceful_timeout", settings["timeout"])
+            self.cfg.set("preload_app", True)
+            self.cfg.set("loglevel", settings["log_level"].lower())
+            if settings["log_file"]:
+                self.cfg.set("errorlog", settings["log_file"])
+            self.cfg.set("post_worker_init", lambda worker: utils.start_library_indexing())
+
+        def load(self):
+            return application
+
+    GunicornApplication().run()
+
+
+def run_waitress(application, settings: dict) -> None:
+    """
+    Serve the app with waitress, a single process with a pool of threads
+    :param application: Flask app
+    :param settings: Settings from utils.get_server_settings()
+    """
+    from waitress import serve
+    utils.start_library_indexing()
+    serve(application, host=settings["host"], port=settings["port"], threads=settings["threads"],
+          channel_timeout=settings["timeout"], backlog=WAITRESS_BACKLOG, ident="OcrRoo")
+
+
+def main() -> None:
+    """
+    Production entry point, serving the app with gunicorn or waitress using the settings in the [Server] config
+    section. Run from the app directory with python serve.py
+    """
+    settings = utils.get_server_settings()
+    configure_logging(settings["log_level"], settings["log_file"])
+    server = choose_server(settings["server"])
+    if server == "waitress" and settings["workers"] > 1:
+        logging.warning("waitress runs a single process, workers is ignored")
+        settings["workers"] = 1
+    if settings["workers"] > 1 and utils.config("Storage", "backend", fallback="json") != "sqlite":
+        logging.warning("The json storage backend is not shared between worker processes, use the sqlite backend "
+                        "with more than one worker")
+    if settings["workers"] > 1 and utils.get_dedupe_mode() == "fingerprint":
+        logging.warning("Each worker process keeps its own fingerprint index, so fingerprint dedupe only detects "
+                        "duplicates of videos added through the same worker")
+    from app import app as application
+    print("[*] Starting OcrRoo Server")
+    print(f"[*] OcrRoo Server running on http://{settings['host']}:{settings['port']}/ with {server}, "
+          f"{settings['workers']} worker(s) of {settings['threads']} thread(s)")
+    if server == "gunicorn":
+        run_gunicorn(application, settings)
+    else:
+        run_waitress(application, settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import json
+import logging
+import sqlite3
+import threading
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+# Video record keys stored in their own columns, any other keys are kept in the extra json column
+VIDEO_COLUMNS = ("video_hash", "filename", "alias", "thumbnail", "video_length", "progress", "youtube_url")
+# ORDER BY clause of each order the library can be listed in, see user_data_store.LIBRARY_SORTS
+LIBRARY_ORDER = {"recent": "id DESC", "oldest": "id", "alias": "alias COLLATE NOCASE, id"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_hash TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    alias TEXT,
+    thumbnail TEXT,
+    video_length INTEGER NOT NULL DEFAULT 0,
+    progress INTEGER NOT NULL DEFAULT 0,
+    youtube_url TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_videos_filename ON videos (filename);
+CREATE INDEX IF NOT EXISTS idx_videos_hash ON videos (video_hash);
+CREATE INDEX IF NOT EXISTS idx_videos_alias ON videos (alias COLLATE NOCASE, id);
+CREATE INDEX IF NOT EXISTS idx_videos_in_progress ON videos (id) WHERE progress < video_length;
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+    timestamp INTEGER NOT NULL,
+    capture_content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_captures_video_timestamp ON captures (video_id, timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SqliteUserDataStore:
+    """
+    SQLite storage engine for the video library and captures, a drop-in alternative to UserDataStore.
+
+    Videos and captures are kept in separate tables so appending a capture or updating progress only touches a single
+    row. The database runs in WAL mode and every thread gets its own connection, so concurrent requests can read while
+    another request is writing.
+    """
+
+    def __init__(self, database_path: Union[str, Path] = "data/userdata.db"):
+        """
+        :param database_path: Path of the SQLite database file
+        """
+        self.database_path = Path(database_path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get the connection for the current thread, creating the database and schema if required
+        :return: SQLite connection
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            return connection
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.database_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        with self._schema_lock:
+            if not self._schema_ready:
+                connection.executescript(SCHEMA)
+                connection.commit()
+                self._schema_ready = True
+        self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        """
+        Close the connection for the current thread
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def reload(self) -> None:
+        """
+        Nothing is cached in memory, kept for compatibility with UserDataStore
+        """
+
+    def save(self) -> None:
+        """
+        Every write is committed immediately, kept for compatibility with UserDataStore
+        """
+
+    def is_available(self) -> bool:
+        """
+        Checks if the database can be opened
+        :return: Returns True if user data is available
+        """
+        try:
+            self._connection()
+            return True
+        except sqlite3.Error as error:
+            logging.error(f"Failed to open user data database {self.database_path}: {error}")
+            return False
+
+    def _record_from_row(self, row: sqlite3.Row, captures: list) -> dict:
+        """
+        Convert a videos table row back to the userdata.json record format
+        :param row: Row from the videos table
+        :param captures: Captures belonging to the video
+        :return: Video record dict
+        """
+        record = {column: row[column] for column in VIDEO_COLUMNS if column != "youtube_url"}
+        # Videos added before their hash was computed are stored with an empty hash, the column is NOT NULL
+        record["video_hash"] = record["video_hash"] or None
+        if row["youtube_url"] is not None:
+            record["youtube_url"] = row["youtube_url"]
+        if row["extra"]:
+            record.update(json.loads(row["extra"]))
+        record["captures"] = captures
+        return record
+
+    @staticmethod
+    def _capture_from_row(row: sqlite3.Row) -> dict:
+        """
+        Convert a captures table row to the userdata.json capture format
+        :param row: Row from the captures table
+        :return: Capture dict
+        """
+        return {"timestamp": row["timestamp"], "capture_content": row["capture_content"]}
+
+    def _captures_for(self, video_id: int) -> list:
+        """
+        Get all captures for a video in the order they were added
+        :param video_id: Row id of the video
+        :return: List of capture dicts
+        """
+        rows = self._connection().execute(
+            "SELECT timestamp, capture_content FROM captures WHERE video_id = ? ORDER BY id", (video_id,))
+        return [self._capture_from_row(row) for row in rows]
+
+    def all_videos(self) -> Optional[list]:
+        """
+        Get all video records including their captures
+        :return: List of video records or None if user data is unavailable
+        """
+        if not self.is_available():
+            return None
+        connection = self._connection()
+        captures_by_video = {}
+        for row in connection.execute("SELECT video_id, timestamp, capture_content FROM captures ORDER BY id"):
+            captures_by_video.setdefault(row["video_id"], []).append(self._capture_from_row(row))
+        return [self._record_from_row(row, captures_by_video.get(row["id"], []))
+                for row in connection.execute("SELECT * FROM videos ORDER BY id")]
+
+    def filenames(self) -> list:
+        """
+        Get the filenames of all videos in library order
+        :return: List of filenames
+        """
+        return [row["filename"] for row in self._connection().execute("SELECT filename FROM videos ORDER BY id")]
+
+    def _video_row(self, filename: str) -> Optional[sqlite3.Row]:
+        """
+        Get the first video row with the given filename
+        :param filename: Filename of video to get
+        :return: Row or None if not found
+        """
+        return self._connection().execute(
+            "SELECT * FROM videos WHERE filename = ? ORDER BY id LIMIT 1", (filename,)).fetchone()
+
+    def get_video(self, filename: str) -> Optional[dict]:
+        """
+        Get a video record by filename
+        :param filename: Filename of video to get
+        :return: Video record or None if not found
+        """
+        row = self._video_row(filename)
+        if row is None:
+            return None
+        return self._record_from_row(row, self._captures_for(row["id"]))
+
+    def filename_exists(self, filename: str) -> bool:
+        """
+        Checks if a video with the given filename exists
+        :param filename: Filename to check for
+        :return: Returns True if found
+        """
+        return self._connection().execute(
+            "SELECT 1 FROM videos WHERE filename = ? LIMIT 1", (filename,)).fetchone() is not None
+
+    def hash_exists(self, video_hash: str) -> bool:
+        """
+        Checks if a video with the given hash exists
+        :param video_hash: Hash value of video to check
+        :return: Returns True if found
+        """
+        return self._connection().execute(
+            "SELECT 1 FROM videos WHERE video_hash = ? LIMIT 1", (video_hash,)).fetchone() is not None
+
+    def filename_for_hash(self, video_hash: str) -> Optional[str]:
+        """
+        Get the filename of the video with the given hash
+        :param video_hash: Hash value of video to find
+        :return: Filename or None if not found
+        """
+        row = self._connection().execute(
+            "SELECT filename FROM videos WHERE video_hash = ? ORDER BY id LIMIT 1", (video_hash,)).fetchone()
+        return row["filename"] if row is not None else None
+
+    def list_videos(self, offset: int = 0, limit: int = 24, sort: str = "recent", in_progress: bool = False,
+                    search: str = "") -> Tuple[list, int]:
+        """
+        Get a page of the library, using the alias and in progress indexes
+        :param offset: Number of matching videos to skip
+        :param limit: Maximum number of videos to return
+        :param sort: Order of the videos, one of user_data_store.LIBRARY_SORTS
+        :param in_progress: Only list videos that have been started but not finished
+        :param search: Only list videos whose alias contains this text, ignoring case
+        :return: Tuple of the summaries of the videos on the page and the number of matching videos
+        """
+        conditions, parameters = [], []
+        if in_progress:
+            conditions.append("progress < video_length")
+        if search:
+            conditions.append("alias LIKE ? ESCAPE '\\'")
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parameters.append(f"%{escaped}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        connection = self._connection()
+        total = connection.execute(f"SELECT COUNT(*) FROM videos {where}", parameters).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT *, (SELECT COUNT(*) FROM captures WHERE video_id = videos.id) AS capture_count FROM videos "
+            f"{where} ORDER BY {LIBRARY_ORDER[sort]} LIMIT ? OFFSET ?", (*parameters, limit, offset))
+        videos = []
+        for row in rows:
+            record = self._record_from_row(row, [])
+            del record["captures"]
+            record["capture_count"] = row["capture_count"]
+            videos.append(record)
+        return videos, total
+
+    def _insert_video(self, connection: sqlite3.Connection, record: dict) -> None:
+        """
+        Insert a video record and its captures without committing
+        :param connection: Connection to insert with
+        :param record: Video record to insert
+        """
+        extra = {key: value for key, value in record.items() if key not in VIDEO_COLUMNS and key != "captures"}
+        cursor = connection.execute(
+            "INSERT INTO videos (video_hash, filename, alias, thumbnail, video_length, progress, youtube_url, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (record["video_hash"] or "", record["filename"], record.get("alias"), record.get("thumbnail"),
+             record.get("video_length", 0), record.get("progress", 0), record.get("youtube_url"),
+             json.dumps(extra) if extra else None))
+        connection.executemany(
+            "INSERT INTO captures (video_id, timestamp, capture_content) VALUES (?, ?, ?)",
+            [(cursor.lastrowid, capture["timestamp"], capture["capture_content"])
+             for capture in record.get("captures", [])])
+
+    def add_video(self, record: dict) -> bool:
+        """
+        Add a new video record
+        :param record: Video record to add
+        :return: Returns True if added
+        """
+        connection = self._connection()
+        with connection:
+            self._insert_video(connection, record)
+        return True
+
+    def update_video(self, filename: str, progress: Optional[float] = None, capture: Optional[dict] = None) -> bool:
+        """
+        Update progress and/or append a capture for a video
+        :param filename: Filename of video to update
+        :param progress: New progress value
+        :param capture: New capture to append
+        :return: Returns True if the video was found
+        """
+        connection = self._connection()
+        with connection:
+            row = self._video_row(filename)
+            if row is None:
+                return False
+            if progress is not None:
+                connection.execute("UPDATE videos SET progress = ? WHERE id = ?", (round(progress), row["id"]))
+            if capture is not None:
+                connection.execute("INSERT INTO captures (video_id, timestamp, capture_content) VALUES (?, ?, ?)",
+                                   (row["id"], capture["timestamp"], capture["capture_content"]))
+        return True
+
+    def set_video_hash(self, filename: str, video_hash: str, thumbnail: str) -> bool:
+        """
+        Record the hash of a video added before its hash was computed, and the thumbnail named after it
+        :param filename: Filename of video to update
+        :param video_hash: Hash value of the video file
+        :param thumbnail: Thumbnail of the video
+        :return: Returns True if the video was found
+        """
+        connection = self._connection()
+        with connection:
+            row = self._video_row(filename)
+            if row is None:
+                return False
+            connection.execute("UPDATE videos SET video_hash = ?, thumbnail = ? WHERE id = ?",
+                               (video_hash, thumbnail, row["id"]))
+        return True
+
+    def update_progress(self, progress_by_filename: dict) -> None:
+        """
+        Update the progress of several videos in a single transaction
+        :param progress_by_filename: Dict of filename to new progress value
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany("UPDATE videos SET progress = ? WHERE filename = ?",
+                                   [(round(progress), filename) for filename, progress in progress_by_filename.items()])
+
+    def delete_video(self, filename: str) -> bool:
+        """
+        Delete a video record and its captures
+        :param filename: Filename of video to delete
+        :return: Returns True if the video was found and deleted
+        """
+        connection = self._connection()
+        with connection:
+            row = self._video_row(filename)
+            if row is None:
+                return False
+            connection.execute("DELETE FROM videos WHERE id = ?", (row["id"],))
+        return True
+
+    def migrate_from_json(self, json_path: Union[str, Path] = "data/userdata.json") -> int:
+        """
+        One-shot migration of an existing userdata.json file into the database. The migration is recorded in the
+        meta table so it only ever runs once, the json file is left in place as a backup.
+        :param json_path: Path of the userdata.json file to migrate
+        :return: Number of videos migrated
+        """
+        json_path = Path(json_path)
+        connection = self._connection()
+        if connection.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone() is not None:
+            return 0
+        all_videos = []
+        if json_path.exists():
+            try:
+                with json_path.open("r") as user_data:
+                    all_videos = json.load(user_data)["all_videos"]
+            except (JSONDecodeError, KeyError):
+                logging.error(f"Failed to read data from {json_path}, skipping migration.")
+                return 0
+        with connection:
+            for record in all_videos:
+                self._insert_video(connection, record)
+            connection.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)", (str(json_path),))
+        logging.info(f"Migrated {len(all_videos)} videos from {json_path} to {self.database_path}")
+        return len(all_videos)
@@ -99,7 +99,7 @@ function sendProgressUpdate() {
     $.ajax({
         url: "/update_video_data",
         type: "POST",
-        data: JSON.stringify({"progress": videoPlayer.currentTime}),
+        data: JSON.stringify({"filename": videoFilename, "progress": videoPlayer.currentTime}),
         contentType: "application/json",
             success: function(response) {}
     });
@@ -115,7 +115,7 @@ function sendCaptureUpdate(timestamp, capture_content) {
     $.ajax({
         url: "/update_video_data",
         type: "POST",
-        data: JSON.stringify({"capture": {
+        data: JSON.stringify({"filename": videoFilename, "capture": {
             "timestamp": rounded_timestamp,
             "capture_content": capture_content,
         }}),
@@ -129,24 +129,129 @@ function sendCaptureUpdate(timestamp, capture_content) {
  */
 function captureCode() {
     let captureTimestamp = videoPlayer.currentTime;
-    mainCaptureButton.innerHTML = "<span><i class=\"fa-solid fa-circle-notch fa-spin mr-2\"></i>Analysing Frame</span>" +
-        "<span class=\"text-xs my-1 text-gray-200\">(" + hotkeys["capture_code"] + ")</span>";
+    setCaptureButtonStatus("Analysing Frame");
     $.ajax({
         url: "/capture_at_timestamp",
         type: "POST",
-        data: JSON.stringify({"timestamp": captureTimestamp}),
+        data: JSON.stringify({"filename": videoFilename, "timestamp": captureTimestamp}),
         contentType: "application/json",
             success: function(response) {
-                displayCapture(response, captureTimestamp);
-                sendCaptureUpdate(captureTimestamp, response);
+                streamCaptureJob(response["job_id"], captureTimestamp);
+            },
+            error: function() {
+                resetCaptureButton();
             }
     });
 }
 
+/**
+ * Listens to each stage of a capture job, the raw OCR text is shown as soon as it is available and replaced with the
+ * formatted code once formatting has finished
+ * @param jobId ID of the capture job
+ * @param captureTimestamp Timestamp of the code capture
+ */
+function streamCaptureJob(jobId, captureTimestamp) {
+    let captureBody = null;
+    let events = new EventSource("/capture_jobs/" + jobId + "/events");
+    events.addEventListener("raw_ocr", (event) => {
+        captureBody = displayCapture(JSON.parse(event.data), captureTimestamp);
+        captureBody.classList.add("text-gray-400");
+        setCaptureButtonStatus("Formatting Code");
+    });
+    events.addEventListener("formatted", (event) => {
+        let response = JSON.parse(event.data);
+        if (captureBody === null) {
+            captureBody = displayCapture(response, captureTimestamp);
+        } else {
+            setCaptureText(captureBody, response);
+            captureBody.classList.remove("text-gray-400");
+        }
+        sendCaptureUpdate(captureTimestamp, response);
+    });
+    events.addEventListener("done", () => {
+        events.close();
+        resetCaptureButton();
+    });
+    events.onerror = () => {
+        events.close();
+        resetCaptureButton();
+    };
+}
+
+/**
+ * Sends request to server to capture code every step seconds between two timestamps, each capture is shown as it
+ * completes. Captures of frames that look the same as the previous frame are skipped.
+ * @param start Timestamp of the first capture in seconds
+ * @param end Timestamp of the last capture in seconds
+ * @param step Seconds between captures
+ */
+function captureRange(start, end, step) {
+    setCaptureButtonStatus("Analysing Frames");
+    $.ajax({
+        url: "/capture_range",
+        type: "POST",
+        data: JSON.stringify({"filename": videoFilename, "start": start, "end": end, "step": step}),
+        contentType: "application/json",
+            success: function(response) {
+                streamCaptureRangeJob(response["job_id"]);
+            },
+            error: function(response) {
+                resetCaptureButton();
+                if (typeof createErrorResponse === "function" && response.responseJSON) {
+                    createErrorResponse(response.responseJSON["error"]);
+                }
+            }
+    });
+}
+
+/**
+ * Listens to a capture range job, displaying each capture in timestamp order as it completes
+ * @param jobId ID of the capture job
+ */
+function streamCaptureRangeJob(jobId) {
+    let captureCount = 0;
+    let events = new EventSource("/capture_jobs/" + jobId + "/events");
+    events.addEventListener("capture", (event) => {
+        let capture = JSON.parse(event.data);
+        captureCount++;
+        setCaptureButtonStatus("Captured " + captureCount + " Frames");
+        if (capture["duplicate_of"] === null && capture["code"] !== "ERROR") {
+            displayCapture(capture["code"], capture["timestamp"]);
+            sendCaptureUpdate(capture["timestamp"], capture["code"]);
+        }
+    });
+    events.addEventListener("done", () => {
+        events.close();
+        resetCaptureButton();
+    });
+    events.onerror = () => {
+        events.close();
+        resetCaptureButton();
+    };
+}
+
+/**
+ * Shows a spinner and status message on the capture button
+ * @param status Status message to show
+ */
+function setCaptureButtonStatus(status) {
+    mainCaptureButton.innerHTML = "<span><i class=\"fa-solid fa-circle-notch fa-spin mr-2\"></i>" + status + "</span>" +
+        "<span class=\"text-xs my-1 text-gray-200\">(" + hotkeys["capture_code"] + ")</span>";
+}
+
+/**
+ * Restores the capture button once a capture has finished
+ */
+function resetCaptureButton() {
+    mainCaptureButton.innerHTML = "<span><i class=\"fa-solid fa-expand mr-2\"></i>Capture Code on Frame</span>" +
+        "<span class=\"text-xs my-1 text-gray-200\">(" + hotkeys["capture_code"] + ")</span>";
+}
+
 /**
  * Prints a capture to the output window
  * @param response Contents of code capture
  * @param timestamp Timestamp of  code capture
+ * @returns {HTMLElement} Code element of the capture
  */
 function displayCapture(response, timestamp) {
     let captureOutput = document.createElement("div");
@@ -168,18 +273,26 @@ function displayCapture(response, timestamp) {
     captureBodyWrap.classList.add("overflow-x-auto");
     captureBody.classList.add("w-full", "whitespace-pre", "language-python", "text-xs");
     captureBody.contentEditable = "true";
+    setCaptureText(captureBody, response);
+    captureBodyWrap.appendChild(captureBody);
+    captureOutput.appendChild(captureBodyWrap);
+    let firstChild = captureOutputContainer.firstChild;
+    captureOutputContainer.insertBefore(captureOutput, firstChild);
+    return captureBody;
+}
+
+/**
+ * Replaces the text of a capture
+ * @param captureBody Code element of the capture
+ * @param response Contents of code capture
+ */
+function setCaptureText(captureBody, response) {
     // Create a temporary div to decode HTML entities into regular text
     let tempDiv = document.createElement("div");
     tempDiv.innerHTML = response;
     // Get the decoded text from the temporary div
     let decodedText = tempDiv.textContent;
-    captureBody.appendChild(document.createTextNode(decodedText));
-    captureBodyWrap.appendChild(captureBody);
-    captureOutput.appendChild(captureBodyWrap);
-    let firstChild = captureOutputContainer.firstChild;
-    captureOutputContainer.insertBefore(captureOutput, firstChild);
-    mainCaptureButton.innerHTML = "<span><i class=\"fa-solid fa-expand mr-2\"></i>Capture Code on Frame</span>" +
-        "<span class=\"text-xs my-1 text-gray-200\">(" + hotkeys["capture_code"] + ")</span>";
+    captureBody.replaceChildren(document.createTextNode(decodedText));
 }
 
 /**
@@ -211,7 +324,7 @@ function openInIde(captureElementId) {
     $.ajax({
         url: "/send_to_ide",
         type: "POST",
-        data: JSON.stringify({"code_snippet": codeElement.innerHTML}),
+        data: JSON.stringify({"filename": videoFilename, "code_snippet": codeElement.innerHTML}),
         contentType: "application/json",
             success: function(response) {
                 console.log("success");
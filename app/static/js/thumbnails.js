@@ -0,0 +1,36 @@
+/**
+ * thumbnails.js
+ *
+ * This JavaScript file swaps the placeholder shown for a video whose thumbnail is still being generated for the
+ * thumbnail once it is ready.
+ **/
+
+// Milliseconds between checks for a thumbnail and the number of checks before giving up
+const thumbnailPollInterval = 2000;
+const thumbnailPollLimit = 30;
+
+/**
+ * Check for the thumbnail of a placeholder image until it loads, then show it
+ * @param image placeholder img element with the url of the thumbnail in its data-thumbnail-src attribute
+ * @param attempt number of checks made so far
+ */
+function pollThumbnail(image, attempt) {
+    const thumbnail = new Image();
+    thumbnail.onload = function () {
+        image.src = thumbnail.src;
+        image.removeAttribute("data-thumbnail-src");
+    };
+    thumbnail.onerror = function () {
+        if (attempt + 1 < thumbnailPollLimit) {
+            setTimeout(function () { pollThumbnail(image, attempt + 1); }, thumbnailPollInterval);
+        }
+    };
+    // Query string so a cached failed check is not reused
+    thumbnail.src = `${image.dataset.thumbnailSrc}?check=${attempt}`;
+}
+
+$(document).ready(function () {
+    document.querySelectorAll("img[data-thumbnail-src]").forEach(function (image) {
+        setTimeout(function () { pollThumbnail(image, 0); }, thumbnailPollInterval);
+    });
+});
@@ -0,0 +1,149 @@
+/**
+ * upload.js
+ *
+ * This JavaScript file uploads local videos in chunks from the upload page. An interrupted upload (dropped
+ * connection, closed tab) resumes from the last chunk received when the same file is uploaded again.
+ */
+
+// Parse DOM for needed elements
+let uploadForm = document.getElementById("uploadForm");
+let uploadProgress = document.getElementById("uploadProgress");
+// Attempts made to resend a chunk before the upload is abandoned
+const maxChunkRetries = 5;
+
+// Upload local files in chunks, YouTube URLs are still submitted with the form
+uploadForm.addEventListener("submit", (event) => {
+    let file = document.getElementById("localFileInput").files[0];
+    if (file === undefined) {
+        return;
+    }
+    event.preventDefault();
+    uploadVideo(file, document.getElementById("videoTitle").value);
+});
+
+/**
+ * Key identifying a file in local storage, so an interrupted upload of the same file can be resumed
+ * @param file File being uploaded
+ * @returns {string} Local storage key
+ */
+function uploadStorageKey(file) {
+    return "upload:" + file.name + ":" + file.size + ":" + file.lastModified;
+}
+
+/**
+ * Shows upload progress below the upload button
+ * @param message Progress message to show
+ */
+function setUploadProgress(message) {
+    uploadProgress.classList.remove("hidden");
+    uploadProgress.innerHTML = message;
+}
+
+/**
+ * Uploads a video in chunks, resuming an earlier upload of the same file if the server still has it
+ * @param file File to upload
+ * @param title Title of the video
+ */
+function uploadVideo(file, title) {
+    let storageKey = uploadStorageKey(file);
+    let uploadId = localStorage.getItem(storageKey);
+    let startUpload = () => {
+        $.ajax({
+            url: "/uploads",
+            type: "POST",
+            data: JSON.stringify({"filename": file.name, "size": file.size, "title": title}),
+            contentType: "application/json",
+                success: function(response) {
+                    localStorage.setItem(storageKey, response["upload_id"]);
+                    sendChunk(file, storageKey, response["upload_id"], 0, 0);
+                },
+                error: function(response) {
+                    setUploadProgress("Upload failed: " + (response.responseJSON ?
+                        response.responseJSON["error"] : "server unavailable"));
+                }
+        });
+    };
+    if (uploadId === null) {
+        startUpload();
+        return;
+    }
+    $.ajax({
+        url: "/uploads/" + uploadId,
+        type: "GET",
+            success: function(response) {
+                sendChunk(file, storageKey, uploadId, response["offset"], 0);
+            },
+            error: function() {
+                localStorage.removeItem(storageKey);
+                startUpload();
+            }
+    });
+}
+
+/**
+ * Sends the chunk of a file starting at an offset, then the following chunks until the upload is complete. Failed
+ * chunks are resent from the offset reported by the server after an increasing delay.
+ * @param file File being uploaded
+ * @param storageKey Local storage key of the upload
+ * @param uploadId ID of the upload
+ * @param offset Byte offset of the chunk
+ * @param retries Number of times this chunk has failed
+ */
+function sendChunk(file, storageKey, uploadId, offset, retries) {
+    setUploadProgress("Uploading " + file.name + ": " + Math.floor(offset / file.size * 100) + "%");
+    $.ajax({
+        url: "/uploads/" + uploadId,
+        type: "PATCH",
+        data: file.slice(offset, offset + uploadChunkSize),
+        processData: false,
+        contentType: "application/octet-stream",
+        headers: {"Upload-Offset": offset},
+            success: function(response) {
+                if (response["redirect"]) {
+                    localStorage.removeItem(storageKey);
+                    setUploadProgress(response["status"] === "duplicate" ?
+                        "This video is already in your library, opening it" : "Upload complete");
+                    window.location.href = response["redirect"];
+                } else {
+                    sendChunk(file, storageKey, uploadId, response["offset"], 0);
+                }
+            },
+            error: function(response) {
+                if (response.status === 404) {
+                    localStorage.removeItem(storageKey);
+                    setUploadProgress("Upload expired, please upload the video again");
+                } else if (response.status === 409 && retries < maxChunkRetries) {
+                    // The server is still receiving an earlier attempt or already has this chunk
+                    setTimeout(() => sendChunk(file, storageKey, uploadId, response.responseJSON["offset"], retries + 1),
+                        1000);
+                } else if (retries < maxChunkRetries) {
+                    setUploadProgress("Connection lost, retrying upload of " + file.name);
+                    setTimeout(() => resumeUpload(file, storageKey, uploadId, offset, retries + 1),
+                        1000 * 2 ** retries);
+                } else {
+                    setUploadProgress("Upload failed, upload the same file again to resume");
+                }
+            }
+    });
+}
+
+/**
+ * Resumes an upload from the offset the server has received up to
+ * @param file File being uploaded
+ * @param storageKey Local storage key of the upload
+ * @param uploadId ID of the upload
+ * @param offset Offset to resend from if the server cannot be reached
+ * @param retries Number of times the chunk has failed
+ */
+function resumeUpload(file, storageKey, uploadId, offset, retries) {
+    $.ajax({
+        url: "/uploads/" + uploadId,
+        type: "GET",
+            success: function(response) {
+                sendChunk(file, storageKey, uploadId, response["offset"], retries);
+            },
+            error: function() {
+                sendChunk(file, storageKey, uploadId, offset, retries);
+            }
+    });
+}
@@ -110,7 +110,7 @@ function autoCompleteCommands() {
         return;
     }
     // Base auto completions
-    let autoCompletions = ["navigate", "list-videos", "play-video", "capture", "open",
+    let autoCompletions = ["navigate", "list-videos", "play-video", "capture", "search-code", "open",
         "clear", "cls", "help"];
     let foundCompletions = [];
     for (let completion in autoCompletions) {
@@ -286,6 +286,17 @@ function responseHandler(response) {
         } else {
             createErrorResponse("You must be playing a video to capture code.")
         }
+    } else if (response["capture_range"]) {
+        if (window.location.href.includes("/play_video/")) {
+            let range = response["capture_range"];
+            captureRange(range["start"], range["end"], range["step"]);
+            let responseString = "Capturing code from " + formatTimestamp(range["start"]) + " to " +
+                formatTimestamp(range["end"]) + " every " + range["step"] + " seconds";
+            addToLocalStore("previousCLI", "response", responseString);
+            insertCliResponse(responseString);
+        } else {
+            createErrorResponse("You must be playing a video to capture code.")
+        }
     } else if (response === "open") {
         if (window.location.href.includes("/play_video/")) {
             openInIde();
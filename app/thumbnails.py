@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+try:
+    from video_seek import seek_frame
+except ModuleNotFoundError:
+    from app.video_seek import seek_frame
+
+# Formats a thumbnail can be encoded as, by extension, with the OpenCV quality parameter of each
+THUMBNAIL_FORMATS = {"webp": cv2.IMWRITE_WEBP_QUALITY, "jpg": cv2.IMWRITE_JPEG_QUALITY}
+
+
+def encode_thumbnail(frame: np.ndarray, width: int, extension: str, quality: int) -> bytes:
+    """
+    Downscale a frame to a width, keeping its aspect ratio, and encode it
+    :param frame: BGR frame
+    :param width: Width of the thumbnail, frames narrower than this are not upscaled
+    :param extension: webp or jpg
+    :param quality: Encoding quality from 0 to 100
+    :return: Encoded image
+    :raises ValueError: If the frame could not be encoded
+    """
+    height, frame_width = frame.shape[:2]
+    if frame_width > width:
+        frame = cv2.resize(frame, (width, max(round(height * width / frame_width), 1)), interpolation=cv2.INTER_AREA)
+    encoded, buffer = cv2.imencode(f".{extension}", frame, [THUMBNAIL_FORMATS[extension], quality])
+    if not encoded:
+        raise ValueError(f"Could not encode thumbnail as {extension}")
+    return buffer.tobytes()
+
+
+def supported_extension(image_format: str) -> str:
+    """
+    Check the OpenCV build can encode a thumbnail format, JPEG is used if it cannot
+    :param image_format: webp or jpg
+    :return: Extension of the format used
+    """
+    if image_format in THUMBNAIL_FORMATS:
+        try:
+            encode_thumbnail(np.zeros((2, 2, 3), np.uint8), 2, image_format, 80)
+            return image_format
+        except (ValueError, cv2.error):
+            pass
+    logging.warning(f"Thumbnail format {image_format} is not supported, using jpg")
+    return "jpg"
+
+
+def read_middle_frame(video_path: str, keyframes: Optional[list] = None) -> Optional[np.ndarray]:
+    """
+    Read the middle frame of a video
+    :param video_path: Path of the video
+    :param keyframes: [Optional] Sorted list of keyframe timestamps of the video
+    :return: Frame or None if it could not be read
+    """
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            return None
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        middle = frame_count / fps / 2 if fps and fps > 0 else 0
+        return seek_frame(capture, middle, keyframes)
+    finally:
+        capture.release()
+
+
+class ThumbnailStore:
+    """
+    Downscaled video thumbnails stored as files named by video hash, generated by a background worker so adding a
+    video does not wait for the video to be opened and seeked.
+    """
+
+    def __init__(self, directory: Union[str, Path] = "static/img/thumbnails", width: int = 320,
+                 image_format: str = "webp", quality: int = 80):
+        """
+        :param directory: Directory to store thumbnails in
+        :param width: Width of the thumbnails in pixels
+        :param image_format: webp or jpg, jpg is used if OpenCV cannot encode webp
+        :param quality: Encoding quality from 0 to 100
+        """
+        self.directory = Path(directory)
+        self.width = width
+        self.extension = supported_extension(image_format)
+        self.quality = quality
+        self._pending = set()
+        self._failed = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def name(self, video_hash: str) -> str:
+        """
+        Filename of the thumbnail of a video
+        :param video_hash: Hash of the video
+        :return: Filename
+        """
+        return f"{video_hash}.{self.extension}"
+
+    def path(self, video_hash: str) -> Path:
+        return self.directory / self.name(video_hash)
+
+    def is_ready(self, video_hash: str) -> bool:
+        """
+        Check if the thumbnail of a video has been generated
+        :param video_hash: Hash of the video
+        :return: True if the thumbnail file exists
+        """
+        return self.path(video_hash).exists()
+
+    def generate(self, video_hash: str, video_path: str, keyframes: Optional[list] = None) -> bool:
+        """
+        Generate the thumbnail of a video from its middle frame, replacing the file atomically once it is written
+        :param video_hash: Hash of the video
+        :param video_path: Path of the video
+        :param keyframes: [Optional] Sorted list of keyframe timestamps of the video, used to seek to the middle frame
+        :return: True if the thumbnail was generated
+        """
+        frame = read_middle_frame(video_path, keyframes)
+        if frame is None:
+            logging.error(f"Could not capture thumbnail frame from video {video_path}")
+            return False
+        try:
+            thumbnail = encode_thumbnail(frame, self.width, self.extension, self.quality)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.path(video_hash).with_suffix(".tmp")
+            temporary_path.write_bytes(thumbnail)
+            os.replace(temporary_path, self.path(video_hash))
+        except (OSError, ValueError) as error:
+            logging.error(f"Failed to write thumbnail of {video_path}: {error}")
+            return False
+        return True
+
+    def generate_in_background(self, video_hash: str, video_path: str, keyframes: Optional[list] = None) -> None:
+        """
+        Generate the thumbnail of a video on the background worker, does nothing if it is already queued
+        :param video_hash: Hash of the video
+        :param video_path: Path of the video
+        :param keyframes: [Optional] Sorted list of keyframe timestamps of the video
+        """
+        with self._lock:
+            if video_hash in self._pending:
+                return
+            self._pending.add(video_hash)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+            executor = self._executor
+        executor.submit(self._generate_pending, video_hash, video_path, keyframes)
+
+    def _generate_pending(self, video_hash: str, video_path: str, keyframes: Optional[list]) -> None:
+        generated = False
+        try:
+            generated = self.generate(video_hash, video_path, keyframes)
+        except Exception as error:
+            logging.error(f"Failed to generate thumbnail of {video_path}: {error}")
+        finally:
+            with self._lock:
+                self._pending.discard(video_hash)
+                if not generated:
+                    self._failed.add(video_hash)
+
+    def ensure(self, video_hash: str, video_path: str, keyframes: Optional[list] = None) -> bool:
+        """
+        Check if the thumbnail of a video is ready, queueing it for generation if it is not, e.g. when the server
+        stopped before it was generated. Videos whose thumbnail could not be generated are not queued again.
+        :param video_hash: Hash of the video
+        :param video_path: Path of the video
+        :param keyframes: [Optional] Sorted list of keyframe timestamps of the video
+        :return: True if the thumbnail is ready
+        """
+        if self.is_ready(video_hash):
+            return True
+        with self._lock:
+            failed = video_hash in self._failed
+        if not failed and os.path.exists(video_path):
+            self.generate_in_background(video_hash, video_path, keyframes)
+        return False
+
+    def delete(self, video_hash: str) -> None:
+        """
+        Delete the thumbnail of a video
+        :param video_hash: Hash of the video
+        """
+        self.path(video_hash).unlink(missing_ok=True)
+
+    def wait(self) -> None:
+        """
+        Wait for every queued thumbnail to be generated
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
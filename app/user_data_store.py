@@ -0,0 +1,551 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+# Orders the library can be listed in, most recently added first, oldest first or by alias
+LIBRARY_SORTS = ("recent", "oldest", "alias")
+
+
+def summarize_video_record(record: dict) -> dict:
+    """
+    Copy a video record without its captures, which are replaced by their count, for listing the library
+    :param record: Video record to summarize
+    :return: Video record with a capture_count instead of captures
+    """
+    summary = {key: value for key, value in record.items() if key != "captures"}
+    summary["capture_count"] = len(record.get("captures", []))
+    return summary
+
+
+def is_in_progress(record: dict) -> bool:
+    """
+    Check if a video has been started but not finished
+    :param record: Video record
+    :return: True if the progress is before the end of the video
+    """
+    return record["progress"] < record["video_length"]
+
+
+def copy_video_record(record: dict) -> dict:
+    """
+    Copy a video record so callers can format/modify it without touching the stored record
+    :param record: Video record to copy
+    :return: Copy of the video record
+    """
+    record_copy = dict(record)
+    record_copy["captures"] = [dict(capture) for capture in record.get("captures", [])]
+    return record_copy
+
+
+class UserDataStore:
+    """
+    In memory store for the user data (video library and captures) persisted in data/userdata.json.
+
+    The json file is loaded once, records are indexed by filename and video hash so lookups do not scan the whole
+    library, and every write is persisted atomically by writing to a temporary file and renaming it over the original.
+    The videos in progress and the alias order are indexed too, so pages of the library are listed without sorting or
+    copying every record.
+    """
+
+    def __init__(self, data_path: Union[str, Path, None] = "data/userdata.json"):
+        """
+        :param data_path: Path of the json file to load/persist, None keeps the data in memory only
+        """
+        self.data_path = Path(data_path) if data_path is not None else None
+        self._lock = threading.RLock()
+        self._data: Optional[dict] = None
+        self._loaded = False
+        self._by_filename = {}
+        self._by_hash = {}
+        self._sequence = {}
+        self._in_progress = {}
+        self._alias_order: Optional[list] = None
+        self._next_sequence = 0
+
+    @classmethod
+    def from_data(cls, data: Optional[dict], data_path: Union[str, Path, None] = None) -> "UserDataStore":
+        """
+        Create a store from already loaded user data
+        :param data: User data dict containing "all_videos", or None if no user data is available
+        :param data_path: Optional path to persist changes to
+        :return: UserDataStore object
+        """
+        store = cls(data_path)
+        store._set_data(data)
+        return store
+
+    def _set_data(self, data: Optional[dict]) -> None:
+        """
+        Replace the stored data and rebuild indexes
+        :param data: User data dict or None
+        """
+        self._data = data
+        self._loaded = True
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self) -> None:
+        """
+        Rebuild the filename and video hash indexes from the stored data
+        """
+        self._by_filename = {}
+        self._by_hash = {}
+        self._sequence = {}
+        self._in_progress = {}
+        self._alias_order = None
+        self._next_sequence = 0
+        if self._data is None:
+            return
+        for record in self._data["all_videos"]:
+            self._index_record(record)
+
+    def _index_record(self, record: dict) -> None:
+        """
+        Add a record to the indexes, the first record wins when filenames or hashes are duplicated
+        :param record: Video record to index
+        """
+        self._by_filename.setdefault(record["filename"], record)
+        if record["video_hash"] is not None:
+            self._by_hash.setdefault(record["video_hash"], record)
+        self._sequence[id(record)] = self._next_sequence
+        self._next_sequence += 1
+        self._alias_order = None
+        self._index_progress(record)
+
+    def _index_progress(self, record: dict) -> None:
+        """
+        Add or remove a record from the index of videos in progress after its progress changed, the index is kept in
+        the order the videos were added
+        :param record: Video record to index
+        """
+        if is_in_progress(record):
+            if id(record) not in self._in_progress:
+                last = next(reversed(self._in_progress), None)
+                self._in_progress[id(record)] = record
+                # A video added before the last video in progress, e.g. a finished video watched again
+                if last is not None and self._sequence[last] > self._sequence[id(record)]:
+                    self._in_progress = dict(sorted(self._in_progress.items(),
+                                                    key=lambda item: self._sequence[item[0]]))
+        else:
+            self._in_progress.pop(id(record), None)
+
+    def _ensure_loaded(self) -> None:
+        """
+        Load user data from disk the first time the store is used
+        """
+        if self._loaded:
+            return
+        if self.data_path is None:
+            self._set_data({"all_videos": []})
+            return
+        if not self.data_path.exists():
+            self.data_path.parent.mkdir(parents=True, exist_ok=True)
+            self._set_data({"all_videos": []})
+            self.save()
+            return
+        try:
+            with self.data_path.open("r") as user_data:
+                self._set_data(json.load(user_data))
+        except JSONDecodeError:
+            logging.error(f"Failed to read data from {self.data_path}, file may be empty.")
+            self._set_data(None)
+
+    def reload(self) -> None:
+        """
+        Drop in memory data so it is re-read from disk on next access
+        """
+        with self._lock:
+            self._loaded = False
+            self._data = None
+            self._rebuild_indexes()
+
+    def is_available(self) -> bool:
+        """
+        Checks if user data could be loaded
+        :return: Returns True if user data is available
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._data is not None
+
+    def save(self) -> None:
+        """
+        Atomically persist user data to disk by writing a temporary file and renaming it over the data file
+        """
+        with self._lock:
+            if self.data_path is None or self._data is None:
+                return
+            file_descriptor, temp_path = tempfile.mkstemp(dir=self.data_path.parent, prefix=".userdata-",
+                                                          suffix=".tmp")
+            try:
+                with os.fdopen(file_descriptor, "w") as temp_file:
+                    json.dump(self._data, temp_file, separators=(",", ":"))
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+                os.replace(temp_path, self.data_path)
+            except OSError as error:
+                logging.error(f"Failed to write user data to {self.data_path}: {error}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def all_videos(self) -> Optional[list]:
+        """
+        Get copies of all video records
+        :return: List of video records or None if user data is unavailable
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._data is None:
+                return None
+            return [copy_video_record(record) for record in self._data["all_videos"]]
+
+    def filenames(self) -> list:
+        """
+        Get the filenames of all videos in library order
+        :return: List of filenames
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._data is None:
+                return []
+            return [record["filename"] for record in self._data["all_videos"]]
+
+    def get_video(self, filename: str) -> Optional[dict]:
+        """
+        Get a copy of a video record by filename
+        :param filename: Filename of video to get
+        :return: Video record or None if not found
+        """
+        with self._lock:
+            self._ensure_loaded()
+            record = self._by_filename.get(filename)
+            return copy_video_record(record) if record is not None else None
+
+    def filename_exists(self, filename: str) -> bool:
+        """
+        Checks if a video with the given filename exists
+        :param filename: Filename to check for
+        :return: Returns True if found
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return filename in self._by_filename
+
+    def hash_exists(self, video_hash: str) -> bool:
+        """
+        Checks if a video with the given hash exists
+        :param video_hash: Hash value of video to check
+        :return: Returns True if found
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return video_hash in self._by_hash
+
+    def filename_for_hash(self, video_hash: str) -> Optional[str]:
+        """
+        Get the filename of the video with the given hash
+        :param video_hash: Hash value of video to find
+        :return: Filename or None if not found
+        """
+        with self._lock:
+            self._ensure_loaded()
+            record = self._by_hash.get(video_hash)
+            return record["filename"] if record is not None else None
+
+    def list_videos(self, offset: int = 0, limit: int = 24, sort: str = "recent", in_progress: bool = False,
+                    search: str = "") -> Tuple[list, int]:
+        """
+        Get a page of the library
+        :param offset: Number of matching videos to skip
+        :param limit: Maximum number of videos to return
+        :param sort: Order of the videos, one of LIBRARY_SORTS
+        :param in_progress: Only list videos that have been started but not finished
+        :param search: Only list videos whose alias contains this text, ignoring case
+        :return: Tuple of the summaries of the videos on the page and the number of matching videos
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._data is None:
+                return [], 0
+            if sort == "alias":
+                if self._alias_order is None:
+                    self._alias_order = sorted(self._data["all_videos"],
+                                               key=lambda record: ((record.get("alias") or "").lower(),
+                                                                   self._sequence[id(record)]))
+                videos = self._alias_order
+                if in_progress:
+                    videos = [record for record in videos if id(record) in self._in_progress]
+            else:
+                videos = list(self._in_progress.values()) if in_progress else self._data["all_videos"]
+            # Videos are stored oldest first, the most recent are sliced from the end rather than reversing the list
+            newest_first = sort == "recent"
+            if search:
+                search = search.lower()
+                videos = [record for record in (reversed(videos) if newest_first else videos)
+                          if search in (record.get("alias") or "").lower()]
+                newest_first = False
+            total = len(videos)
+            if newest_first:
+                page = videos[max(total - offset - limit, 0):max(total - offset, 0)][::-1]
+            else:
+                page = videos[offset:offset + limit]
+            return [summarize_video_record(record) for record in page], total
+
+    def add_video(self, record: dict) -> bool:
+        """
+        Add a new video record and persist it
+        :param record: Video record to add
+        :return: Returns True if added
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._data is None:
+                return False
+            record = copy_video_record(record)
+            self._data["all_videos"].append(record)
+            self._index_record(record)
+            self.save()
+            return True
+
+    def update_video(self, filename: str, progress: Optional[float] = None, capture: Optional[dict] = None) -> bool:
+        """
+        Update progress and/or append a capture for a video and persist it
+        :param filename: Filename of video to update
+        :param progress: New progress value
+        :param capture: New capture to append
+        :return: Returns True if the video was found
+        """
+        with self._lock:
+            self._ensure_loaded()
+            record = self._by_filename.get(filename)
+            if record is None:
+                return False
+            if progress is not None:
+                record["progress"] = round(progress)
+                self._index_progress(record)
+            if capture is not None:
+                record["captures"].append(dict(capture))
+            self.save()
+            return True
+
+    def set_video_hash(self, filename: str, video_hash: str, thumbnail: str) -> bool:
+        """
+        Record the hash of a video added before its hash was computed, and the thumbnail named after it, and persist it
+        :param filename: Filename of video to update
+        :param video_hash: Hash value of the video file
+        :param thumbnail: Thumbnail of the video
+        :return: Returns True if the video was found
+        """
+        with self._lock:
+            self._ensure_loaded()
+            record = self._by_filename.get(filename)
+            if record is None:
+                return False
+            record["video_hash"] = video_hash
+            record["thumbnail"] = thumbnail
+            self._by_hash.setdefault(video_hash, record)
+            self.save()
+            return True
+
+    def update_progress(self, progress_by_filename: dict) -> None:
+        """
+        Update the progress of several videos and persist them with a single write
+        :param progress_by_filename: Dict of filename to new progress value
+        """
+        with self._lock:
+            self._ensure_loaded()
+            updated = False
+            for filename, progress in progress_by_filename.items():
+                record = self._by_filename.get(filename)
+                if record is not None:
+                    record["progress"] = round(progress)
+                    self._index_progress(record)
+                    updated = True
+            if updated:
+                self.save()
+
+    def delete_video(self, filename: str) -> bool:
+        """
+        Delete a video record and persist the change
+        :param filename: Filename of video to delete
+        :return: Returns True if the video was found and deleted
+        """
+        with self._lock:
+            self._ensure_loaded()
+            record = self._by_filename.get(filename)
+            if record is None:
+                return False
+            self._data["all_videos"] = [current for current in self._data["all_videos"] if current is not record]
+            self._rebuild_indexes()
+            self.save()
+            return True
+
+
+class WriteBehindStore:
+    """
+    Wraps a user data store and buffers progress updates in memory.
+
+    The player reports progress several times a second, so progress updates are coalesced per video and written to the
+    wrapped store in one batch every flush_interval seconds (and on shutdown). Reads through this wrapper overlay any
+    pending progress, so callers always see the latest value. All other operations are passed straight through.
+    """
+
+    def __init__(self, store, flush_interval: float = 60.0):
+        """
+        :param store: UserDataStore or SqliteUserDataStore to wrap
+        :param flush_interval: Seconds between flushes of buffered progress updates
+        """
+        self.store = store
+        self.flush_interval = flush_interval
+        self.flush_count = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def _start_flush_thread(self) -> None:
+        """
+        Start the background flush thread the first time progress is buffered
+        """
+        with self._lock:
+            if self._thread is not None or self._stop.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="progress-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        """
+        Flush buffered progress every flush_interval seconds until closed
+        """
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as error:
+                logging.error(f"Failed to write buffered progress, retrying in {self.flush_interval}s: {error}")
+
+    def _apply_pending(self, record: Optional[dict]) -> Optional[dict]:
+        """
+        Overlay buffered progress onto a video record
+        :param record: Video record copy from the wrapped store
+        :return: Video record with latest progress
+        """
+        if record is not None and record["filename"] in self._pending:
+            record["progress"] = self._pending[record["filename"]]
+        return record
+
+    def pending_progress(self, filename: str) -> Optional[int]:
+        """
+        Get buffered progress that has not been written yet
+        :param filename: Filename of video
+        :return: Buffered progress or None
+        """
+        with self._lock:
+            return self._pending.get(filename)
+
+    def get_video(self, filename: str) -> Optional[dict]:
+        """
+        Get a video record with the latest progress
+        :param filename: Filename of video to get
+        :return: Video record or None if not found
+        """
+        record = self.store.get_video(filename)
+        with self._lock:
+            return self._apply_pending(record)
+
+    def all_videos(self) -> Optional[list]:
+        """
+        Get all video records with the latest progress
+        :return: List of video records or None if user data is unavailable
+        """
+        all_videos = self.store.all_videos()
+        if all_videos is None:
+            return None
+        with self._lock:
+            return [self._apply_pending(record) for record in all_videos]
+
+    def list_videos(self, offset: int = 0, limit: int = 24, sort: str = "recent", in_progress: bool = False,
+                    search: str = "") -> Tuple[list, int]:
+        """
+        Get a page of the library with the latest progress. Listing the videos in progress writes any buffered progress
+        first, as it decides which videos are in progress, the library order does not depend on progress
+        :param offset: Number of matching videos to skip
+        :param limit: Maximum number of videos to return
+        :param sort: Order of the videos, one of LIBRARY_SORTS
+        :param in_progress: Only list videos that have been started but not finished
+        :param search: Only list videos whose alias contains this text, ignoring case
+        :return: Tuple of the summaries of the videos on the page and the number of matching videos
+        """
+        with self._lock:
+            flush = in_progress and bool(self._pending)
+        if flush:
+            self.flush()
+        videos, total = self.store.list_videos(offset, limit, sort, in_progress, search)
+        with self._lock:
+            return [self._apply_pending(video) for video in videos], total
+
+    def update_video(self, filename: str, progress: Optional[float] = None, capture: Optional[dict] = None) -> bool:
+        """
+        Buffer a progress update, or write a capture (with any buffered progress) straight to the wrapped store. The
+        capture is written under the flush lock so a flush in progress cannot overwrite its progress with an older value
+        :param filename: Filename of video to update
+        :param progress: New progress value
+        :param capture: New capture to append
+        :return: Returns True if the video was found
+        """
+        if capture is None:
+            if progress is None or not self.store.filename_exists(filename):
+                return False
+            with self._lock:
+                self._pending[filename] = round(progress)
+            self._start_flush_thread()
+            return True
+        with self._flush_lock:
+            with self._lock:
+                pending_progress = self._pending.pop(filename, None)
+            if progress is None:
+                progress = pending_progress
+            return self.store.update_video(filename, progress=progress, capture=capture)
+
+    def delete_video(self, filename: str) -> bool:
+        """
+        Delete a video and drop any buffered progress for it
+        :param filename: Filename of video to delete
+        :return: Returns True if the video was found and deleted
+        """
+        with self._lock:
+            self._pending.pop(filename, None)
+        return self.store.delete_video(filename)
+
+    def flush(self) -> None:
+        """
+        Write all buffered progress updates to the wrapped store in one batch. Updates buffered while the batch is
+        being written are newer, so they are kept for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+            if not pending:
+                return
+            self.store.update_progress(pending)
+            self.flush_count += 1
+            with self._lock:
+                for filename, progress in pending.items():
+                    if self._pending.get(filename) == progress:
+                        del self._pending[filename]
+
+    def close(self) -> None:
+        """
+        Stop the flush thread and write any remaining buffered progress
+        """
+        self._stop.set()
+        self.flush()
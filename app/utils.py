@@ -1,61 +1,234 @@
 import hashlib
-import json
 import os.path
 import shutil
 import subprocess
 import logging
-import time
+import sqlite3
+import threading
 import cv2
-from json import JSONDecodeError
-from typing import Union, Optional
+from typing import Callable, Union, Optional
+from urllib.parse import quote
 import openai
 import pytesseract
 from pytube import YouTube
 from pytube.exceptions import RegexMatchError
-from configparser import ConfigParser
+from configparser import ConfigParser, NoSectionError, NoOptionError
 from pathlib import Path
+try:
+    from user_data_store import LIBRARY_SORTS, UserDataStore, WriteBehindStore
+    from sqlite_user_data_store import SqliteUserDataStore
+    from video_seek import KeyframeIndexStore
+    from pre_ocr import PreOcrManager
+    from chunked_upload import UploadManager, hash_file
+    from video_fingerprint import FingerprintCache, FingerprintIndex, fingerprint_file
+    from thumbnails import ThumbnailStore
+    from code_search import CodeSearchIndex
+except ModuleNotFoundError:
+    from app.user_data_store import LIBRARY_SORTS, UserDataStore, WriteBehindStore
+    from app.sqlite_user_data_store import SqliteUserDataStore
+    from app.video_seek import KeyframeIndexStore
+    from app.pre_ocr import PreOcrManager
+    from app.chunked_upload import UploadManager, hash_file
+    from app.video_fingerprint import FingerprintCache, FingerprintIndex, fingerprint_file
+    from app.thumbnails import ThumbnailStore
+    from app.code_search import CodeSearchIndex
 
 SLASH = "\\" if os.name == 'nt' else "/"
 
 
-def config(section: str = None, option: str = None) -> Union[ConfigParser, str]:
-    """
-    Loads config variables from file and returns either specified variable or parser object. If attempting to
-    retrieve a specified variable, BOTH section and option parameters must be passed. If no parameters are specified,
-    this function will return a ConfigParser object.
+# Sentinel used to detect when no fallback value is passed to config()
+NO_FALLBACK = object()
+
+
+class ConfigCache:
+    """
+    Process wide cache of the parsed config.ini file. The file is only re-parsed when its modification time (or size)
+    changes or when the cache is explicitly invalidated, all other reads are served from an in memory dictionary.
+    """
+
+    def __init__(self, config_path: str = "config.ini", example_path: str = "config.example.ini"):
+        self.config_path = config_path
+        self.example_path = example_path
+        self.hits = 0
+        self.misses = 0
+        self._parser: Optional[ConfigParser] = None
+        self._values: dict = {}
+        self._signature: Optional[tuple] = None
+        self._lock = threading.RLock()
+
+    def _current_signature(self) -> tuple:
+        """
+        Stats the config file, copying the example config into place if it does not exist yet.
+        :return: Tuple of modification time and size of the config file
+        """
+        try:
+            stat = os.stat(self.config_path)
+        except FileNotFoundError:
+            shutil.copy(self.example_path, self.config_path)
+            stat = os.stat(self.config_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature: tuple) -> None:
+        """
+        Parses the config file and applies settings that only need to be set once per load.
+        :param signature: Signature of the file being loaded
+        """
+        parser = ConfigParser()
+        parser.read(self.config_path)
+        self._values = {section: dict(parser.items(section)) for section in parser.sections()}
+        self._parser = parser
+        self._signature = signature
+        openai_api_key = self._values.get("AppSettings", {}).get("openai_api_key")
+        if openai_api_key is not None and openai_api_key != "your_openai_api_key_here":
+            openai.api_key = openai_api_key
+        tesseract_executable = self._values.get("AppSettings", {}).get("tesseract_executable")
+        if tesseract_executable is not None and tesseract_executable != "your_path_to_tesseract_here":
+            pytesseract.pytesseract.tesseract_cmd = fr'{tesseract_executable}'
+
+    def _refresh(self) -> None:
+        """
+        Re-parses the config file if it has changed since it was last loaded.
+        """
+        signature = self._current_signature()
+        if self._parser is not None and signature == self._signature:
+            self.hits += 1
+            return
+        self.misses += 1
+        self._load(signature)
+
+    def get_parser(self) -> ConfigParser:
+        """
+        Get the cached ConfigParser object, re-parsing the config file if required.
+        :return: ConfigParser object
+        """
+        with self._lock:
+            self._refresh()
+            return self._parser
+
+    def get(self, section: str, option: str, fallback: Optional[str] = NO_FALLBACK) -> str:
+        """
+        Get a single config value from the cache.
+        :param section: Section to retrieve value from
+        :param option: Key/option of value to retrieve
+        :param fallback: [Optional] Value returned if the section or option does not exist
+        :return: Config value as string
+        """
+        with self._lock:
+            self._refresh()
+            try:
+                return self._values[section][option.lower()]
+            except KeyError:
+                if fallback is not NO_FALLBACK:
+                    return fallback
+                if section not in self._values:
+                    raise NoSectionError(section)
+                raise NoOptionError(option, section)
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached config so the next read re-parses config.ini.
+        """
+        with self._lock:
+            self._parser = None
+            self._values = {}
+            self._signature = None
+
+    def stats(self) -> dict:
+        """
+        Returns cache hit and miss counters.
+        :return: Dict containing hits and misses
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Process wide config cache used by config()
+config_cache = ConfigCache()
+
+
+# Process wide user data store, created on first use by get_user_data_store()
+user_data_store: Union[UserDataStore, SqliteUserDataStore, WriteBehindStore, None] = None
+user_data_store_lock = threading.Lock()
+# Per-video keyframe indexes used for fast seeking, built in the background when a video is added
+keyframe_index_store = KeyframeIndexStore("data/keyframes")
+# Background pre-OCR jobs and their per-video timelines
+pre_ocr_manager = PreOcrManager("data/timelines")
+# Chunked uploads in progress, resumable after a dropped connection
+upload_manager = UploadManager("data/uploads")
+# Content fingerprints of the videos in the library, used to detect duplicates without hashing whole files
+fingerprint_index = FingerprintIndex("data/video_fingerprints.json")
+# Fingerprints of served video files, recomputed only when a file changes on disk
+served_fingerprints = FingerprintCache()
+# Video thumbnails generated in the background, created on first use by get_thumbnail_store()
+thumbnail_store: Optional[ThumbnailStore] = None
+thumbnail_store_lock = threading.Lock()
+# Directory of the thumbnails inside static/img, thumbnails of videos added before it existed are directly in static/img
+THUMBNAIL_DIRECTORY = "thumbnails"
+# Full-text index of captured code, created on first use by get_code_search_index() and built in the background
+code_search_index: Optional[CodeSearchIndex] = None
+code_search_index_lock = threading.Lock()
+
+
+def config(section: str = None, option: str = None,
+           fallback: Optional[str] = NO_FALLBACK) -> Union[ConfigParser, str]:
+    """
+    Loads config variables from the config cache and returns either specified variable or parser object. If attempting
+    to retrieve a specified variable, BOTH section and option parameters must be passed. If no parameters are
+    specified, this function will return a ConfigParser object.
     :param section: [Optional] Section to retrieve value from
     :param option: [Optional] Key/option of value to retrieve
+    :param fallback: [Optional] Value to return if the section/option is missing from an older config file
     :return: Return string or ConfigParser object
     """
     if (section is None) != (option is None):
         raise SyntaxError("section AND option parameters OR no parameters must be passed to function config()")
-    parser = ConfigParser()
-    if not os.path.exists("config.ini"):
-        shutil.copy("config.example.ini", "config.ini")
-    parser.read("config.ini")
-    if parser.get("AppSettings", "openai_api_key") != "your_openai_api_key_here":
-        openai.api_key = parser.get("AppSettings", "openai_api_key")
-        # TODO: This only needs to be set once, unsure if calling this will cause any performance issues same for
-        #  pytesseract cmd dir below.
-    if parser.get("AppSettings", "tesseract_executable") != "your_path_to_tesseract_here":
-        pytesseract.pytesseract.tesseract_cmd = fr'{parser.get("AppSettings", "tesseract_executable")}'
     if section is None and option is None:
-        return parser
+        return config_cache.get_parser()
     else:
-        return parser.get(section, option)
+        return config_cache.get(section, option, fallback)
 
 
 def hash_video_file(filename: str) -> str:
     """
     Calculates and returns the hash of a video file.
     :param filename: File path of the video to hash
-    :return: Returns hex based md5 hash
+    :return: Returns hex based hash using the algorithm from get_hash_algorithm()
     """
-    hash_md5 = hashlib.md5()
-    with open(f"{get_vid_save_path()}{filename}", "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    return hash_file(f"{get_vid_save_path()}{filename}", get_hash_algorithm())
+
+
+def get_hash_algorithm() -> str:
+    """
+    Get the algorithm used to hash videos from the [Upload] config section
+    :return: Name of the algorithm
+    """
+    return config("Upload", "hash_algorithm", fallback="md5")
+
+
+def get_dedupe_mode() -> str:
+    """
+    Get how new videos are checked for duplicates from the [Upload] config section: "full" hashes the whole file,
+    "fingerprint" compares sampled content fingerprints and hashes whole files in the background
+    :return: Dedupe mode
+    """
+    return "fingerprint" if config("Upload", "dedupe", fallback="full") == "fingerprint" else "full"
+
+
+def get_server_settings() -> dict:
+    """
+    Get the settings of the production server from the [Server] config section, with defaults for older config files
+    :return: Dict of server settings
+    """
+    return {
+        "server": config("Server", "server", fallback="auto"),
+        "host": config("Server", "host", fallback="localhost"),
+        "port": int(config("Server", "port", fallback="5000")),
+        "workers": max(int(config("Server", "workers", fallback="1")), 1),
+        "threads": max(int(config("Server", "threads", fallback="8")), 1),
+        "keepalive": int(config("Server", "keepalive", fallback="5")),
+        "timeout": int(config("Server", "timeout", fallback="120")),
+        "log_level": config("Server", "log_level", fallback="INFO").upper(),
+        "log_file": config("Server", "log_file", fallback=""),
+    }
 
 
 def hash_string(str_input: str) -> str:
@@ -80,28 +253,96 @@ def format_timestamp(seconds: int) -> str:
     return f'{str(minutes).zfill(2)}:{str(remaining_seconds).zfill(2)}'
 
 
-def read_user_data() -> json:
+def parse_timestamp(timestamp: str) -> float:
     """
-    Reads the users data from json file
-    :return: Returns user data as json
+    Parse a timestamp given in seconds or as MM:SS or HH:MM:SS
+    :param timestamp: Timestamp to parse
+    :return: Timestamp in seconds
+    :raises ValueError: If the timestamp is not a valid non-negative timestamp
     """
-    # switch to pathlib:
-    data_file = Path("data/userdata.json")
-    if not data_file.exists():
-        data_file.parent.mkdir(parents=True, exist_ok=True)
-
-        with data_file.open("w") as user_data:
-            user_data.write(json.dumps({"all_videos": []}))
-        return None
-
+    parts = timestamp.strip().split(":")
     try:
-        with data_file.open("r") as user_data:
-            data = json.load(user_data)
-            return data
-
-    except JSONDecodeError:
-        logging.error("Failed to read data from userdata.json, file may be empty.")
-        return None
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        seconds = -1.0
+    if not 0 <= seconds < float("inf") or len(parts) > 3:
+        raise ValueError(f"Invalid timestamp \"{timestamp}\"")
+    return seconds
+
+
+def get_user_data_store() -> Union[UserDataStore, SqliteUserDataStore, WriteBehindStore]:
+    """
+    Get the process wide user data store. The storage engine is selected by the [Storage] backend config option
+    ("json" or "sqlite") when the store is first used, the first time the SQLite engine is used any existing
+    userdata.json file is migrated into the database. Progress updates are buffered and written every
+    [Storage] progress_flush_interval seconds, an interval of 0 writes every update immediately.
+    :return: User data store object
+    """
+    global user_data_store
+    with user_data_store_lock:
+        if user_data_store is None:
+            if config("Storage", "backend", fallback="json").lower() == "sqlite":
+                user_data_store = SqliteUserDataStore(config("Storage", "sqlite_path", fallback="data/userdata.db"))
+                user_data_store.migrate_from_json("data/userdata.json")
+            else:
+                user_data_store = UserDataStore("data/userdata.json")
+            flush_interval = float(config("Storage", "progress_flush_interval", fallback="60"))
+            if flush_interval > 0:
+                user_data_store = WriteBehindStore(user_data_store, flush_interval)
+        return user_data_store
+
+
+def get_thumbnail_store() -> ThumbnailStore:
+    """
+    Get the process wide thumbnail store, configured by the [Thumbnails] config section
+    :return: ThumbnailStore object
+    """
+    global thumbnail_store
+    with thumbnail_store_lock:
+        if thumbnail_store is None:
+            thumbnail_store = ThumbnailStore(f"static/img/{THUMBNAIL_DIRECTORY}",
+                                             width=int(config("Thumbnails", "width", fallback="320")),
+                                             image_format=config("Thumbnails", "format", fallback="webp"),
+                                             quality=int(config("Thumbnails", "quality", fallback="80")))
+        return thumbnail_store
+
+
+def get_code_search_index() -> CodeSearchIndex:
+    """
+    Get the process wide code search index, configured by the [Search] config section. The first time the index is
+    used every capture already in user data storage is indexed on a background thread, searches only find the captures
+    indexed so far until it has finished.
+    :return: CodeSearchIndex object
+    """
+    global code_search_index
+    with code_search_index_lock:
+        if code_search_index is None:
+            code_search_index = CodeSearchIndex(config("Search", "index_path", fallback="data/code_search.db"),
+                                                int(config("Search", "max_candidates", fallback="1000")))
+            try:
+                if not code_search_index.is_built():
+                    code_search_index.build_in_background(lambda: get_user_data_store().all_videos())
+            except sqlite3.Error as error:
+                logging.error(f"Failed to open code search index: {error}")
+        return code_search_index
+
+
+def thumbnail_ready(current_video: dict) -> bool:
+    """
+    Check if the thumbnail of a video can be shown, queueing it for generation if it has not been generated yet
+    :param current_video: Video record from user data storage
+    :return: True if the thumbnail is ready
+    """
+    if current_video["video_hash"] is None:
+        # The thumbnail is generated once the hash of the video has been computed
+        return False
+    if not current_video["thumbnail"].startswith(f"{THUMBNAIL_DIRECTORY}/"):
+        return True
+    return get_thumbnail_store().ensure(current_video["video_hash"],
+                                        f"{get_vid_save_path()}{current_video['filename']}",
+                                        keyframe_index_store.get(current_video["video_hash"]))
 
 
 def get_vid_save_path() -> str:
@@ -117,12 +358,8 @@ def get_vid_save_path() -> str:
         if not default_path.exists():
             default_path.mkdir(parents=True, exist_ok=True)
         return str(default_path) + SLASH
-    # Check if the path ends with a backslash
-    vid_download_path = Path(vid_download_path)
-    if not vid_download_path.is_dir():
-        return f"{vid_download_path}" + SLASH
-
-    return vid_download_path
+    # Path() drops any trailing slash, so one is always added back
+    return f"{Path(vid_download_path)}" + SLASH
 
 
 def get_output_path() -> str:
@@ -228,18 +465,41 @@ def get_video_data(filename: str) -> []:
     """
     Get the video details from user data storage
     :param filename: Filename of video to retrieve details for
-    :return: Returns array containing video info
+    :return: Array containing video info
     """
-    user_data = read_user_data()
-    if user_data is None:
+    current_video = get_user_data_store().get_video(filename)
+    if current_video is None:
         return None
-    for current_video in user_data["all_videos"]:
-        if current_video["filename"] == filename:
-            current_video["video_length"] = format_timestamp(current_video["video_length"])
-            for current_capture in current_video["captures"]:
-                current_capture["timestamp"] = format_timestamp(current_capture["timestamp"])
-            return current_video
-    return None
+    current_video["video_length"] = format_timestamp(current_video["video_length"])
+    for current_capture in current_video["captures"]:
+        current_capture["timestamp"] = format_timestamp(current_capture["timestamp"])
+    return current_video
+
+
+def get_video_hash(filename: str) -> Optional[str]:
+    """
+    Get the hash of a video in user data storage
+    :param filename: Filename of the video
+    :return: Hash of the video or None if the video is not in user data storage
+    """
+    current_video = get_user_data_store().get_video(filename)
+    return current_video["video_hash"] if current_video is not None else None
+
+
+def verify_video_file(filename: str) -> bool:
+    """
+    Check that a video file still has the content it was added to the library with, by comparing its fingerprint with
+    the fingerprint recorded when it was added. Videos without a recorded fingerprint are fingerprinted and pass.
+    :param filename: Filename of the video in the video directory
+    :return: True if the file matches its recorded fingerprint
+    :raises OSError: If the file cannot be read
+    """
+    fingerprint = served_fingerprints.fingerprint(f"{get_vid_save_path()}{filename}")
+    recorded_fingerprint = fingerprint_index.get(filename)
+    if recorded_fingerprint is None:
+        fingerprint_index.add(filename, fingerprint)
+        return True
+    return fingerprint == recorded_fingerprint
 
 
 def is_video_downloaded(filename: str) -> Optional[bool]:
@@ -264,54 +524,41 @@ def update_user_video_data(filename: str, progress: Optional[float] = None, capt
     Updates progress or capture content information in user data storage for specific video
     :param filename: Filename of video to update
     :param progress: New progress value to update
-    :param capture: New capture to append
+    :param capture: New capture to append, indexed for code search
     """
-    user_data = read_user_data()
-    if user_data is None:
+    if capture is None:
+        get_user_data_store().update_video(filename, progress=progress)
         return
-    for record in user_data["all_videos"]:
-        if record["filename"] == filename:
-            if progress is not None:
-                record["progress"] = round(progress)
-            if capture is not None:
-                record["captures"].append(capture)
-    with open("data/userdata.json", "w") as json_data:
-        json.dump(user_data, json_data, indent=4)
+    if get_user_data_store().update_video(filename, progress=progress, capture=capture):
+        try:
+            get_code_search_index().add_capture(filename, capture)
+        except sqlite3.Error as error:
+            logging.error(f"Failed to index capture of {filename}: {error}")
 
 
-def add_video_to_user_data(filename: str, video_title: str, video_hash: str, youtube_url: str = None) -> None:
+def add_video_to_user_data(filename: str, video_title: str, video_hash: Optional[str], youtube_url: str = None,
+                           fingerprint: Optional[str] = None) -> bool:
     """
     Add a new video to user data storage
     :param youtube_url: Optional, if video is from YouTube, adds its source url to user data
     :param filename: File path of new video to add
     :param video_title: Title (Alias) of new video
-    :param video_hash: Hash value of new video file
+    :param video_hash: Hash value of new video file, None if it is still being computed, see set_video_hash()
+    :param fingerprint: Optional, content fingerprint of the video if already computed
+    :return: True if the video was added
     """
-    user_data = read_user_data()
-    if user_data is None:
-        return
+    if not get_user_data_store().is_available():
+        return False
     video_capture = cv2.VideoCapture(f'{get_vid_save_path()}{filename}')
     if not video_capture.isOpened():
         logging.error(f"Failed to open video capture for {filename}")
-        return
-    middle_frame = round(video_capture.get(cv2.CAP_PROP_FRAME_COUNT) / 2)
-    video_capture.set(cv2.CAP_PROP_POS_FRAMES, middle_frame)
-    ret, frame = video_capture.read()
-    if not ret:
-        logging.error(f"Could not capture frame from video {filename}")
-        video_capture.release()
-        return
-    thumbnail = str(int(time.time())) + ".png"
-    # Check if img dir exists if not create
-    # TODO: Use pathlib, but no impact on os compatibility
-    if not os.path.exists("static/img"):
-        os.makedirs("static/img")
-    cv2.imwrite(f"static/img/{thumbnail}", frame)
+        return False
     new_video = {
         "video_hash": video_hash,
         "filename": filename,
         "alias": video_title,
-        "thumbnail": thumbnail,
+        "thumbnail": f"{THUMBNAIL_DIRECTORY}/{get_thumbnail_store().name(video_hash)}" if video_hash is not None
+        else f"{THUMBNAIL_DIRECTORY}/",
         "video_length": round(video_capture.get(cv2.CAP_PROP_FRAME_COUNT) / video_capture.get(cv2.CAP_PROP_FPS)),
         "progress": 0,
         "captures": [],
@@ -319,9 +566,129 @@ def add_video_to_user_data(filename: str, video_title: str, video_hash: str, you
     if youtube_url is not None:
         new_video["youtube_url"] = youtube_url
     video_capture.release()
-    user_data["all_videos"].append(new_video)
-    with open("data/userdata.json", "w") as json_data:
-        json.dump(user_data, json_data, indent=4)
+    if not get_user_data_store().add_video(new_video):
+        return False
+    fingerprint_index.add(filename, fingerprint or fingerprint_file(f"{get_vid_save_path()}{filename}"))
+    if video_hash is not None:
+        get_thumbnail_store().generate_in_background(video_hash, f"{get_vid_save_path()}{filename}")
+        build_keyframe_index(video_hash, filename)
+    return True
+
+
+def set_video_hash(filename: str, on_hashed: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Hash a video added to user data storage before its hash was computed, record the hash and then start the
+    background work keyed by it (thumbnail and keyframe index)
+    :param filename: Filename of the video
+    :param on_hashed: Optional, called with the filename once the hash is recorded, e.g. to start pre-OCR
+    """
+    try:
+        video_hash = hash_video_file(filename)
+    except OSError as error:
+        logging.error(f"Failed to hash {filename}: {error}")
+        return
+    thumbnail = f"{THUMBNAIL_DIRECTORY}/{get_thumbnail_store().name(video_hash)}"
+    if not get_user_data_store().set_video_hash(filename, video_hash, thumbnail):
+        return
+    get_thumbnail_store().generate_in_background(video_hash, f"{get_vid_save_path()}{filename}")
+    build_keyframe_index(video_hash, filename)
+    if on_hashed is not None:
+        on_hashed(filename)
+
+
+def build_keyframe_index(video_hash: str, filename: str) -> None:
+    """
+    Start building the keyframe index for a video on a background thread
+    :param video_hash: Hash value of the video
+    :param filename: Filename of the video
+    """
+    keyframe_index_store.build_in_background(video_hash, f"{get_vid_save_path()}{filename}",
+                                             config("VideoDecoding", "ffprobe_executable", fallback="ffprobe"))
+
+
+def add_local_video(filename: str, video_title: str, full_hash: Optional[str] = None,
+                    youtube_url: Optional[str] = None, on_hashed: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Add a video saved in the video directory to user data storage, unless it is a duplicate of a video already in the
+    library. In fingerprint dedupe mode a video whose fingerprint matches a video in the library is treated as that
+    video straight away, while both files are fully hashed on a background thread to confirm it. If the hashes differ
+    the new video is added then. A new video is added straight away too, its hash is computed on a background thread.
+    :param filename: Filename of the video in the video directory
+    :param video_title: Title (Alias) of the video
+    :param full_hash: Optional, hash of the whole file if already computed (e.g. while it was uploaded)
+    :param youtube_url: Optional, if video is from YouTube, its source url
+    :param on_hashed: Optional, called with the filename if the video is added before its hash is computed, once the
+    hash is recorded
+    :return: Filename of the video to play, the existing video if it is a duplicate
+    """
+    fingerprint = fingerprint_file(f"{get_vid_save_path()}{filename}")
+    if get_dedupe_mode() == "fingerprint":
+        for existing_filename in fingerprint_index.lookup(fingerprint):
+            if get_user_data_store().filename_exists(existing_filename):
+                if existing_filename != filename:
+                    threading.Thread(target=verify_duplicate, name=f"verify-duplicate-{filename}", daemon=True,
+                                     args=(filename, existing_filename, video_title, full_hash, youtube_url,
+                                           fingerprint)).start()
+                return existing_filename
+        video_hash = full_hash
+    else:
+        video_hash = full_hash or hash_video_file(filename)
+        existing_filename = get_user_data_store().filename_for_hash(video_hash)
+        if existing_filename is not None:
+            return existing_filename
+    if add_video_to_user_data(filename, video_title, video_hash, youtube_url=youtube_url, fingerprint=fingerprint) \
+            and video_hash is None:
+        threading.Thread(target=set_video_hash, name=f"hash-{filename}", daemon=True,
+                         args=(filename, on_hashed)).start()
+    return filename
+
+
+def verify_duplicate(filename: str, existing_filename: str, video_title: str, full_hash: Optional[str],
+                     youtube_url: Optional[str], fingerprint: str) -> None:
+    """
+    Confirm that a video with the same fingerprint as a video in the library has the same content by hashing both
+    files. A confirmed duplicate is deleted, otherwise the video is added to the library under its full hash.
+    :param filename: Filename of the new video
+    :param existing_filename: Filename of the video in the library with the same fingerprint
+    :param video_title: Title (Alias) of the new video
+    :param full_hash: Hash of the whole new video if already computed
+    :param youtube_url: If the new video is from YouTube, its source url
+    :param fingerprint: Fingerprint shared by both videos
+    """
+    try:
+        video_hash = full_hash or hash_video_file(filename)
+        if video_hash == hash_video_file(existing_filename):
+            logging.info(f"Removed {filename}, it is a duplicate of {existing_filename}")
+            os.remove(f"{get_vid_save_path()}{filename}")
+            return
+        logging.warning(f"{filename} has the same fingerprint as {existing_filename} but different content, adding it "
+                        "to the library")
+        add_video_to_user_data(filename, video_title, video_hash, youtube_url=youtube_url, fingerprint=fingerprint)
+    except OSError as error:
+        logging.error(f"Failed to check {filename} for duplicates: {error}")
+
+
+def index_library_fingerprints() -> None:
+    """
+    Fingerprint the videos in the library that are not in the fingerprint index yet, e.g. videos added before
+    fingerprints were recorded. Videos added afterwards are indexed as they are added.
+    """
+    for filename in get_user_data_store().filenames():
+        video_path = f"{get_vid_save_path()}{filename}"
+        if fingerprint_index.get(filename) is None and os.path.exists(video_path):
+            try:
+                fingerprint_index.add(filename, fingerprint_file(video_path))
+            except OSError as error:
+                logging.error(f"Failed to fingerprint {filename}: {error}")
+
+
+def start_library_indexing() -> None:
+    """
+    Index the fingerprints of the videos already in the library on a background thread when the server starts, in
+    fingerprint dedupe mode
+    """
+    if get_dedupe_mode() == "fingerprint":
+        threading.Thread(target=index_library_fingerprints, name="fingerprint-library", daemon=True).start()
 
 
 def file_already_exists(video_hash: str) -> bool:
@@ -330,13 +697,7 @@ def file_already_exists(video_hash: str) -> bool:
     :param video_hash: Hash value of video to check
     :return: Returns boolean, true if found
     """
-    user_data = read_user_data()
-    if user_data is None:
-        return False
-    for record in user_data["all_videos"]:
-        if record["video_hash"] == video_hash:
-            return True
-    return False
+    return get_user_data_store().hash_exists(video_hash)
 
 
 def get_setup_progress() -> [str]:
@@ -357,22 +718,34 @@ def get_setup_progress() -> [str]:
     return setup_progress
 
 
+def format_video_entry(current_video: dict) -> dict:
+    """
+    Format a video record for the home page, in place
+    :param current_video: Video record or summary from user data storage
+    :return: The formatted video record
+    """
+    if current_video["progress"] < current_video["video_length"]:
+        current_video["progress_percent"] = round((current_video["progress"] / current_video["video_length"]) * 100)
+        current_video["progress"] = format_timestamp(current_video["progress"])
+    current_video["video_length"] = format_timestamp(current_video["video_length"])
+    current_video["thumbnail_ready"] = thumbnail_ready(current_video)
+    if current_video["thumbnail"].startswith(f"{THUMBNAIL_DIRECTORY}/") and current_video["video_hash"] is not None:
+        # The thumbnail format may have been changed since the video was added
+        current_video["thumbnail"] = f"{THUMBNAIL_DIRECTORY}/{get_thumbnail_store().name(current_video['video_hash'])}"
+    return current_video
+
+
 def parse_video_data() -> []:
     """
     Gets all video data from userdata storage and parses all data for in progress videos
     :return: Array containing two arrays, 1 with all videos 1 with in progress videos
     """
-    user_data = read_user_data()
-    if user_data is not None:
-        continue_watching = []
-        all_videos = user_data["all_videos"]
+    all_videos = get_user_data_store().all_videos()
+    if all_videos is not None:
+        continue_watching = [current_video for current_video in all_videos
+                             if current_video["progress"] < current_video["video_length"]]
         for current_video in all_videos:
-            if current_video["progress"] < current_video["video_length"]:
-                current_video["progress_percent"] = \
-                    round((current_video["progress"] / current_video["video_length"]) * 100)
-                current_video["progress"] = format_timestamp(current_video["progress"])
-                continue_watching.append(current_video)
-            current_video["video_length"] = format_timestamp(current_video["video_length"])
+            format_video_entry(current_video)
     else:
         continue_watching = None
         all_videos = None
@@ -382,10 +755,74 @@ def parse_video_data() -> []:
     }
 
 
-def download_youtube_video(video_url: str) -> str:
+def get_library_page(page: int = 1, sort: str = "recent", in_progress: bool = False, search: str = "") -> dict:
+    """
+    Get one page of the video library for the home page, only the videos on the page are loaded and formatted. The
+    page size is set by the [Library] page_size config option.
+    :param page: Page number starting at 1, pages past the end return the last page
+    :param sort: Order of the videos, one of LIBRARY_SORTS
+    :param in_progress: Only list videos that have been started but not finished
+    :param search: Only list videos whose alias contains this text, ignoring case
+    :return: Dict containing the formatted videos, the total number of matching videos, the page number and the
+             number of pages
+    """
+    page_size = max(int(config("Library", "page_size", fallback="24")), 1)
+    if sort not in LIBRARY_SORTS:
+        sort = "recent"
+    store = get_user_data_store()
+    if not store.is_available():
+        return {"videos": [], "total": 0, "page": 1, "pages": 1}
+    page = max(page, 1)
+    videos, total = store.list_videos((page - 1) * page_size, page_size, sort, in_progress, search)
+    pages = max((total + page_size - 1) // page_size, 1)
+    if page > pages:
+        page = pages
+        videos, total = store.list_videos((page - 1) * page_size, page_size, sort, in_progress, search)
+    return {"videos": [format_video_entry(current_video) for current_video in videos], "total": total,
+            "page": page, "pages": pages}
+
+
+def get_continue_watching() -> list:
+    """
+    Get the most recently added videos in progress, read from the in progress index of the user data store. The
+    number of videos is set by the [Library] continue_watching config option.
+    :return: List of formatted videos
+    """
+    limit = int(config("Library", "continue_watching", fallback="12"))
+    store = get_user_data_store()
+    if limit <= 0 or not store.is_available():
+        return []
+    videos, _ = store.list_videos(0, limit, "recent", in_progress=True)
+    return [format_video_entry(current_video) for current_video in videos]
+
+
+def search_code(query: str, limit: Optional[int] = None) -> list:
+    """
+    Search the code captured from every video, best match first. Only the most recently captured matches, up to the
+    [Search] max_candidates config option, are ranked, see CodeSearchIndex.search()
+    :param query: Search query, every word must appear in a capture
+    :param limit: [Optional] Maximum number of hits, set by the [Search] results config option by default
+    :return: List of hits, each a dict of filename, timestamp, formatted timestamp, score, snippet as HTML and the url
+             playing the video from the timestamp
+    """
+    if limit is None:
+        limit = int(config("Search", "results", fallback="20"))
+    try:
+        hits = get_code_search_index().search(query, limit)
+    except sqlite3.Error as error:
+        logging.error(f"Failed to search captured code for {query!r}: {error}")
+        return []
+    for hit in hits:
+        hit["formatted_timestamp"] = format_timestamp(int(hit["timestamp"]))
+        hit["url"] = f"/play_video/{quote(hit['filename'])}?t={hit['timestamp']:g}"
+    return hits
+
+
+def download_youtube_video(video_url: str, on_hashed: Optional[Callable[[str], None]] = None) -> str:
     """
     Download a video from YouTube and save to local device
     :param video_url: URL of video to download
+    :param on_hashed: Optional, passed to add_local_video()
     :return: Returns app url for function to redirect to
     """
     try:
@@ -394,12 +831,8 @@ def download_youtube_video(video_url: str) -> str:
         if yt_stream:
             yt_filename = format_youtube_video_name(yt_stream.default_filename)
             yt_stream.download(output_path=get_vid_save_path(), filename=yt_filename)
-            filename = yt_filename
-            file_hash = hash_video_file(filename)
-            if file_already_exists(file_hash):
-                return f"/play_video/{filename}"
-            add_video_to_user_data(filename, filename, file_hash, youtube_url=video_url)
-            return f"/play_video/{filename}"
+            play_filename = add_local_video(yt_filename, yt_filename, youtube_url=video_url, on_hashed=on_hashed)
+            return f"/play_video/{play_filename}"
     except RegexMatchError as error:
         logging.error(f"Failed to download from youtube with error: {error}")
     return "/upload"
@@ -427,35 +860,31 @@ def format_youtube_video_name(filename: str) -> Union[str, None]:
 
 def filename_exists_in_userdata(filename: str) -> bool:
     """
-    Checks if file name exists in userdata.json file
+    Checks if file name exists in user data storage
     :param filename: filename to check for
     :return: Bool returns true if found
     """
-    user_data = read_user_data()
-    if user_data is None:
-        return False
-    all_videos = user_data["all_videos"]
-    for current_video in all_videos:
-        if current_video["filename"] == filename:
-            return True
-    return False
+    return get_user_data_store().filename_exists(filename)
 
 
 def delete_video_from_userdata(filename: str) -> None:
     """
-    Deletes a video from userdata.json file
+    Deletes a video from user data storage
     :param filename: Filename of video to delete
     """
-    user_data = read_user_data()
-    if user_data is None:
-        return
-    all_videos = user_data["all_videos"]
-    for current_video in all_videos:
-        if current_video["filename"] == filename:
-            all_videos.remove(current_video)
-            break
-    with open("data/userdata.json", "w") as json_data:
-        json.dump(user_data, json_data, indent=4)
+    current_video = get_user_data_store().get_video(filename)
+    if current_video is not None and get_user_data_store().delete_video(filename):
+        fingerprint_index.remove(filename)
+        if current_video["video_hash"] is not None:
+            keyframe_index_store.delete(current_video["video_hash"])
+            pre_ocr_manager.delete(current_video["video_hash"])
+            if current_video["thumbnail"].startswith(f"{THUMBNAIL_DIRECTORY}/"):
+                get_thumbnail_store().delete(current_video["video_hash"])
+        if current_video["captures"]:
+            try:
+                get_code_search_index().delete_video(filename)
+            except sqlite3.Error as error:
+                logging.error(f"Failed to remove captures of {filename} from the code search index: {error}")
 
 
 def update_configuration(new_values_dict) -> None:
@@ -475,8 +904,11 @@ def update_configuration(new_values_dict) -> None:
                 value = str(value)
             config_file.set(section, key, value)
     # save the file
-    with open('config.ini', 'w') as config_file_save:
-        config_file.write(config_file_save)
+    try:
+        with open('config.ini', 'w') as config_file_save:
+            config_file.write(config_file_save)
+    finally:
+        config_cache.invalidate()
 
 
 def get_current_settings() -> dict:
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import cv2
+
+
+class PooledCapture:
+    """
+    An open cv2.VideoCapture handle owned by a VideoCapturePool.
+    """
+
+    def __init__(self, video_path: str, capture: cv2.VideoCapture):
+        self.video_path = video_path
+        self.capture = capture
+        self.last_used = time.monotonic()
+
+    def release(self) -> None:
+        """
+        Release the underlying decoder
+        """
+        self.capture.release()
+
+
+class VideoCapturePool:
+    """
+    Bounded, thread-safe pool of open cv2.VideoCapture handles keyed by video path.
+
+    Opening a video parses the container and its index, so handles are kept open between captures instead of being
+    re-opened every time. A handle is only ever leased to one thread at a time. Idle handles are evicted in least
+    recently used order once the pool is full, and closed once they have been idle for longer than idle_timeout.
+    """
+
+    def __init__(self, max_size: int = 4, idle_timeout: float = 300.0,
+                 opener: Callable[[str], cv2.VideoCapture] = cv2.VideoCapture):
+        """
+        :param max_size: Maximum number of idle handles kept open
+        :param idle_timeout: Seconds an idle handle is kept open before it is released
+        :param opener: Function used to open a new capture for a video path
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.opener = opener
+        self.hits = 0
+        self.misses = 0
+        self._idle: "OrderedDict[int, PooledCapture]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _take_idle(self, video_path: str) -> Optional[PooledCapture]:
+        """
+        Remove and return an idle handle for the video, must be called with the lock held
+        :param video_path: Path of the video
+        :return: PooledCapture or None
+        """
+        for key, pooled in reversed(self._idle.items()):
+            if pooled.video_path == video_path:
+                del self._idle[key]
+                return pooled
+        return None
+
+    def _evict(self) -> list:
+        """
+        Remove handles that have timed out or do not fit in the pool, must be called with the lock held
+        :return: List of PooledCapture objects to release outside the lock
+        """
+        evicted = []
+        now = time.monotonic()
+        for key, pooled in list(self._idle.items()):
+            if now - pooled.last_used > self.idle_timeout:
+                evicted.append(self._idle.pop(key))
+        while len(self._idle) > self.max_size:
+            evicted.append(self._idle.popitem(last=False)[1])
+        return evicted
+
+    @contextmanager
+    def acquire(self, video_path: str) -> Iterator[Optional[cv2.VideoCapture]]:
+        """
+        Lease an open capture for a video, the capture is returned to the pool when the with block exits. If the
+        video could not be opened None is yielded. Handles are released instead of returned if the block raises.
+        :param video_path: Path of the video to open
+        :return: Context manager yielding cv2.VideoCapture or None
+        """
+        with self._lock:
+            pooled = self._take_idle(video_path)
+            if pooled is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            evicted = self._evict()
+        for stale in evicted:
+            stale.release()
+        if pooled is None:
+            capture = self.opener(video_path)
+            if not capture.isOpened():
+                capture.release()
+                yield None
+                return
+            pooled = PooledCapture(video_path, capture)
+        try:
+            yield pooled.capture
+        except Exception:
+            pooled.release()
+            raise
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle[id(pooled)] = pooled
+            evicted = self._evict()
+        for stale in evicted:
+            stale.release()
+
+    def discard(self, video_path: str) -> None:
+        """
+        Release all idle handles for a video, e.g. before the file is deleted or replaced
+        :param video_path: Path of the video
+        """
+        with self._lock:
+            discarded = [self._idle.pop(key) for key, pooled in list(self._idle.items())
+                         if pooled.video_path == video_path]
+        for pooled in discarded:
+            pooled.release()
+
+    def close(self) -> None:
+        """
+        Release every idle handle in the pool
+        """
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for pooled in idle:
+            pooled.release()
+        logging.info(f"Closed video capture pool ({self.hits} hits, {self.misses} misses)")
+
+    def stats(self) -> dict:
+        """
+        Returns pool counters
+        :return: Dict containing hits, misses and number of idle handles
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "idle": len(self._idle)}
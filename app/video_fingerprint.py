@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+# Number of evenly spaced blocks sampled between the head and tail of a file
+SAMPLE_BLOCKS = 16
+# Bytes read per sampled block
+SAMPLE_BLOCK_SIZE = 64 * 1024
+
+
+def fingerprint_file(path: Union[str, Path], sample_blocks: int = SAMPLE_BLOCKS,
+                     block_size: int = SAMPLE_BLOCK_SIZE) -> str:
+    """
+    Fingerprint a file from its size and a sample of its content: the first and last blocks and sample_blocks blocks
+    evenly spaced between them. Only (sample_blocks + 2) * block_size bytes are read whatever the size of the file, so
+    large videos are fingerprinted in milliseconds. Different files can share a fingerprint (e.g. re-encodes that only
+    differ between sampled blocks), so a matching fingerprint must be confirmed with a full hash.
+    :param path: Path of the file
+    :param sample_blocks: Number of blocks sampled between the head and tail
+    :param block_size: Bytes read per block
+    :return: Hex fingerprint
+    """
+    size = os.path.getsize(path)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(size.to_bytes(8, "little"))
+    with open(path, "rb") as file:
+        if size <= (sample_blocks + 2) * block_size:
+            hasher.update(file.read())
+            return hasher.hexdigest()
+        last_offset = size - block_size
+        for index in range(sample_blocks + 2):
+            file.seek(last_offset * index // (sample_blocks + 1))
+            hasher.update(file.read(block_size))
+    return hasher.hexdigest()
+
+
+class FingerprintIndex:
+    """
+    Persisted index from content fingerprints to the filenames of the videos in the library, so a new video can be
+    checked for duplicates without hashing all of it. Videos are keyed by filename rather than video hash, as the
+    hash of a video added in fingerprint dedupe mode is only known once it has been computed in the background.
+    """
+
+    def __init__(self, index_path: Union[str, Path] = "data/video_fingerprints.json"):
+        """
+        :param index_path: Path of the json file the index is stored in
+        """
+        self.index_path = Path(index_path)
+        self._fingerprints = None
+        self._filenames = {}
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        """
+        Load the index from disk on first use, must be called with the lock held
+        """
+        if self._fingerprints is not None:
+            return
+        self._fingerprints = {}
+        if self.index_path.exists():
+            try:
+                with self.index_path.open("r") as index_file:
+                    self._fingerprints = json.load(index_file)
+            except (json.JSONDecodeError, OSError) as error:
+                logging.error(f"Failed to read fingerprint index {self.index_path}, rebuilding it: {error}")
+        for filename, fingerprint in self._fingerprints.items():
+            self._filenames.setdefault(fingerprint, []).append(filename)
+
+    def _save(self) -> None:
+        """
+        Write the index to disk, must be called with the lock held
+        """
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix(".tmp")
+        with temp_path.open("w") as index_file:
+            json.dump(self._fingerprints, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def add(self, filename: str, fingerprint: str) -> None:
+        """
+        Index the fingerprint of a video
+        :param filename: Filename of the video in the library
+        :param fingerprint: Fingerprint from fingerprint_file()
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._fingerprints.get(filename) == fingerprint:
+                return
+            self._remove(filename)
+            self._fingerprints[filename] = fingerprint
+            self._filenames.setdefault(fingerprint, []).append(filename)
+            self._save()
+
+    def lookup(self, fingerprint: str) -> list:
+        """
+        Get the videos with a fingerprint
+        :param fingerprint: Fingerprint from fingerprint_file()
+        :return: List of filenames, empty if no video has the fingerprint
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._filenames.get(fingerprint, []))
+
+    def get(self, filename: str) -> Optional[str]:
+        """
+        Get the fingerprint of a video
+        :param filename: Filename of the video in the library
+        :return: Fingerprint or None if the video is not indexed
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._fingerprints.get(filename)
+
+    def _remove(self, filename: str) -> None:
+        fingerprint = self._fingerprints.pop(filename, None)
+        if fingerprint is not None:
+            self._filenames[fingerprint].remove(filename)
+            if not self._filenames[fingerprint]:
+                del self._filenames[fingerprint]
+
+    def remove(self, filename: str) -> None:
+        """
+        Remove a video from the index
+        :param filename: Filename of the video in the library
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if filename in self._fingerprints:
+                self._remove(filename)
+                self._save()
+
+
+class FingerprintCache:
+    """
+    Caches the fingerprints of files by their size and modification time, so files that have not changed since they
+    were last fingerprinted are not read again.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        :param max_entries: Maximum number of files cached, the oldest entry is dropped when full
+        """
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, path: Union[str, Path]) -> str:
+        """
+        Get the fingerprint of a file, computing it only if the file changed since it was last fingerprinted
+        :param path: Path of the file
+        :return: Hex fingerprint from fingerprint_file()
+        :raises OSError: If the file cannot be read
+        """
+        stat = os.stat(path)
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == (stat.st_size, stat.st_mtime_ns):
+            return entry[1]
+        fingerprint = fingerprint_file(path)
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = ((stat.st_size, stat.st_mtime_ns), fingerprint)
+        return fingerprint
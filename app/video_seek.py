@@ -0,0 +1,204 @@
+import bisect
+import json
+import logging
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# Frames decoded forward from the current position instead of seeking when no keyframe index is available
+FORWARD_DECODE_WINDOW_SECONDS = 2
+
+
+def build_keyframe_index(video_path: str, ffprobe_executable: str = "ffprobe") -> Optional[list]:
+    """
+    Build a sorted list of keyframe timestamps (in seconds) for a video by reading its packet flags with ffprobe.
+    Only packet headers are read, no frames are decoded.
+    :param video_path: Path of the video to index
+    :param ffprobe_executable: ffprobe executable name or path
+    :return: List of keyframe timestamps or None if ffprobe is unavailable or failed
+    """
+    if shutil.which(ffprobe_executable) is None:
+        logging.info(f"ffprobe executable '{ffprobe_executable}' not found, keyframe index not built for {video_path}")
+        return None
+    try:
+        result = subprocess.run([ffprobe_executable, "-v", "error", "-select_streams", "v:0", "-show_entries",
+                                 "packet=pts_time,flags", "-of", "csv=p=0", video_path],
+                                capture_output=True, text=True, check=True)
+    except (subprocess.SubprocessError, OSError) as error:
+        logging.error(f"Failed to build keyframe index for {video_path}: {error}")
+        return None
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+class KeyframeIndexStore:
+    """
+    Persists per-video keyframe indexes as json files named by video hash, with an in memory cache.
+    """
+
+    def __init__(self, directory: Union[str, Path] = "data/keyframes"):
+        """
+        :param directory: Directory to store keyframe index files in
+        """
+        self.directory = Path(directory)
+        self._cache = {}
+        self._building = set()
+        self._unavailable = set()
+        self._lock = threading.Lock()
+
+    def _index_path(self, video_hash: str) -> Path:
+        return self.directory / f"{video_hash}.json"
+
+    def get(self, video_hash: str) -> Optional[list]:
+        """
+        Get the keyframe index for a video
+        :param video_hash: Hash of the video
+        :return: Sorted list of keyframe timestamps or None if no index exists
+        """
+        with self._lock:
+            if video_hash in self._cache:
+                return self._cache[video_hash]
+        index_path = self._index_path(video_hash)
+        if not index_path.exists():
+            return None
+        try:
+            with index_path.open("r") as index_file:
+                keyframes = json.load(index_file)["keyframes"]
+        except (json.JSONDecodeError, KeyError, OSError) as error:
+            logging.error(f"Failed to read keyframe index {index_path}: {error}")
+            return None
+        with self._lock:
+            self._cache[video_hash] = keyframes
+        return keyframes
+
+    def save(self, video_hash: str, keyframes: list) -> None:
+        """
+        Persist a keyframe index for a video
+        :param video_hash: Hash of the video
+        :param keyframes: Sorted list of keyframe timestamps
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._index_path(video_hash).open("w") as index_file:
+            json.dump({"keyframes": keyframes}, index_file)
+        with self._lock:
+            self._cache[video_hash] = keyframes
+
+    def build(self, video_hash: str, video_path: str, ffprobe_executable: str = "ffprobe") -> Optional[list]:
+        """
+        Build and persist the keyframe index for a video
+        :param video_hash: Hash of the video
+        :param video_path: Path of the video
+        :param ffprobe_executable: ffprobe executable name or path
+        :return: Sorted list of keyframe timestamps or None if the index could not be built
+        """
+        try:
+            keyframes = build_keyframe_index(video_path, ffprobe_executable)
+            if keyframes:
+                self.save(video_hash, keyframes)
+                logging.info(f"Built keyframe index with {len(keyframes)} keyframes for {video_path}")
+            else:
+                with self._lock:
+                    self._unavailable.add(video_hash)
+            return keyframes
+        finally:
+            with self._lock:
+                self._building.discard(video_hash)
+
+    def build_in_background(self, video_hash: str, video_path: str, ffprobe_executable: str = "ffprobe") -> None:
+        """
+        Build the keyframe index for a video on a background thread, does nothing if a build is already running or a
+        previous build for the video failed
+        :param video_hash: Hash of the video
+        :param video_path: Path of the video
+        :param ffprobe_executable: ffprobe executable name or path
+        """
+        with self._lock:
+            if video_hash in self._building or video_hash in self._unavailable:
+                return
+            self._building.add(video_hash)
+        threading.Thread(target=self.build, args=(video_hash, video_path, ffprobe_executable),
+                         name=f"keyframe-index-{video_hash}", daemon=True).start()
+
+    def delete(self, video_hash: str) -> None:
+        """
+        Delete the keyframe index for a video
+        :param video_hash: Hash of the video
+        """
+        with self._lock:
+            self._cache.pop(video_hash, None)
+            self._unavailable.discard(video_hash)
+        self._index_path(video_hash).unlink(missing_ok=True)
+
+
+def nearest_keyframe(keyframes: list, timestamp: float) -> float:
+    """
+    Get the latest keyframe at or before a timestamp
+    :param keyframes: Sorted list of keyframe timestamps
+    :param timestamp: Timestamp in seconds
+    :return: Keyframe timestamp in seconds
+    """
+    position = bisect.bisect_right(keyframes, timestamp)
+    return keyframes[position - 1] if position > 0 else 0.0
+
+
+def seek_frame(capture: cv2.VideoCapture, timestamp: float, keyframes: Optional[list] = None) -> Optional[np.ndarray]:
+    """
+    Read the frame at a timestamp, seeking to the nearest keyframe and decoding forward only as far as needed.
+
+    If the decoder is already positioned between the keyframe and the target (e.g. a pooled decoder used for an
+    earlier capture in the same group of pictures) no seek is made at all. Without a keyframe index the decoder only
+    decodes forward for targets a short distance ahead, otherwise it falls back to seeking directly to the target.
+    :param capture: Open video capture
+    :param timestamp: Timestamp of the frame in seconds
+    :param keyframes: Optional sorted list of keyframe timestamps for the video
+    :return: Frame or None if it could not be read
+    """
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if not fps or fps <= 0:
+        capture.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+        ret, frame = capture.read()
+        return frame if ret else None
+    target_frame = int(timestamp * fps)
+    next_frame = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+    if keyframes:
+        seek_target = int(nearest_keyframe(keyframes, timestamp) * fps)
+    else:
+        seek_target = max(target_frame - int(FORWARD_DECODE_WINDOW_SECONDS * fps), 0)
+    if not seek_target <= next_frame <= target_frame:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, seek_target if keyframes else target_frame)
+        next_frame = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+    for _ in range(target_frame - next_frame):
+        if not capture.grab():
+            return None
+    ret, frame = capture.read()
+    return frame if ret else None
+
+
+def seek_frames(capture: cv2.VideoCapture, timestamps: list,
+                keyframes: Optional[list] = None) -> Iterator[Tuple[float, Optional[np.ndarray]]]:
+    """
+    Read the frames at several timestamps in a single pass over the video. Timestamps are visited in ascending order so
+    the decoder only moves forward, decoding straight through closely spaced timestamps and seeking past long gaps.
+    Timestamps falling on the same frame share one decode.
+    :param capture: Open video capture
+    :param timestamps: Timestamps of the frames in seconds
+    :param keyframes: Optional sorted list of keyframe timestamps for the video
+    :return: Iterator of (timestamp, frame or None if it could not be read) in ascending timestamp order
+    """
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    previous_index, frame = None, None
+    for timestamp in sorted(timestamps):
+        frame_index = int(timestamp * fps) if fps and fps > 0 else timestamp
+        if frame_index != previous_index:
+            frame = seek_frame(capture, timestamp, keyframes)
+            previous_index = frame_index
+        yield timestamp, frame
@@ -0,0 +1,103 @@
+import mimetypes
+import os
+from typing import BinaryIO, Iterator, Optional
+
+from werkzeug.http import http_date
+from werkzeug.wrappers import Request, Response
+
+# Bytes sent at a time when the WSGI server has no file wrapper
+VIDEO_BLOCK_SIZE = 1024 * 1024
+
+
+def read_range(file: BinaryIO, length: int, block_size: int = VIDEO_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Read length bytes from the current position of a file in blocks, closing the file when done
+    :param file: File to read, positioned at the start of the range
+    :param length: Number of bytes to read
+    :param block_size: Bytes read at a time
+    :return: Iterator of blocks
+    """
+    try:
+        while length > 0:
+            block = file.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        file.close()
+
+
+def file_body(environ: dict, file: BinaryIO, length: int, block_size: int = VIDEO_BLOCK_SIZE):
+    """
+    Get the response body for length bytes from the current position of a file. The WSGI server's file wrapper is used
+    when it has one, which gunicorn and waitress serve with sendfile() without copying the file through Python. Both
+    start at the current position of the file and stop after Content-Length bytes.
+    :param environ: WSGI environment of the request
+    :param file: File to send, positioned at the start of the body
+    :param length: Number of bytes to send, must also be set as the Content-Length of the response
+    :param block_size: Bytes read at a time
+    :return: Iterable response body
+    """
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    if file_wrapper is not None:
+        return file_wrapper(file, block_size)
+    return read_range(file, length, block_size)
+
+
+def send_video(request: Request, path: str, etag: Optional[str] = None, max_age: int = 0,
+               block_size: int = VIDEO_BLOCK_SIZE) -> Response:
+    """
+    Send a video file, answering Range requests with 206 Partial Content so the player can seek without downloading
+    the whole video, and conditional requests (If-None-Match, If-Modified-Since, If-Range) with 304 Not Modified when
+    the browser's cached copy is current.
+    :param request: Request for the video
+    :param path: Path of the video file
+    :param etag: [Optional] Strong ETag of the video, e.g. the hash of its content. Derived from the size and
+    modification time of the file if not given
+    :param max_age: Seconds the browser may use its cached copy without revalidating, 0 to always revalidate
+    :param block_size: Bytes read at a time
+    :return: Response for the video
+    :raises OSError: If the file cannot be read
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    if etag is None:
+        etag = f"{stat.st_mtime_ns:x}-{size:x}"
+    response = Response(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                        direct_passthrough=True)
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Cache-Control"] = f"private, max-age={max_age}" if max_age > 0 else "no-cache"
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    response.set_etag(etag)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and \
+            request.if_modified_since.timestamp() >= int(stat.st_mtime)
+    if not_modified and request.method in ("GET", "HEAD"):
+        response.status_code = 304
+        return response
+
+    start, end = 0, size
+    byte_range = request.range
+    if_range = request.if_range
+    range_is_current = if_range.etag == etag if if_range.etag else \
+        if_range.date is None or if_range.date.timestamp() >= int(stat.st_mtime)
+    # Multiple ranges would need a multipart response, the whole video is sent instead as RFC 9110 allows
+    if byte_range is not None and len(byte_range.ranges) == 1 and range_is_current:
+        content_range = byte_range.range_for_length(size)
+        if content_range is None:
+            response.status_code = 416
+            response.headers["Content-Range"] = f"bytes */{size}"
+            return response
+        start, end = content_range
+        response.status_code = 206
+        response.headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    response.content_length = end - start
+    if request.method != "HEAD":
+        file = open(path, "rb")
+        file.seek(start)
+        response.response = file_body(request.environ, file, end - start, block_size)
+    return response
@@ -1,5 +1,6 @@
 from app import utils
 from typing import Union
+import html
 
 
 def parse_command(command: str) -> Union[str, dict]:
@@ -32,6 +33,14 @@ def parse_command(command: str) -> Union[str, dict]:
     if command == "play-video":
         return "<span class=\"text-red-500\">Invalid usage of play-video. Video must be specified. " \
                "Type help for more information</span>"
+    # Invalid capture-range command
+    if command == "capture-range":
+        return "<span class=\"text-red-500\">Invalid usage of capture-range. Start and end timestamps must be " \
+               "specified. Type help for more information</span>"
+    # Invalid search-code command
+    if command == "search-code":
+        return "<span class=\"text-red-500\">Invalid usage of search-code. A search query must be specified. " \
+               "Type help for more information</span>"
     # Multiple word/option commands
     return parse_split_command(command_original)
 
@@ -60,22 +69,62 @@ def parse_split_command(command_original: str) -> Union[str, dict]:
                 }
             return f"<span class=\"text-red-500\">Failed to open video \"{play_filename}\", file does not " \
                    "exist</span>"
+        # Capture range command
+        if split_commands[0] == "capture-range":
+            return capture_range(split_commands[1:])
+        # Search code command
+        if split_commands[0] == "search-code":
+            return search_code(command_original[12:])
     # Invalid command
     return f"<span class=\"text-red-500\">Invalid command \"{command_original}\", type help for more information</span>"
 
 
+def capture_range(options: list) -> Union[str, dict]:
+    """
+    Parse the options of the capture-range command
+    :param options: Start and end timestamps and optional step in seconds
+    :return: Dict containing the range to capture or error string
+    """
+    try:
+        if len(options) not in (2, 3):
+            raise ValueError("Start and end timestamps must be specified")
+        start, end = utils.parse_timestamp(options[0]), utils.parse_timestamp(options[1])
+        step = utils.parse_timestamp(options[2]) if len(options) == 3 else 1.0
+        if step <= 0 or end < start:
+            raise ValueError("The end timestamp must not be before the start and the step must be positive")
+    except ValueError as error:
+        return f"<span class=\"text-red-500\">Invalid usage of capture-range. {error}. Type help for more " \
+               "information</span>"
+    return {"capture_range": {"start": start, "end": end, "step": step}}
+
+
+def search_code(query: str) -> str:
+    """
+    Returns formatted list of the captures matching a search query, each linking to its video at the capture timestamp
+    :param query: Search query
+    :return: HTML formatted string of search hits
+    """
+    hits = utils.search_code(query)
+    if not hits:
+        return f"<p class='text-red-500'>No captured code found matching \"{html.escape(query)}\".<p>"
+    formatted_hits_string = f"<pre><strong>Captured code matching \"{html.escape(query)}\":</strong>"
+    for hit in hits:
+        formatted_hits_string += f"<br><p><a class='underline' href=\"{html.escape(hit['url'])}\"><strong>" \
+                                 f"{html.escape(hit['filename'])}</strong> at {hit['formatted_timestamp']}</a></p>" \
+                                 f"<p>{hit['snippet']}</p>"
+    formatted_hits_string += "</pre>"
+    return formatted_hits_string
+
+
 def available_videos() -> {}:
     """
     Returns dict of available videos to play
     :return: Dict containing video filenames
     """
-    user_data = utils.read_user_data()
-    if user_data is None:
-        return {}
-    all_videos = user_data["all_videos"]
+    filenames = utils.get_user_data_store().filenames()
     filename_dict = {}
-    for index in range(0, len(all_videos)):
-        filename_dict[index] = all_videos[index]["filename"]
+    for index in range(0, len(filenames)):
+        filename_dict[index] = filenames[index]
     return filename_dict
 
 
@@ -85,10 +134,9 @@ def list_videos() -> str:
     :return: HTML formatted string of videos
     """
 
-    user_data = utils.read_user_data()
-    if user_data is None:
+    all_videos = utils.get_user_data_store().all_videos()
+    if all_videos is None:
         return "<p class='text-red-500'>No videos found in your library.<p>"
-    all_videos = user_data["all_videos"]
     formatted_video_string = "<pre><strong>Your Videos:</strong>"
     for current_video in all_videos:
         current_video_string = f"<br><p><strong>Filename: " \
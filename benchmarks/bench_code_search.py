@@ -0,0 +1,79 @@
+"""
+Benchmark of the full-text search of captured code in app/code_search.py.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_code_search --captures 1000000 --budget 50
+
+A synthetic library of captures is built from the fixture code snippets, with numbered identifiers so some words are in
+almost every capture and others in a few hundred, and indexed in a temporary directory. Every capture is distinct, as
+repeated captures of the same code in a video share one posting. Queries of common words, rare words and both are then
+timed and their median and 99th percentile latency compared with the budget.
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.code_search import CodeSearchIndex
+from benchmarks.fixtures import CODE_SNIPPETS
+
+QUERIES = ["print", "def self", "self.items.append(item)", "index1234", "print(data42)", "return a + b", "no_such_word"]
+
+
+def build_library(video_count: int, capture_count: int) -> list:
+    """
+    Build synthetic video records with captures of the fixture snippets
+    :param video_count: Number of videos to generate
+    :param capture_count: Total number of captures spread across the videos
+    :return: List of video records
+    """
+    random_generator = random.Random(0)
+    all_videos = [{"filename": f"video_{index}.mp4", "captures": []} for index in range(video_count)]
+    for index in range(capture_count):
+        lines = CODE_SNIPPETS[index % len(CODE_SNIPPETS)]
+        content = "\n".join(lines).replace("index", f"index{random_generator.randrange(5000)}") \
+            .replace("data", f"data{random_generator.randrange(5000)}") + f"\ntotal = {index}"
+        all_videos[index % video_count]["captures"].append({"timestamp": index % 3600, "capture_content": content})
+    return all_videos
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time code search queries over a synthetic library")
+    parser.add_argument("--videos", type=int, default=1000, help="Number of videos in the library")
+    parser.add_argument("--captures", type=int, default=1000000, help="Total number of captures in the library")
+    parser.add_argument("--repeats", type=int, default=20, help="Number of times each query is timed")
+    parser.add_argument("--budget", type=float, default=50, help="Latency budget of a query in milliseconds")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index = CodeSearchIndex(Path(temp_dir) / "code_search.db")
+        print(f"[*] Indexing {args.captures} captures of {args.videos} videos")
+        start = time.perf_counter()
+        index.build(build_library(args.videos, args.captures))
+        print(f"    build: {time.perf_counter() - start:.1f} s, "
+              f"{index.database_path.stat().st_size / 1024 / 1024:.0f} MB")
+        start = time.perf_counter()
+        for capture_index in range(100):
+            index.add_capture("video_0.mp4",
+                              {"timestamp": capture_index, "capture_content": f"print(index{capture_index})"})
+        print(f"    add_capture: {(time.perf_counter() - start) * 10:.3f} ms/op")
+
+        print(f"\n{'query':<28} {'hits':>5} {'p50':>10} {'p99':>10}")
+        slowest = 0
+        for query in QUERIES:
+            latencies = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                hits = index.search(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+            quantiles = statistics.quantiles(latencies, n=100)
+            slowest = max(slowest, quantiles[98])
+            print(f"{query:<28} {len(hits):>5} {quantiles[49]:>7.2f} ms {quantiles[98]:>7.2f} ms")
+        print(f"\nSlowest p99 {slowest:.2f} ms, {'within' if slowest <= args.budget else 'over'} the "
+              f"{args.budget:.0f} ms budget")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
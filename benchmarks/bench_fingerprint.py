@@ -0,0 +1,72 @@
+"""
+Benchmark of hashing uploaded videos, reporting the time to hash a file with the original 4 KB md5 loop, with
+hash_file() and 1 MB reads for each supported algorithm, and to fingerprint it with fingerprint_file().
+
+Files of each size are filled with random bytes in a temporary directory. The first read of a file may be served from
+disk rather than the page cache, so each measurement is the best of --repeats runs.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_fingerprint --sizes 100,1024,5120 --repeats 3
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from app.chunked_upload import HASH_ALGORITHMS, hash_file
+from app.video_fingerprint import fingerprint_file
+
+WRITE_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def md5_4k(path: str) -> str:
+    """
+    Hash a file the way hash_video_file() did before hash_file()
+    """
+    hasher = hashlib.md5()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(4096), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def write_file(path: str, size_mb: int) -> None:
+    remaining = size_mb * 1024 * 1024
+    block = os.urandom(WRITE_BLOCK_SIZE)
+    with open(path, "wb") as file:
+        while remaining > 0:
+            file.write(block[:remaining])
+            remaining -= WRITE_BLOCK_SIZE
+
+
+def best_time(function, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure full hashing and fingerprinting times for video files")
+    parser.add_argument("--sizes", default="100,1024,5120", help="Comma separated file sizes in MB")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of times each file is hashed")
+    args = parser.parse_args()
+    methods = {"md5 4 KB": md5_4k}
+    for algorithm in HASH_ALGORITHMS:
+        methods[f"{algorithm} 1 MB"] = lambda path, algorithm=algorithm: hash_file(path, algorithm)
+    methods["fingerprint"] = fingerprint_file
+    print(f"{'size':>8} " + " ".join(f"{name:>14}" for name in methods))
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in (int(size) for size in args.sizes.split(",")):
+            path = os.path.join(directory, f"{size_mb}.mp4")
+            write_file(path, size_mb)
+            times = [best_time(lambda: method(path), args.repeats) for method in methods.values()]
+            print(f"{size_mb:>5} MB " + " ".join(f"{seconds * 1000:>11.1f} ms" for seconds in times))
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
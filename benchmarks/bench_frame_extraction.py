@@ -0,0 +1,76 @@
+"""
+Benchmark of capture latency for opening a new decoder per capture versus leasing one from VideoCapturePool.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_frame_extraction --video path/to/video.mp4 --captures 50
+
+If no video is given a synthetic tutorial video is generated in a temporary directory.
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+from app.video_capture_pool import VideoCapturePool
+from benchmarks.fixtures import create_sample_video
+
+
+def capture_without_pool(video_path: str, timestamp: float) -> bool:
+    """
+    Original capture path, opens, seeks and reads the frame with a fresh decoder
+    """
+    capture = cv2.VideoCapture(video_path)
+    capture.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+    ret, _ = capture.read()
+    capture.release()
+    return ret
+
+
+def capture_with_pool(pool: VideoCapturePool, video_path: str, timestamp: float) -> bool:
+    """
+    Pooled capture path, leases an already open decoder
+    """
+    with pool.acquire(video_path) as capture:
+        capture.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+        ret, _ = capture.read()
+    return ret
+
+
+def report(name: str, latencies: list) -> None:
+    """
+    Print latency percentiles in milliseconds
+    """
+    latencies = sorted(latency * 1000 for latency in latencies)
+    print(f"    {name:<16} mean {statistics.mean(latencies):8.2f} ms   p50 {latencies[len(latencies) // 2]:8.2f} ms   "
+          f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare capture latency with and without the decoder pool")
+    parser.add_argument("--video", help="Video to capture frames from, a synthetic video is used if omitted")
+    parser.add_argument("--captures", type=int, default=50, help="Number of captures to time")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path = args.video or create_sample_video(str(Path(temp_dir) / "sample.mp4"))
+        capture = cv2.VideoCapture(video_path)
+        duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+        timestamps = [random.uniform(0, duration - 1) for _ in range(args.captures)]
+        pool = VideoCapturePool()
+        for name, capture_frame in [("without pool", lambda stamp: capture_without_pool(video_path, stamp)),
+                                    ("with pool", lambda stamp: capture_with_pool(pool, video_path, stamp))]:
+            latencies = []
+            for timestamp in timestamps:
+                start = time.perf_counter()
+                capture_frame(timestamp)
+                latencies.append(time.perf_counter() - start)
+            report(name, latencies)
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
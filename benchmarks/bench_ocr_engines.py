@@ -0,0 +1,118 @@
+"""
+Benchmark suite of the OCR engines registered in app/ocr_engines.py, run over a fixture corpus of preprocessed
+synthetic editor frames (every code snippet in dark and light themes). Two tables are printed:
+
+- throughput: the first call of each engine, which loads the model, then captures per second, median and 99th
+  percentile latency of the rest
+- accuracy: character accuracy against the known text of the frames for each theme and overall, and the mean
+  confidence the engine reported
+
+The fastest engine whose overall accuracy meets --accuracy-bar is then recommended.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_ocr_engines --repeats 3 --accuracy-bar 90
+
+The opencv_dnn engine needs a CTC text recognition model, e.g. the CRNN model and alphabet of the OpenCV text
+recognition sample:
+    $ python -m benchmarks.bench_ocr_engines --dnn-model crnn_cs.onnx --dnn-vocabulary alphabet_94.txt --dnn-rgb-input
+
+Engines that are not installed or have no model are skipped.
+"""
+import argparse
+import statistics
+import time
+
+import pytesseract
+
+from app.frame_preprocessing import preprocess_frame
+from app.ocr_engines import OCR_ENGINES
+from benchmarks.bench_preprocessing import character_accuracy
+from benchmarks.fixtures import CODE_SNIPPETS, draw_code_frame
+
+TESSERACT_CONFIG = "--dpi 300"
+
+
+def load_engine(name: str, options: dict):
+    """
+    Create an engine, None if it is not installed
+    """
+    try:
+        engine = OCR_ENGINES[name](options)
+        if name == "pytesseract":
+            pytesseract.get_tesseract_version()
+        return engine
+    except (ImportError, RuntimeError, pytesseract.TesseractNotFoundError) as error:
+        print(f"{name:<14} not available ({error})")
+        return None
+
+
+def run_engine(engine, corpus: list, repeats: int) -> dict:
+    """
+    OCR every frame of the corpus repeats times
+    :return: Dict of the first call latency, throughput, latencies, accuracy by theme and mean confidence
+    """
+    start = time.perf_counter()
+    engine.recognize(corpus[0][0], TESSERACT_CONFIG)
+    first = time.perf_counter() - start
+    latencies, confidences = [], []
+    accuracies = {"dark": [], "light": []}
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for image, expected, theme in corpus:
+            result = engine.recognize(image, TESSERACT_CONFIG)
+            latencies.append(result.elapsed)
+            confidences.append(result.confidence)
+            accuracies[theme].append(character_accuracy(result.text, expected))
+    elapsed = time.perf_counter() - start
+    return {"first": first, "throughput": len(latencies) / elapsed, "latencies": latencies,
+            "accuracy": {theme: statistics.mean(values) * 100 for theme, values in accuracies.items()},
+            "overall": statistics.mean(accuracies["dark"] + accuracies["light"]) * 100,
+            "confidence": statistics.mean(confidences)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare throughput and accuracy of the OCR engines")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of times the corpus is read by each engine")
+    parser.add_argument("--accuracy-bar", type=float, default=90, help="Minimum overall character accuracy in %%")
+    parser.add_argument("--dnn-model", default="", help="Text recognition model of the opencv_dnn engine")
+    parser.add_argument("--dnn-vocabulary", default="", help="Vocabulary of the model, one character per line")
+    parser.add_argument("--dnn-input-width", default="100", help="Input width of the model")
+    parser.add_argument("--dnn-input-height", default="32", help="Input height of the model")
+    parser.add_argument("--dnn-rgb-input", action="store_true", help="The model takes colour rather than gray input")
+    args = parser.parse_args()
+    options = {"dnn_model": args.dnn_model, "dnn_vocabulary": args.dnn_vocabulary,
+               "dnn_input_width": args.dnn_input_width, "dnn_input_height": args.dnn_input_height,
+               "dnn_rgb_input": str(args.dnn_rgb_input)}
+    corpus = [(preprocess_frame(draw_code_frame(lines, 1280, 720, theme == "dark")), "\n".join(lines), theme)
+              for lines in CODE_SNIPPETS for theme in ("dark", "light")]
+    results = {}
+    for name in OCR_ENGINES:
+        engine = load_engine(name, options)
+        if engine is not None:
+            results[name] = run_engine(engine, corpus, args.repeats)
+            engine.close()
+    if not results:
+        return
+
+    print(f"\n{len(corpus)} frames x {args.repeats} repeats")
+    print(f"{'engine':<14} {'first':>10} {'captures/s':>11} {'p50':>10} {'p99':>10}")
+    for name, result in results.items():
+        quantiles = statistics.quantiles(result["latencies"], n=100) if len(result["latencies"]) > 1 \
+            else result["latencies"] * 99
+        print(f"{name:<14} {result['first'] * 1000:>7.1f} ms {result['throughput']:>11.2f} "
+              f"{quantiles[49] * 1000:>7.1f} ms {quantiles[98] * 1000:>7.1f} ms")
+    print(f"\n{'engine':<14} {'dark':>8} {'light':>8} {'overall':>8} {'confidence':>11}")
+    for name, result in results.items():
+        print(f"{name:<14} {result['accuracy']['dark']:>7.1f}% {result['accuracy']['light']:>7.1f}% "
+              f"{result['overall']:>7.1f}% {result['confidence']:>11.1f}")
+
+    eligible = [name for name, result in results.items() if result["overall"] >= args.accuracy_bar]
+    if eligible:
+        fastest = max(eligible, key=lambda name: results[name]["throughput"])
+        print(f"\nFastest engine with at least {args.accuracy_bar:.0f}% accuracy: {fastest}")
+    else:
+        print(f"\nNo engine reached {args.accuracy_bar:.0f}% accuracy")
+
+
+if __name__ == "__main__":
+    main()
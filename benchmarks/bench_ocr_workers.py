@@ -0,0 +1,65 @@
+"""
+Benchmark of OCR throughput running inline in the request thread versus in OcrWorkerPool with an increasing number of
+worker processes, with concurrent clients submitting captures.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_ocr_workers --frames 32 --clients 8
+
+Tesseract is used if it is installed, otherwise a CPU bound stand-in of similar cost is timed so the scaling across
+cores can still be measured.
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from app.ocr_worker_pool import OcrWorkerPool, tesseract_ocr
+from benchmarks.fixtures import CODE_SNIPPETS, draw_code_frame
+
+
+def simulated_ocr(image) -> str:
+    """
+    CPU bound stand-in for tesseract used when it is not installed
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    for _ in range(40):
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 2)
+    return str(int(gray.mean()))
+
+
+def time_clients(capture, frames: list, clients: int) -> float:
+    """
+    Run captures of every frame from concurrent client threads
+    :return: Captures per second
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(capture, frames))
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare OCR throughput inline and in the OCR worker pool")
+    parser.add_argument("--frames", type=int, default=32, help="Number of frames to OCR per run")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    args = parser.parse_args()
+    ocr_function = tesseract_ocr if shutil.which("tesseract") else simulated_ocr
+    print(f"OCR function: {ocr_function.__name__}, {os.cpu_count()} cores, {args.clients} clients")
+    frames = [draw_code_frame(CODE_SNIPPETS[index % len(CODE_SNIPPETS)], 1280, 720, index % 2 == 0)
+              for index in range(args.frames)]
+    print(f"    {'inline':<12} {time_clients(ocr_function, frames, args.clients):8.2f} captures/s")
+    worker_counts = sorted({1, 2, os.cpu_count() or 1})
+    for workers in worker_counts:
+        pool = OcrWorkerPool(workers=workers, max_pending=args.clients, timeout=120, ocr_function=ocr_function)
+        pool.run(frames[0])
+        throughput = time_clients(pool.run, frames, args.clients)
+        print(f"    {f'{workers} workers':<12} {throughput:8.2f} captures/s")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
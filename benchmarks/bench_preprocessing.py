@@ -0,0 +1,96 @@
+"""
+Benchmark of the frame preprocessing pipeline, reporting preprocessing time, OCR time, pixels passed to tesseract and
+character accuracy against the known text of a fixture set of synthetic editor frames (dark and light themes).
+
+Every stage is measured on its own and the full pipeline is measured with each stage left out in turn.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_preprocessing --repeats 3
+
+Accuracy and OCR time are only reported if tesseract is installed.
+"""
+import argparse
+import shutil
+import statistics
+import time
+
+import pytesseract
+
+from app.frame_preprocessing import preprocess_frame
+from benchmarks.fixtures import CODE_SNIPPETS, draw_code_frame
+
+STAGES = ["grayscale", "invert_dark_theme", "crop_code_region", "rescale", "adaptive_threshold"]
+
+
+def edit_distance(first: str, second: str) -> int:
+    """
+    Levenshtein distance between two strings
+    """
+    previous = list(range(len(second) + 1))
+    for first_index, first_char in enumerate(first, 1):
+        current = [first_index]
+        for second_index, second_char in enumerate(second, 1):
+            current.append(min(previous[second_index] + 1, current[second_index - 1] + 1,
+                               previous[second_index - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+
+def normalise(text: str) -> str:
+    """
+    Drop blank lines and trailing whitespace so layout differences are not counted as errors
+    """
+    return "\n".join(line.rstrip() for line in text.splitlines() if line.strip())
+
+
+def character_accuracy(text: str, expected: str) -> float:
+    """
+    Fraction of expected characters read correctly, 1 - edit distance / expected length
+    """
+    expected = normalise(expected)
+    return max(1 - edit_distance(normalise(text), expected) / len(expected), 0.0)
+
+
+def variants() -> list:
+    """
+    Preprocessing variants to measure as (name, preprocess_frame keyword arguments or None)
+    """
+    disabled = {stage: False for stage in STAGES}
+    runs = [("no preprocessing", None)]
+    runs += [(f"only {stage}", {**disabled, stage: True}) for stage in STAGES]
+    runs += [(f"all but {stage}", {**{stage_name: True for stage_name in STAGES}, stage: False}) for stage in STAGES]
+    runs.append(("full pipeline", {}))
+    return runs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure OCR time and accuracy for each preprocessing stage")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of times each frame is processed")
+    args = parser.parse_args()
+    use_tesseract = shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+    if not use_tesseract:
+        print("tesseract not found, only preprocessing time and pixel counts are reported")
+    fixtures = [(draw_code_frame(lines, 1280, 720, dark_theme), "\n".join(lines))
+                for lines in CODE_SNIPPETS for dark_theme in (True, False)]
+    print(f"{'variant':<30} {'preprocess':>11} {'ocr':>10} {'pixels':>10} {'accuracy':>9}")
+    for name, options in variants():
+        preprocess_times, ocr_times, pixels, accuracies = [], [], [], []
+        for frame, expected in fixtures:
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                image = preprocess_frame(frame, **options) if options is not None else frame
+                preprocess_times.append(time.perf_counter() - start)
+            pixels.append(image.shape[0] * image.shape[1])
+            if use_tesseract:
+                start = time.perf_counter()
+                text = pytesseract.image_to_string(image, config="--dpi 300")
+                ocr_times.append(time.perf_counter() - start)
+                accuracies.append(character_accuracy(text, expected))
+        ocr_time = f"{statistics.mean(ocr_times) * 1000:7.1f} ms" if ocr_times else "n/a"
+        accuracy = f"{statistics.mean(accuracies) * 100:8.1f}%" if accuracies else "n/a"
+        print(f"{name:<30} {statistics.mean(preprocess_times) * 1000:8.2f} ms {ocr_time:>10} "
+              f"{int(statistics.mean(pixels)):>10} {accuracy:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of text region detection, reporting the pixels passed to OCR per capture and the detection time with and
+without the region cache, for synthetic editor frames with and without a terminal below the code.
+
+Pixels are compared for OCR of the full frame, of the single most text-dense region and of every text region.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_region_detection --repeats 5
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+
+from app.frame_preprocessing import RegionCache, detect_code_region, detect_text_regions, text_strokes
+from benchmarks.fixtures import CODE_SNIPPETS, draw_code_frame
+
+TERMINAL_LINES = ["$ python main.py", "Traceback (most recent call last):", "ValueError: invalid literal"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure pixels OCRed and detection time for text regions")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of times each frame is processed")
+    args = parser.parse_args()
+    print(f"{'fixture':<20} {'full frame':>11} {'code region':>12} {'regions':>9} {'count':>6} "
+          f"{'detect':>10} {'cached':>10}")
+    for terminal_lines in (None, TERMINAL_LINES):
+        fixture = "code + terminal" if terminal_lines else "code"
+        frames = [cv2.cvtColor(draw_code_frame(lines, 1280, 720, dark_theme, terminal_lines), cv2.COLOR_BGR2GRAY)
+                  for lines in CODE_SNIPPETS for dark_theme in (True, False)]
+        full_pixels, code_pixels, region_pixels, region_counts, detect_times, cached_times = [], [], [], [], [], []
+        cache = RegionCache()
+        for index, gray in enumerate(frames):
+            full_pixels.append(gray.size)
+            x, y, width, height = detect_code_region(gray) or (0, 0, gray.shape[1], gray.shape[0])
+            code_pixels.append(width * height)
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                regions = detect_text_regions(gray)
+                detect_times.append(time.perf_counter() - start)
+            region_pixels.append(sum(width * height for _, _, width, height in regions))
+            region_counts.append(len(regions))
+            # Frames of the same layout, as captured later in the same scene, are served from the cache
+            strokes = text_strokes(gray)
+            cache.put(str(index), strokes, regions)
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                cache.get(str(index), text_strokes(gray))
+                cached_times.append(time.perf_counter() - start)
+        print(f"{fixture:<20} {int(statistics.mean(full_pixels)):>11} {int(statistics.mean(code_pixels)):>12} "
+              f"{int(statistics.mean(region_pixels)):>9} {statistics.mean(region_counts):>6.1f} "
+              f"{statistics.mean(detect_times) * 1000:7.2f} ms {statistics.mean(cached_times) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
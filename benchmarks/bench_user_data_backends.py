@@ -0,0 +1,100 @@
+"""
+Benchmark comparing the json and SQLite user data storage engines.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_user_data_backends --videos 10000 --captures 1000000
+
+A synthetic library is written to a temporary directory, migrated into SQLite, and then the same lookups, home page
+library queries and writes are timed against both engines.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.sqlite_user_data_store import SqliteUserDataStore
+from app.user_data_store import UserDataStore
+
+
+def build_library(video_count: int, capture_count: int) -> dict:
+    """
+    Build a synthetic user data library
+    :param video_count: Number of videos to generate
+    :param capture_count: Total number of captures spread across the videos
+    :return: User data dict
+    """
+    all_videos = [{"video_hash": f"{index:032x}", "filename": f"video_{index}.mp4", "alias": f"Video {index}",
+                   "thumbnail": f"{index}.png", "video_length": 600, "progress": 600 if index % 10 else 0,
+                   "captures": []}
+                  for index in range(video_count)]
+    for index in range(capture_count):
+        all_videos[index % video_count]["captures"].append(
+            {"timestamp": index % 600, "capture_content": f"print('capture {index}')\nfor i in range(10):\n    pass"})
+    return {"all_videos": all_videos}
+
+
+def time_operation(name: str, operation, repeat: int) -> None:
+    """
+    Time an operation and print mean latency
+    :param name: Name of operation to print
+    :param operation: Callable receiving the iteration index
+    :param repeat: Number of times to run the operation
+    """
+    start = time.perf_counter()
+    for index in range(repeat):
+        operation(index)
+    elapsed = time.perf_counter() - start
+    print(f"    {name:<28}{elapsed / repeat * 1000:>12.3f} ms/op")
+
+
+def benchmark_store(name: str, create_store, video_count: int, writes: int) -> None:
+    """
+    Run the benchmark operations against a store
+    :param name: Name of the backend to print
+    :param create_store: Callable returning a fresh store
+    :param video_count: Number of videos in the library
+    :param writes: Number of write operations to time
+    """
+    print(f"[*] {name}")
+    start = time.perf_counter()
+    store = create_store()
+    store.is_available()
+    print(f"    {'open/load':<28}{(time.perf_counter() - start) * 1000:>12.3f} ms")
+    filenames = [f"video_{random.randrange(video_count)}.mp4" for _ in range(1000)]
+    time_operation("get_video", lambda index: store.get_video(filenames[index]), 1000)
+    time_operation("filename_exists", lambda index: store.filename_exists(filenames[index]), 1000)
+    time_operation("hash_exists", lambda index: store.hash_exists(f"{index:032x}"), 1000)
+    time_operation("library first page", lambda index: store.list_videos(0, 24), 100)
+    time_operation("library last page", lambda index: store.list_videos(video_count - 24, 24, "oldest"), 100)
+    time_operation("library by alias", lambda index: store.list_videos(0, 24, "alias"), 100)
+    time_operation("continue watching", lambda index: store.list_videos(0, 12, in_progress=True), 100)
+    time_operation("library alias search", lambda index: store.list_videos(0, 24, search=f"{index}9"), 100)
+    time_operation("update progress", lambda index: store.update_video(filenames[index], progress=index), writes)
+    time_operation("append capture", lambda index: store.update_video(
+        filenames[index], capture={"timestamp": index, "capture_content": "x = 1"}), writes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare json and SQLite user data storage engines")
+    parser.add_argument("--videos", type=int, default=10000, help="Number of videos in the library")
+    parser.add_argument("--captures", type=int, default=1000000, help="Total number of captures in the library")
+    parser.add_argument("--writes", type=int, default=20, help="Number of progress/capture writes to time")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        json_path = Path(temp_dir) / "userdata.json"
+        print(f"[*] Building library with {args.videos} videos and {args.captures} captures")
+        with json_path.open("w") as user_data:
+            json.dump(build_library(args.videos, args.captures), user_data)
+        print(f"    userdata.json size: {json_path.stat().st_size / 1024 / 1024:.1f} MB")
+        database_path = Path(temp_dir) / "userdata.db"
+        start = time.perf_counter()
+        SqliteUserDataStore(database_path).migrate_from_json(json_path)
+        print(f"    json -> sqlite migration: {time.perf_counter() - start:.2f} s")
+        benchmark_store("json", lambda: UserDataStore(json_path), args.videos, args.writes)
+        benchmark_store("sqlite", lambda: SqliteUserDataStore(database_path), args.videos, args.writes)
+
+
+if __name__ == "__main__":
+    main()
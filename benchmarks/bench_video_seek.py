@@ -0,0 +1,83 @@
+"""
+Benchmark of capture latency at different positions in a video, comparing the original CAP_PROP_POS_MSEC seek with
+the keyframe-aware seek_frame.
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_video_seek --video path/to/long_tutorial.mp4
+
+If no video is given a synthetic tutorial video is generated in a temporary directory. The keyframe index is built
+with ffprobe, if ffprobe is not installed only the index-less seek path is measured.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+from app.video_seek import build_keyframe_index, seek_frame
+from benchmarks.fixtures import create_sample_video
+
+POSITIONS = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def seek_by_msec(capture: cv2.VideoCapture, timestamp: float, _keyframes) -> None:
+    """
+    Original seek used by extract_frame_at_timestamp
+    """
+    capture.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+    capture.read()
+
+
+def time_seek(video_path: str, seek, timestamps: list, keyframes, repeat: int) -> float:
+    """
+    Time seeks on a fresh decoder and return the median latency in milliseconds
+    """
+    latencies = []
+    for _ in range(repeat):
+        for timestamp in timestamps:
+            capture = cv2.VideoCapture(video_path)
+            capture.read()
+            start = time.perf_counter()
+            seek(capture, timestamp, keyframes)
+            latencies.append(time.perf_counter() - start)
+            capture.release()
+    return statistics.median(latencies) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare seek latency across positions in a video")
+    parser.add_argument("--video", help="Video to seek in, a synthetic video is used if omitted")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times each seek is repeated")
+    parser.add_argument("--ffprobe", default="ffprobe", help="ffprobe executable used to build the keyframe index")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path = args.video or create_sample_video(str(Path(temp_dir) / "sample.mp4"), seconds=300,
+                                                       width=640, height=360)
+        capture = cv2.VideoCapture(video_path)
+        duration = capture.get(cv2.CAP_PROP_FRAME_COUNT) / capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+        start = time.perf_counter()
+        keyframes = build_keyframe_index(video_path, args.ffprobe)
+        if keyframes:
+            print(f"[*] Keyframe index: {len(keyframes)} keyframes built in {time.perf_counter() - start:.2f} s")
+        else:
+            print("[*] ffprobe unavailable, measuring seek_frame without a keyframe index")
+        print(f"    {'position':<10}{'POS_MSEC seek':>16}{'seek_frame':>16}{'same GOP':>16}")
+        for position in POSITIONS:
+            timestamp = duration * position
+            original = time_seek(video_path, seek_by_msec, [timestamp], None, args.repeat)
+            keyframe_seek = time_seek(video_path, seek_frame, [timestamp], keyframes, args.repeat)
+            # Second capture a fraction of a second later on the same (pooled) decoder
+            capture = cv2.VideoCapture(video_path)
+            seek_frame(capture, timestamp, keyframes)
+            start = time.perf_counter()
+            seek_frame(capture, timestamp + 0.5, keyframes)
+            same_gop = (time.perf_counter() - start) * 1000
+            capture.release()
+            print(f"    {position * 100:>6.0f}%   {original:>13.2f} ms{keyframe_seek:>13.2f} ms{same_gop:>13.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of serving a video to concurrent seeking clients, comparing Flask's send_file with send_video. Each client
+repeatedly requests a byte range at a random position, as the browser does when the player seeks, and a revalidation
+of a cached copy. Requests per second, throughput and the median and 99th percentile latency are reported.
+
+The video is served by werkzeug's threaded development server, or by waitress with --server waitress if it is
+installed. Only waitress has a WSGI file wrapper, so only it sends ranges with sendfile().
+
+Usage (from the root of the project directory):
+    $ python -m benchmarks.bench_video_serving --clients 1,8,32 --requests 200 --size 200
+"""
+import argparse
+import http.client
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from flask import Flask, request, send_file
+from werkzeug.serving import make_server
+
+from app.video_streaming import send_video
+
+RANGE_SIZE = 2 * 1024 * 1024
+
+
+def create_app(video_path: str) -> Flask:
+    app = Flask(__name__)
+
+    @app.route("/send_file")
+    def flask_send_file():
+        return send_file(video_path, conditional=True)
+
+    @app.route("/send_video")
+    def flask_send_video():
+        return send_video(request, video_path, etag="video_hash", max_age=3600)
+
+    return app
+
+
+def start_server(app: Flask, server_name: str):
+    """
+    Serve the app on a free local port in a background thread
+    :return: Port and function stopping the server
+    """
+    if server_name == "waitress":
+        from waitress.server import create_server
+        server = create_server(app, host="127.0.0.1", port=0, threads=32)
+        threading.Thread(target=server.run, daemon=True).start()
+        return server.effective_port, server.close
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+
+def get_etag(port: int, path: str) -> str:
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("HEAD", path)
+    etag = connection.getresponse().getheader("ETag")
+    connection.close()
+    return etag
+
+
+def run_client(port: int, path: str, size: int, requests: int, latencies: list, received: list) -> None:
+    etag = get_etag(port, path)
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    for index in range(requests):
+        if index % 10 == 9:
+            headers = {"If-None-Match": etag}
+        else:
+            start = random.randrange(0, size - RANGE_SIZE)
+            headers = {"Range": f"bytes={start}-{start + RANGE_SIZE - 1}"}
+        request_start = time.perf_counter()
+        connection.request("GET", path, headers=headers)
+        body = connection.getresponse().read()
+        latencies.append(time.perf_counter() - request_start)
+        received.append(len(body))
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure video serving throughput for concurrent seeking clients")
+    parser.add_argument("--clients", default="1,8,32", help="Comma separated numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Requests sent by each client")
+    parser.add_argument("--size", type=int, default=200, help="Size of the video in MB")
+    parser.add_argument("--server", choices=("werkzeug", "waitress"), default="werkzeug", help="WSGI server")
+    args = parser.parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, "video.mp4")
+        with open(video_path, "wb") as video_file:
+            for _ in range(args.size):
+                video_file.write(os.urandom(1024 * 1024))
+        size = os.path.getsize(video_path)
+        port, stop_server = start_server(create_app(video_path), args.server)
+        print(f"{'endpoint':<12} {'clients':>8} {'req/s':>9} {'MB/s':>9} {'p50':>10} {'p99':>10}")
+        for path in ("/send_file", "/send_video"):
+            for clients in (int(count) for count in args.clients.split(",")):
+                latencies, received = [], []
+                threads = [threading.Thread(target=run_client,
+                                            args=(port, path, size, args.requests, latencies, received))
+                           for _ in range(clients)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                quantiles = statistics.quantiles(latencies, n=100)
+                print(f"{path:<12} {clients:>8} {len(latencies) / elapsed:>9.1f} "
+                      f"{sum(received) / elapsed / 1024 / 1024:>9.1f} {quantiles[49] * 1000:>7.2f} ms "
+                      f"{quantiles[98] * 1000:>7.2f} ms")
+        stop_server()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Shared fixtures for the benchmark scripts.
+"""
+import cv2
+import numpy as np
+
+# Code snippets drawn onto synthetic frames, a new snippet is shown every scene_length seconds
+CODE_SNIPPETS = [
+    ["def add(a, b):", "    return a + b", "", "print(add(1, 2))"],
+    ["for index in range(10):", "    if index % 2 == 0:", "        print(index)"],
+    ["class Stack:", "    def __init__(self):", "        self.items = []", "", "    def push(self, item):",
+     "        self.items.append(item)"],
+    ["import json", "", "with open('data.json') as file:", "    data = json.load(file)", "print(data['name'])"],
+]
+
+
+def draw_code_frame(lines: list, width: int = 1280, height: int = 720, dark_theme: bool = True,
+                    terminal_lines: list = None) -> np.ndarray:
+    """
+    Draw a synthetic editor frame containing code, a file tree and a face cam placeholder
+    :param lines: Lines of code to draw
+    :param width: Frame width
+    :param height: Frame height
+    :param dark_theme: Draw light text on a dark background
+    :param terminal_lines: [Optional] Lines of output drawn in a terminal pane below the code
+    :return: BGR frame
+    """
+    background, foreground = ((30, 30, 30), (230, 230, 230)) if dark_theme else ((250, 250, 250), (20, 20, 20))
+    frame = np.full((height, width, 3), background, np.uint8)
+    # File tree
+    cv2.rectangle(frame, (0, 0), (width // 6, height), (60, 60, 60), -1)
+    for index, name in enumerate(["main.py", "utils.py", "tests", "README.md"]):
+        cv2.putText(frame, name, (10, 40 + index * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (180, 180, 180), 1)
+    # Face cam
+    cv2.rectangle(frame, (width - width // 5, height - height // 4), (width - 10, height - 10), (90, 120, 160), -1)
+    for index, line in enumerate(lines):
+        cv2.putText(frame, line, (width // 6 + 40, 80 + index * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, foreground, 2)
+    if terminal_lines:
+        # Terminal pane left of the face cam
+        cv2.rectangle(frame, (width // 6, height - height // 4), (width - width // 5 - 20, height), (10, 10, 10), -1)
+        for index, line in enumerate(terminal_lines):
+            cv2.putText(frame, line, (width // 6 + 20, height - height // 4 + 35 + index * 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 1)
+    return frame
+
+
+def create_sample_video(video_path: str, seconds: int = 60, fps: int = 25, scene_length: int = 10,
+                        width: int = 1280, height: int = 720) -> str:
+    """
+    Write a synthetic tutorial video that cycles through CODE_SNIPPETS
+    :param video_path: Path to write the video to
+    :param seconds: Length of the video in seconds
+    :param fps: Frames per second
+    :param scene_length: Seconds each code snippet is shown for
+    :param width: Frame width
+    :param height: Frame height
+    :return: Path of the written video
+    """
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for second in range(seconds):
+        frame = draw_code_frame(CODE_SNIPPETS[(second // scene_length) % len(CODE_SNIPPETS)], width, height)
+        # Cursor blink so consecutive frames are not byte identical
+        for frame_index in range(fps):
+            blinking_frame = frame.copy()
+            if frame_index < fps // 2:
+                cv2.rectangle(blinking_frame, (width // 2, 60), (width // 2 + 10, 90), (200, 200, 200), -1)
+            writer.write(blinking_frame)
+    writer.release()
+    return video_path
@@ -0,0 +1,157 @@
+"""
+Load test of a running OcrRoo server with concurrent users watching different videos. Each user opens the home page
+and the player for their own video, then repeatedly seeks in it (a byte range of /videos/<filename>) and saves their
+progress, as the player does while a video plays. Every --capture-every iterations the user also captures code at
+their position and every --home-every iterations goes back to the home page and the player. Afterwards the stored
+progress of every video is checked against the last progress its user saved and every byte range against the same
+range of the user's own video, so requests of users on other videos interfering with each other are reported as
+errors. The progress of each video is restored at the end.
+
+Requests per second and the median and 99th percentile latency of each kind of request are reported. Captures are
+answered with a job id once they are queued, the OCR itself runs in the background. Captures refused because the
+capture queue is full are counted as busy.
+
+Usage (start the server first, e.g. with python serve.py, the library must contain at least one video):
+    $ python -m benchmarks.load_test --url http://localhost:5000 --users 16 --iterations 50
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+RANGE_SIZE = 64 * 1024
+REQUEST_KINDS = ("home", "play", "seek", "progress", "capture")
+
+
+class LoadTestClient:
+    """
+    Sends requests to the server, recording the latency of each kind of request
+    """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.latencies = defaultdict(list)
+        self.busy = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def request(self, kind: str, path: str, data: dict = None, headers: dict = None) -> bytes:
+        body = json.dumps(data).encode() if data is not None else None
+        http_request = urllib.request.Request(f"{self.url}{path}", data=body, headers=headers or {})
+        if body is not None:
+            http_request.add_header("Content-Type", "application/json")
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(http_request) as response:
+                content = response.read()
+        except urllib.error.HTTPError as error:
+            if error.code != 503:
+                raise
+            content = error.read()
+            with self._lock:
+                self.busy += 1
+        with self._lock:
+            self.latencies[kind].append(time.perf_counter() - start)
+        return content
+
+    def error(self, message: str) -> None:
+        with self._lock:
+            self.errors.append(message)
+
+    def video_path(self, video_filename: str) -> str:
+        return f"/videos/{urllib.parse.quote(video_filename)}"
+
+    def stored_progress(self, video_filename: str) -> int:
+        page = self.request("play", f"/play_video/{urllib.parse.quote(video_filename)}").decode()
+        return int(re.search(r"let progress = '([^']*)'", page).group(1) or 0)
+
+    def video_range(self, video_filename: str, start: int) -> bytes:
+        return self.request("seek", self.video_path(video_filename),
+                            headers={"Range": f"bytes={start}-{start + RANGE_SIZE - 1}"})
+
+
+def run_user(client: LoadTestClient, user: int, video_filename: str, video_head: bytes, iterations: int,
+             capture_every: int, home_every: int) -> None:
+    """
+    Watch a video, checking every byte range received is from the user's own video
+    """
+    for iteration in range(iterations):
+        if iteration % home_every == 0:
+            client.request("home", "/")
+            client.stored_progress(video_filename)
+        if capture_every and iteration % capture_every == capture_every - 1:
+            client.request("capture", "/capture_at_timestamp", {"filename": video_filename, "timestamp": iteration})
+        start = random.randrange(0, max(len(video_head) - RANGE_SIZE, 1))
+        if client.video_range(video_filename, start) != video_head[start:start + RANGE_SIZE]:
+            client.error(f"User {user} received part of another video when seeking in {video_filename}")
+        # Progress (stored in whole seconds) unique to the user and iteration, so progress saved for another user's
+        # video is detected
+        progress = user * iterations + iteration
+        client.request("progress", "/update_video_data", {"filename": video_filename, "progress": progress})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test concurrent users watching different videos")
+    parser.add_argument("--url", default="http://localhost:5000", help="Url of the running server")
+    parser.add_argument("--users", type=int, default=16, help="Number of concurrent users")
+    parser.add_argument("--iterations", type=int, default=50, help="Seeks and progress updates per user")
+    parser.add_argument("--capture-every", type=int, default=10, help="Iterations between captures, 0 for none")
+    parser.add_argument("--home-every", type=int, default=25, help="Iterations between visits to the home page")
+    args = parser.parse_args()
+    client = LoadTestClient(args.url)
+    video_filenames = list(json.loads(client.request("list", "/web_cli", {"command": "available-videos"})).values())
+    if not video_filenames:
+        raise SystemExit("The library has no videos, upload at least one video first")
+    # One video per user while there are enough, so users on different videos run concurrently
+    user_videos = [video_filenames[user % len(video_filenames)] for user in range(args.users)]
+    videos_watched = sorted(set(user_videos))
+    original_progress = {video_filename: client.stored_progress(video_filename) for video_filename in videos_watched}
+    video_heads = {video_filename: client.request("head", client.video_path(video_filename),
+                                                  headers={"Range": f"bytes=0-{RANGE_SIZE * 16 - 1}"})
+                   for video_filename in videos_watched}
+    client.latencies.clear()
+
+    threads = [threading.Thread(target=run_user, args=(client, user, user_videos[user],
+                                                       video_heads[user_videos[user]], args.iterations,
+                                                       args.capture_every, args.home_every))
+               for user in range(args.users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total_requests = sum(len(latencies) for latencies in client.latencies.values())
+
+    for video_filename in videos_watched:
+        stored_progress = client.stored_progress(video_filename)
+        # Users sharing a video finish in any order, so the stored progress must be one of their last updates
+        user_progress = [user * args.iterations + args.iterations - 1
+                         for user in range(args.users) if user_videos[user] == video_filename]
+        if stored_progress not in user_progress:
+            client.error(f"{video_filename} has progress {stored_progress}, expected one of {user_progress}")
+        client.request("progress", "/update_video_data",
+                       {"filename": video_filename, "progress": original_progress[video_filename]})
+
+    print(f"{args.users} users on {len(videos_watched)} videos, {total_requests / elapsed:.1f} requests/s")
+    print(f"{'request':<10} {'count':>7} {'p50':>10} {'p99':>10}")
+    for kind in (kind for kind in REQUEST_KINDS if len(client.latencies[kind]) > 1):
+        quantiles = statistics.quantiles(client.latencies[kind], n=100)
+        print(f"{kind:<10} {len(client.latencies[kind]):>7} {quantiles[49] * 1000:>7.2f} ms "
+              f"{quantiles[98] * 1000:>7.2f} ms")
+    if client.busy:
+        print(f"{client.busy} requests refused while the capture queue was full")
+    for error in client.errors:
+        print(f"ERROR: {error}")
+    print(f"{len(client.errors)} interference errors")
+
+
+if __name__ == "__main__":
+    main()
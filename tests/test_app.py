@@ -0,0 +1,81 @@
+"""
+This module contains the unit tests for the ajax endpoints of the player defined in app/app.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+from tests.test_utils import load_dummy_user_data_store
+
+APP_DIRECTORY = Path(__file__).resolve().parent.parent / "app"
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """
+    Load app/app.py the way it is run, from the app directory with its modules imported by their plain names
+    """
+    monkeypatch.setattr(sys, "path", sys.path + [str(APP_DIRECTORY)])
+    spec = importlib.util.spec_from_file_location("ocrroo_app", APP_DIRECTORY / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module.utils, "get_user_data_store", load_dummy_user_data_store)
+    return module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize("data", [{"progress": 5}, {"filename": "missing.mp4", "progress": 5},
+                                  {"filename": ["loops.mp4"], "progress": 5}])
+def test_update_video_data_unknown_video(client, app_module, mocker, data):
+    update_user_video_data = mocker.patch.object(app_module.utils, "update_user_video_data")
+    response = client.post("/update_video_data", json=data)
+    assert response.status_code == 400
+    assert response.get_json() == {"status": "invalid", "error": "The request must name a video in the library"}
+    update_user_video_data.assert_not_called()
+
+
+def test_update_video_data_uses_requested_video(client, app_module, mocker):
+    update_user_video_data = mocker.patch.object(app_module.utils, "update_user_video_data")
+    assert client.post("/update_video_data", json={"filename": "loops.mp4", "progress": 5}).data == b"success"
+    assert client.post("/update_video_data", json={"filename": "oop.mp4", "progress": 9}).data == b"success"
+    assert update_user_video_data.call_args_list == [mocker.call("loops.mp4", progress=5),
+                                                     mocker.call("oop.mp4", progress=9)]
+
+
+def test_capture_at_timestamp_uses_requested_video(client, app_module, mocker):
+    submit_capture = mocker.patch.object(app_module.ExtractText, "submit_capture")
+    submit_capture.return_value.to_dict.return_value = {"job_id": "job", "status": "queued"}
+    response = client.post("/capture_at_timestamp", json={"filename": "oop.mp4", "timestamp": 12})
+    assert response.get_json() == {"job_id": "job", "status": "queued"}
+    submit_capture.assert_called_once_with("oop.mp4", 12)
+    assert client.post("/capture_at_timestamp", json={"filename": "missing.mp4", "timestamp": 12}).status_code == 400
+    submit_capture.assert_called_once()
+
+
+def test_send_to_ide_unknown_video(client, app_module, mocker):
+    send_code_snippet_to_ide = mocker.patch.object(app_module.utils, "send_code_snippet_to_ide")
+    assert client.post("/send_to_ide", json={"filename": "missing.mp4", "code_snippet": "x"}).data == b"fail"
+    send_code_snippet_to_ide.assert_not_called()
+
+
+def test_finish_upload_failure_returns_error(app_module, mocker, tmp_path):
+    mocker.patch.object(app_module.utils, "get_vid_save_path", return_value=f"{tmp_path}/")
+    mocker.patch.object(app_module, "get_capture_pool")
+    mocker.patch.object(app_module.utils.upload_manager, "finish", side_effect=OSError(28, "No space left on device"))
+    add_local_video = mocker.patch.object(app_module.utils, "add_local_video")
+    session = mocker.Mock(filename="new.mp4", title="New", upload_id="upload")
+    session.digest.return_value = "new_hash"
+    with app_module.app.app_context():
+        assert app_module.finish_upload(session) == \
+               ({"status": "failed", "error": "The video could not be saved to the video directory"}, 500)
+    add_local_video.assert_not_called()
@@ -0,0 +1,94 @@
+"""
+This module contains the unit tests for the background capture jobs defined in app/capture_jobs.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import threading
+
+import pytest
+
+from app.capture_jobs import CaptureJobManager, CaptureQueueFullError, format_server_sent_event
+
+
+def blocking_stages(release: threading.Event):
+    """
+    Capture stages that wait for release before OCR completes
+    """
+    def stages():
+        yield "frame", {"frame_index": 10}
+        assert release.wait(5)
+        yield "raw_ocr", "prnt(1)"
+        yield "formatted", "print(1)"
+    return stages
+
+
+def failing_stages():
+    yield "frame", {"frame_index": 10}
+    raise RuntimeError("OCR failed")
+
+
+def test_job_runs_every_stage():
+    manager = CaptureJobManager(workers=1)
+    release = threading.Event()
+    release.set()
+    job = manager.submit(("video.mp4", 1.0), blocking_stages(release))
+    assert job.wait(5)
+    assert job.to_dict() == {"job_id": job.job_id, "status": "complete", "result": "print(1)",
+                             "stages": {"frame": {"frame_index": 10}, "raw_ocr": "prnt(1)", "formatted": "print(1)"}}
+    assert manager.get_job(job.job_id) is job
+    assert manager.get_job("unknown") is None
+    manager.shutdown()
+
+
+def test_job_failure():
+    manager = CaptureJobManager(workers=1)
+    job = manager.submit(("video.mp4", 1.0), failing_stages)
+    assert job.wait(5)
+    assert job.status == "failed"
+    assert job.to_dict()["error"] == "OCR failed"
+    assert list(job.stream()) == [("frame", {"frame_index": 10}), ("done", {"status": "failed", "error": "OCR failed"})]
+    manager.shutdown()
+
+
+def test_identical_jobs_are_deduplicated():
+    manager = CaptureJobManager(workers=2)
+    release = threading.Event()
+    job = manager.submit(("video.mp4", 1.0), blocking_stages(release))
+    assert manager.submit(("video.mp4", 1.0), blocking_stages(release)) is job
+    other_job = manager.submit(("video.mp4", 2.0), blocking_stages(release))
+    assert other_job is not job
+    release.set()
+    assert job.wait(5) and other_job.wait(5)
+    assert manager.submit(("video.mp4", 1.0), blocking_stages(release)) is not job
+    manager.shutdown()
+
+
+def test_submit_rejects_when_queue_full():
+    manager = CaptureJobManager(workers=1, max_pending=1)
+    release = threading.Event()
+    manager.submit(("video.mp4", 1.0), blocking_stages(release))
+    with pytest.raises(CaptureQueueFullError):
+        manager.submit(("video.mp4", 2.0), blocking_stages(release))
+    release.set()
+    manager.shutdown()
+
+
+def test_stream_sends_stages_as_they_complete():
+    manager = CaptureJobManager(workers=1)
+    release = threading.Event()
+    job = manager.submit(("video.mp4", 1.0), blocking_stages(release))
+    stream = job.stream(heartbeat=0.05)
+    assert next(stream) == ("frame", {"frame_index": 10})
+    assert next(stream) is None
+    release.set()
+    events = [event for event in stream if event is not None]
+    assert events == [("raw_ocr", "prnt(1)"), ("formatted", "print(1)"),
+                      ("done", {"status": "complete", "error": None})]
+    manager.shutdown()
+
+
+def test_format_server_sent_event():
+    assert format_server_sent_event(("raw_ocr", "a\nb")) == 'event: raw_ocr\ndata: "a\\nb"\n\n'
+    assert format_server_sent_event(None) == ": heartbeat\n\n"
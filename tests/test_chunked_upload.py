@@ -0,0 +1,95 @@
+"""
+This module contains the unit tests for the chunked uploads defined in app/chunked_upload.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import hashlib
+import io
+import os
+
+import pytest
+
+from app.chunked_upload import UploadManager, UploadOffsetError, hash_file, new_hasher
+
+VIDEO_BYTES = os.urandom(300_000)
+
+
+def test_hash_file(tmp_path):
+    video_path = tmp_path / "video.mp4"
+    video_path.write_bytes(VIDEO_BYTES)
+    assert hash_file(video_path) == hashlib.md5(VIDEO_BYTES).hexdigest()
+    assert hash_file(video_path, "sha1", buffer_size=4096) == hashlib.sha1(VIDEO_BYTES).hexdigest()
+    with pytest.raises(ValueError):
+        new_hasher("crc32")
+
+
+def test_upload_in_chunks(tmp_path):
+    manager = UploadManager(tmp_path / "uploads", buffer_size=4096)
+    session = manager.create("video.mp4", len(VIDEO_BYTES), "Video")
+    for offset in range(0, len(VIDEO_BYTES), 100_000):
+        chunk = VIDEO_BYTES[offset:offset + 100_000]
+        session = manager.write_chunk(session.upload_id, offset, io.BytesIO(chunk), len(chunk))
+    assert session.complete
+    assert session.digest() == hashlib.md5(VIDEO_BYTES).hexdigest()
+    manager.finish(session.upload_id, tmp_path / "video.mp4")
+    assert (tmp_path / "video.mp4").read_bytes() == VIDEO_BYTES
+    assert manager.get(session.upload_id) is None
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+
+def test_finish_across_filesystems(tmp_path, mocker):
+    manager = UploadManager(tmp_path / "uploads")
+    session = manager.create("video.mp4", len(VIDEO_BYTES))
+    manager.write_chunk(session.upload_id, 0, io.BytesIO(VIDEO_BYTES), len(VIDEO_BYTES))
+    # os.rename fails across filesystems, the part file is then copied
+    mocker.patch("shutil.os.rename", side_effect=OSError(18, "Invalid cross-device link"))
+    manager.finish(session.upload_id, tmp_path / "video.mp4")
+    assert (tmp_path / "video.mp4").read_bytes() == VIDEO_BYTES
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+
+def test_failed_finish_keeps_upload(tmp_path, mocker):
+    manager = UploadManager(tmp_path / "uploads")
+    session = manager.create("video.mp4", len(VIDEO_BYTES))
+    manager.write_chunk(session.upload_id, 0, io.BytesIO(VIDEO_BYTES), len(VIDEO_BYTES))
+    with pytest.raises(OSError):
+        manager.finish(session.upload_id, tmp_path / "missing" / "video.mp4")
+    assert manager.get(session.upload_id).complete
+    manager.finish(session.upload_id, tmp_path / "video.mp4")
+    assert (tmp_path / "video.mp4").read_bytes() == VIDEO_BYTES
+
+
+def test_chunk_at_wrong_offset(tmp_path):
+    manager = UploadManager(tmp_path)
+    session = manager.create("video.mp4", len(VIDEO_BYTES))
+    manager.write_chunk(session.upload_id, 0, io.BytesIO(VIDEO_BYTES[:1000]), 1000)
+    with pytest.raises(UploadOffsetError) as error:
+        manager.write_chunk(session.upload_id, 0, io.BytesIO(VIDEO_BYTES[:1000]), 1000)
+    assert error.value.offset == 1000
+    with pytest.raises(ValueError):
+        manager.write_chunk(session.upload_id, 1000, io.BytesIO(VIDEO_BYTES), len(VIDEO_BYTES))
+    with pytest.raises(KeyError):
+        manager.write_chunk("unknown", 0, io.BytesIO(b""), 0)
+
+
+def test_dropped_connection_resumes_after_restart(tmp_path):
+    manager = UploadManager(tmp_path, buffer_size=4096)
+    session = manager.create("video.mp4", len(VIDEO_BYTES), hash_algorithm="sha256")
+    # The connection drops 50000 bytes into a 200000 byte chunk
+    session = manager.write_chunk(session.upload_id, 0, io.BytesIO(VIDEO_BYTES[:50_000]), 200_000)
+    assert session.received == 50_000
+    restarted_manager = UploadManager(tmp_path, buffer_size=4096)
+    resumed = restarted_manager.get(session.upload_id)
+    assert resumed.received == 50_000
+    resumed = restarted_manager.write_chunk(resumed.upload_id, 50_000, io.BytesIO(VIDEO_BYTES[50_000:]))
+    assert resumed.digest() == hashlib.sha256(VIDEO_BYTES).hexdigest()
+
+
+def test_idle_uploads_are_pruned(tmp_path):
+    manager = UploadManager(tmp_path, session_ttl=0)
+    session = manager.create("video.mp4", len(VIDEO_BYTES))
+    manager.prune()
+    assert manager.get(session.upload_id) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,130 @@
+"""
+This module contains the unit tests for the full-text search of captured code defined in app/code_search.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import threading
+
+import pytest
+
+from app.code_search import CodeSearchIndex, build_match_query, highlight_snippet, tokenize
+
+LIBRARY = [
+    {"filename": "loops.mp4", "captures": [
+        {"timestamp": 12, "capture_content": "for i in range(10):\n    print(i)"},
+        {"timestamp": 14, "capture_content": "for i in range(10):\n    print(i)"},
+        {"timestamp": 40, "capture_content": "while total < 10:\n    total += 1"},
+    ]},
+    {"filename": "oop.mp4", "captures": [
+        {"timestamp": 95.5, "capture_content": "class Dog:\n    def bark(self):\n        print('woof')"},
+    ]},
+]
+
+
+@pytest.fixture
+def search_index(tmp_path):
+    index = CodeSearchIndex(tmp_path / "code_search.db")
+    index.build(LIBRARY)
+    yield index
+    index.close()
+
+
+def test_tokenize_splits_like_unicode61():
+    assert tokenize("self.in_range(Total_2)") == ["self", "in", "range", "total", "2"]
+
+
+def test_build_match_query_quotes_terms():
+    assert build_match_query(["print", "or"]) == '"print" AND "or"'
+
+
+def test_highlight_snippet_escapes_and_marks_terms():
+    content = "x = 1\ny = 2\nif x < y:\n    print('<less>')\nz = 3"
+    assert highlight_snippet(content, ["print"]) == \
+           "if x &lt; y:\n    <mark>print</mark>(&#x27;&lt;less&gt;&#x27;)\nz = 3"
+
+
+def test_build_indexes_every_capture(search_index):
+    assert search_index.is_built()
+    assert search_index.count() == 3
+
+
+def test_search_ranks_captures(search_index):
+    hits = search_index.search("print")
+    assert [(hit["filename"], hit["timestamp"]) for hit in hits] == [("loops.mp4", 12), ("oop.mp4", 95.5)]
+    assert hits[0]["score"] >= hits[1]["score"] > 0
+    assert "<mark>print</mark>(i)" in hits[0]["snippet"]
+
+
+def test_search_requires_every_term(search_index):
+    assert [hit["filename"] for hit in search_index.search("def bark(self)")] == ["oop.mp4"]
+    assert search_index.search("range woof") == []
+    assert search_index.search("  ()  ") == []
+
+
+def test_search_ranks_by_term_frequency(search_index):
+    search_index.add_capture("oop.mp4", {"timestamp": 120, "capture_content": "print(total)\nreturn len(self.dogs)"})
+    assert [hit["timestamp"] for hit in search_index.search("print total")] == [120]
+    assert [hit["timestamp"] for hit in search_index.search("total")] == [40, 120]
+
+
+def test_add_capture_and_delete_video(search_index):
+    search_index.add_capture("oop.mp4", {"timestamp": 130, "capture_content": "dog = Dog()\ndog.bark()"})
+    assert search_index.count() == 4
+    assert [hit["timestamp"] for hit in search_index.search("dog bark")] == [130, 95.5]
+    search_index.delete_video("oop.mp4")
+    assert search_index.count() == 2
+    assert search_index.search("bark") == []
+    assert search_index.search("print")[0]["filename"] == "loops.mp4"
+    terms = search_index._connection().execute("SELECT term FROM terms WHERE term = 'dog'").fetchall()
+    assert terms == []
+
+
+def test_duplicate_captures_keep_earliest_timestamp(search_index):
+    search_index.add_capture("loops.mp4", {"timestamp": 3, "capture_content": "for i in range(10):\n    print(i)"})
+    search_index.add_capture("loops.mp4", {"timestamp": 20, "capture_content": "for i in range(10):\n    print(i)"})
+    search_index.add_capture("oop.mp4", {"timestamp": 7, "capture_content": "for i in range(10):\n    print(i)"})
+    assert search_index.count() == 4
+    assert [(hit["filename"], hit["timestamp"]) for hit in search_index.search("range")] == \
+           [("loops.mp4", 3), ("oop.mp4", 7)]
+
+
+def test_search_ranks_newest_candidates(tmp_path):
+    index = CodeSearchIndex(tmp_path / "code_search.db", max_candidates=2)
+    index.build([{"filename": "loops.mp4", "captures": [
+        {"timestamp": timestamp, "capture_content": f"print({timestamp})"} for timestamp in range(5)]}])
+    assert sorted(hit["timestamp"] for hit in index.search("print")) == [3, 4]
+    index.close()
+
+
+def test_build_in_background_applies_changes_made_meanwhile(tmp_path):
+    index = CodeSearchIndex(tmp_path / "code_search.db")
+    loading, loaded = threading.Event(), threading.Event()
+
+    def load_videos():
+        loading.set()
+        loaded.wait(5)
+        return LIBRARY
+
+    thread = index.build_in_background(load_videos)
+    assert loading.wait(5)
+    assert index.build_in_background(load_videos) is None
+    assert index.is_building()
+    index.add_capture("oop.mp4", {"timestamp": 130, "capture_content": "dog = Dog()\ndog.bark()"})
+    index.add_capture("oop.mp4", {"timestamp": 95.5, "capture_content": LIBRARY[1]["captures"][0]["capture_content"]})
+    index.delete_video("loops.mp4")
+    loaded.set()
+    thread.join(5)
+    assert not index.is_building()
+    assert index.is_built()
+    assert index.count() == 2
+    assert [hit["timestamp"] for hit in index.search("bark")] == [130, 95.5]
+    assert index.search("range") == []
+    index.close()
+
+
+def test_build_replaces_index(search_index):
+    search_index.build([LIBRARY[1]])
+    assert search_index.count() == 1
+    assert search_index.search("range") == []
@@ -0,0 +1,109 @@
+"""
+This module contains the unit tests for the frame preprocessing functions defined in app/frame_preprocessing.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import cv2
+import numpy as np
+import pytest
+
+from app.frame_preprocessing import RegionCache, detect_code_region, detect_text_regions, estimate_text_height, \
+    is_dark_theme, preprocess_frame, text_strokes
+
+CODE_LINES = ["class Stack:", "    def __init__(self):", "        self.items = []", "",
+              "    def push(self, item):", "        self.items.append(item)"]
+
+
+def draw_editor_frame(dark_theme: bool, code_lines: list = CODE_LINES, terminal: bool = False) -> np.ndarray:
+    """
+    Draw an editor frame with a file tree on the left, code in the middle, a face cam in the bottom right and
+    optionally a terminal in the bottom left
+    """
+    background, foreground = ((30, 30, 30), (230, 230, 230)) if dark_theme else ((250, 250, 250), (20, 20, 20))
+    frame = np.full((720, 1280, 3), background, np.uint8)
+    cv2.rectangle(frame, (0, 0), (213, 720), (60, 60, 60), -1)
+    for index, name in enumerate(["main.py", "utils.py", "tests"]):
+        cv2.putText(frame, name, (10, 40 + index * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (180, 180, 180), 1)
+    cv2.rectangle(frame, (1024, 540), (1270, 710), (90, 120, 160), -1)
+    for index, line in enumerate(code_lines):
+        cv2.putText(frame, line, (253, 80 + index * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, foreground, 2)
+    if terminal:
+        cv2.rectangle(frame, (213, 540), (1000, 720), (10, 10, 10), -1)
+        for index, line in enumerate(["$ python stack.py", "['a', 'b']", "Process finished with exit code 0"]):
+            cv2.putText(frame, line, (233, 580 + index * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (200, 200, 200), 2)
+    return frame
+
+
+def gray_frame(*args, **kwargs) -> np.ndarray:
+    return cv2.cvtColor(draw_editor_frame(*args, **kwargs), cv2.COLOR_BGR2GRAY)
+
+
+@pytest.mark.parametrize("dark_theme", [True, False])
+def test_detect_code_region(dark_theme):
+    x, y, width, height = detect_code_region(cv2.cvtColor(draw_editor_frame(dark_theme), cv2.COLOR_BGR2GRAY))
+    # Contains every line of code
+    assert x <= 253 and y <= 60 and x + width >= 700 and y + height >= 280
+    # Excludes the file tree text and the face cam
+    assert x > 150 and x + width < 1024 and y + height < 540
+
+
+def test_detect_code_region_blank_frame():
+    assert detect_code_region(np.zeros((720, 1280), np.uint8)) is None
+
+
+def test_is_dark_theme():
+    assert is_dark_theme(cv2.cvtColor(draw_editor_frame(True), cv2.COLOR_BGR2GRAY))
+    assert not is_dark_theme(cv2.cvtColor(draw_editor_frame(False), cv2.COLOR_BGR2GRAY))
+
+
+def test_estimate_text_height():
+    gray = cv2.cvtColor(draw_editor_frame(False), cv2.COLOR_BGR2GRAY)[50:300, 243:720]
+    assert 10 <= estimate_text_height(gray) <= 25
+    assert estimate_text_height(np.full((100, 100), 255, np.uint8)) is None
+
+
+@pytest.mark.parametrize("dark_theme", [True, False])
+def test_preprocess_frame(dark_theme):
+    processed = preprocess_frame(draw_editor_frame(dark_theme))
+    assert processed.ndim == 2
+    assert set(np.unique(processed)) <= {0, 255}
+    # Dark text on a light background
+    assert np.median(processed) == 255
+    # Cropped to the code but scaled up so characters are around 32 pixels high
+    assert processed.shape[0] < 720 and 30 <= estimate_text_height(processed) <= 40
+
+
+def test_preprocess_frame_stages_disabled():
+    frame = draw_editor_frame(True)
+    processed = preprocess_frame(frame, grayscale=False, invert_dark_theme=False, crop_code_region=False,
+                                 rescale=False, adaptive_threshold=False)
+    assert np.array_equal(processed, frame)
+
+
+def test_detect_text_regions():
+    regions = detect_text_regions(gray_frame(True, terminal=True))
+    assert len(regions) == 2
+    (code_x, code_y, code_width, code_height), (terminal_x, terminal_y, _, _) = regions
+    # Reading order, code then terminal, file tree and face cam skipped
+    assert code_x > 150 and code_y < 100 and code_y + code_height < 540
+    assert terminal_y >= 530 and terminal_x > 150
+    assert detect_text_regions(np.zeros((720, 1280), np.uint8)) == []
+
+
+def test_region_cache_reuses_regions_in_same_layout():
+    cache = RegionCache()
+    gray = gray_frame(True)
+    strokes = text_strokes(gray)
+    assert cache.get("video", strokes) is None
+    regions = detect_text_regions(gray, strokes=strokes)
+    cache.put("video", strokes, regions)
+    # Fewer lines of code still fit the cached regions
+    assert cache.get("video", text_strokes(gray_frame(True, CODE_LINES[:3]))) == regions
+    # A terminal opening puts text outside the cached regions
+    assert cache.get("video", text_strokes(gray_frame(True, terminal=True))) is None
+    # Longer lines run past the cached regions
+    assert cache.get("video", text_strokes(gray_frame(True, [line + " # comment" for line in CODE_LINES]))) is None
+    assert cache.get("other video", strokes) is None
+    assert cache.stats() == {"hits": 1, "misses": 4}
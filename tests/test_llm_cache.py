@@ -0,0 +1,44 @@
+"""
+This module contains the unit tests for the LLM formatting cache defined in app/llm_cache.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+from app.llm_cache import LlmCache, normalize_ocr_text
+
+
+def test_normalize_ocr_text():
+    assert normalize_ocr_text("def  foo():\n    return 1\n") == normalize_ocr_text("def foo():\n  return l")
+    assert normalize_ocr_text("print(‘O’)") == normalize_ocr_text("print('0')")
+    assert normalize_ocr_text("x = 1") != normalize_ocr_text("x = 2")
+
+
+def test_near_identical_text_hits(tmp_path):
+    cache = LlmCache(tmp_path)
+    cache.put(LlmCache.make_key("for i in range(10):\n    print(i)", "Python", "gpt-3.5-turbo"), "formatted")
+    assert cache.get(LlmCache.make_key("for i in range(1O):\n  print(i) ", "Python", "gpt-3.5-turbo")) == "formatted"
+    assert cache.get(LlmCache.make_key("for i in range(10):\n    print(i)", "Java", "gpt-3.5-turbo")) is None
+    assert cache.get(LlmCache.make_key("for i in range(10):\n    print(i)", "Python", "gpt-4")) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_persist_and_expire(tmp_path, mocker):
+    key = LlmCache.make_key("x = 1", "Python", "gpt-3.5-turbo")
+    LlmCache(tmp_path, ttl=60).put(key, "x = 1")
+    reloaded_cache = LlmCache(tmp_path, ttl=60)
+    assert reloaded_cache.get(key) == "x = 1"
+    mocker.patch("app.llm_cache.time.time", return_value=reloaded_cache._memory[key][0] + 61)
+    assert reloaded_cache.get(key) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disk_tier_evicts_oldest(tmp_path):
+    cache = LlmCache(tmp_path, memory_entries=1, disk_size_limit=200)
+    keys = [LlmCache.make_key(f"x = {index}", "Python", "gpt-3.5-turbo") for index in range(5)]
+    for key in keys:
+        cache.put(key, "y" * 50)
+    assert cache.stats()["disk_bytes"] <= 200
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) == "y" * 50
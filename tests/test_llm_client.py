@@ -0,0 +1,108 @@
+"""
+This module contains the unit tests for the OpenAI formatting client defined in app/llm_client.py, run against a
+local stub of the chat completions API.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.llm_client import LlmClient, parse_batch_reply
+
+
+class StubOpenAi(BaseHTTPRequestHandler):
+    """
+    Stub chat completions endpoint. Single snippets are answered with the snippet in upper case and batches with a
+    JSON array of the snippets in upper case. The first failures requests are answered with a 503 and every request
+    waits delay seconds.
+    """
+    requests = []
+    failures = 0
+    delay = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][1]["content"]
+        StubOpenAi.requests.append(prompt)
+        time.sleep(StubOpenAi.delay)
+        if StubOpenAi.failures > 0:
+            StubOpenAi.failures -= 1
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        if "snippets" in prompt:
+            content = json.dumps([text.upper() for text in json.loads(prompt[prompt.index("["):])])
+        else:
+            content = prompt[prompt.index("'") + 1:-1].upper()
+        reply = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubOpenAi.requests, StubOpenAi.failures, StubOpenAi.delay = [], 0, 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_format_code(stub_url):
+    client = LlmClient("key", base_url=stub_url, batch_window=0)
+    assert client.format_code("print(x)", "Python") == "PRINT(X)"
+    assert client.requests_sent == 1
+    client.close()
+
+
+def test_concurrent_snippets_are_batched(stub_url):
+    client = LlmClient("key", base_url=stub_url, batch_window=0.2)
+    results = {}
+    threads = [threading.Thread(target=lambda text=text: results.update({text: client.format_code(text, "Python")}))
+               for text in ("a = 1", "b = 2", "c = 3")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {"a = 1": "A = 1", "b = 2": "B = 2", "c = 3": "C = 3"}
+    assert len(StubOpenAi.requests) == 1
+    client.close()
+
+
+def test_retries_with_backoff(stub_url):
+    StubOpenAi.failures = 2
+    client = LlmClient("key", base_url=stub_url, backoff=0.01, batch_window=0)
+    assert client.format_code("x", "Python") == "X"
+    assert client.requests_sent == 3
+    StubOpenAi.failures = 5
+    assert client.format_code("y", "Python") is None
+    client.close()
+
+
+def test_gives_up_after_deadline(stub_url):
+    StubOpenAi.delay = 1
+    client = LlmClient("key", base_url=stub_url, deadline=0.2, batch_window=0)
+    start = time.monotonic()
+    assert client.format_code("x", "Python") is None
+    assert time.monotonic() - start < 0.9
+    client.close()
+
+
+def test_parse_batch_reply():
+    assert parse_batch_reply('["a", "b"]', 2) == ["a", "b"]
+    assert parse_batch_reply('```json\n["a", "b"]\n```', 2) == ["a", "b"]
+    assert parse_batch_reply('["a"]', 2) is None
+    assert parse_batch_reply("a\nb", 2) is None
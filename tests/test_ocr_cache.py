@@ -0,0 +1,73 @@
+"""
+This module contains the unit tests for the capture result cache defined in app/ocr_cache.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import cv2
+import numpy as np
+
+from app.ocr_cache import OcrCache, hamming_distance, perceptual_hash
+
+SETTINGS = {"language": "Python", "formatting": {"openai_analysis": "False"}}
+
+
+def draw_frame(text: str, noise: bool = False) -> np.ndarray:
+    """
+    Draw a frame containing text, optionally with compression noise
+    """
+    frame = np.full((360, 640, 3), 30, np.uint8)
+    cv2.putText(frame, text, (20, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (230, 230, 230), 2)
+    if noise:
+        _, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
+        frame = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    return frame
+
+
+def test_perceptual_hash_similar_and_different_frames():
+    frame_hash = perceptual_hash(draw_frame("print('hello world')"))
+    assert hamming_distance(frame_hash, perceptual_hash(draw_frame("print('hello world')", noise=True))) <= 3
+    assert hamming_distance(frame_hash, perceptual_hash(np.full((360, 640, 3), 200, np.uint8))) > 3
+
+
+def test_make_key_depends_on_settings():
+    assert OcrCache.make_key("abc", 10, SETTINGS) == OcrCache.make_key("abc", 10, dict(SETTINGS))
+    assert OcrCache.make_key("abc", 10, SETTINGS) != OcrCache.make_key("abc", 11, SETTINGS)
+    assert OcrCache.make_key("abc", 10, SETTINGS) != OcrCache.make_key("abc", 10, {"language": "Java"})
+
+
+def test_memory_tier_lru_eviction():
+    cache = OcrCache(directory=None, memory_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, key.upper())
+    assert cache.get("a") is None
+    assert cache.get("c") == "C"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    OcrCache(directory=tmp_path).put("key", "print(1)")
+    cache = OcrCache(directory=tmp_path)
+    assert cache.get("key") == "print(1)"
+
+
+def test_disk_tier_size_cap(tmp_path):
+    cache = OcrCache(directory=tmp_path, disk_size_limit=10)
+    cache.put("first", "123456")
+    cache.put("second", "123456")
+    assert not (tmp_path / "first.txt").exists()
+    assert (tmp_path / "second.txt").exists()
+    assert cache.stats()["disk_bytes"] == 6
+
+
+def test_find_similar_frame():
+    cache = OcrCache(directory=None)
+    frame_hash = perceptual_hash(draw_frame("x = 1"))
+    cache.put("key", "x = 1", "video", SETTINGS, frame_hash, 100)
+    similar_hash = perceptual_hash(draw_frame("x = 1", noise=True))
+    assert cache.find_similar("video", SETTINGS, similar_hash, 150, 125) == "x = 1"
+    assert cache.find_similar("video", SETTINGS, similar_hash, 500, 125) is None
+    assert cache.find_similar("other_video", SETTINGS, similar_hash, 150, 125) is None
+    assert cache.find_similar("video", {"language": "Java"}, similar_hash, 150, 125) is None
+    assert cache.stats()["similar_hits"] == 1
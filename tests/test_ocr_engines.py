@@ -0,0 +1,174 @@
+"""
+This module contains the unit tests for the OCR engines defined in app/ocr_engines.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import sys
+import types
+
+import cv2
+import numpy
+import pytest
+
+from app import ocr_engines
+from app.ocr_engines import (OcrEngine, OpenCvDnnEngine, PytesseractEngine, TesserocrEngine, ctc_greedy_decode,
+                             get_ocr_engine, join_words, parse_tesseract_config, register_ocr_engine)
+
+
+@pytest.fixture(autouse=True)
+def clear_engines():
+    ocr_engines.engines.clear()
+    yield
+    ocr_engines.engines.clear()
+
+
+class FakeApi:
+    """
+    Stand-in for tesserocr.PyTessBaseAPI recording the calls made to it
+    """
+    created = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.images = []
+        self.variables = {}
+        self.resolution = None
+        FakeApi.created.append(self)
+
+    def SetPageSegMode(self, psm):
+        self.psm = psm
+
+    def SetVariable(self, name, value):
+        self.variables[name] = value
+
+    def SetImageBytes(self, data, width, height, bytes_per_pixel, bytes_per_line):
+        self.images.append((len(data), width, height, bytes_per_pixel, bytes_per_line))
+
+    def SetSourceResolution(self, dpi):
+        self.resolution = dpi
+
+    def GetUTF8Text(self):
+        return "text"
+
+    def Clear(self):
+        pass
+
+    def End(self):
+        pass
+
+
+@pytest.fixture
+def fake_tesserocr(mocker):
+    FakeApi.created = []
+    module = types.SimpleNamespace(PyTessBaseAPI=FakeApi, PSM=lambda value: value, OEM=lambda value: value)
+    module.PSM.AUTO = 3
+    mocker.patch.dict(sys.modules, {"tesserocr": module})
+    return module
+
+
+def test_parse_tesseract_config():
+    options = parse_tesseract_config("--dpi 300 --psm 6 --oem 1 -l deu -c preserve_interword_spaces=1 --unknown")
+    assert options == {"language": "deu", "psm": 6, "oem": 1, "dpi": 300,
+                       "variables": {"preserve_interword_spaces": "1"}}
+    assert parse_tesseract_config("") == {"language": None, "psm": None, "oem": None, "dpi": None, "variables": {}}
+
+
+def test_auto_falls_back_to_pytesseract(mocker):
+    mocker.patch.dict(sys.modules, {"tesserocr": None})
+    engine = get_ocr_engine("auto")
+    assert isinstance(engine, PytesseractEngine)
+    assert get_ocr_engine("auto") is engine
+
+
+def test_tesserocr_keeps_model_loaded(fake_tesserocr):
+    engine = get_ocr_engine("auto")
+    assert isinstance(engine, TesserocrEngine)
+    gray = numpy.zeros((20, 30), dtype=numpy.uint8)
+    colour = numpy.zeros((20, 30, 3), dtype=numpy.uint8)
+    assert engine.image_to_string(gray, "--dpi 300") == "text"
+    assert engine.image_to_string(colour[5:15, 10:20], "--dpi 300 -c tessedit_do_invert=0") == "text"
+    assert len(FakeApi.created) == 1
+    api = FakeApi.created[0]
+    assert api.kwargs == {"lang": "eng"}
+    assert api.images == [(600, 30, 20, 1, 30), (300, 10, 10, 3, 30)]
+    assert api.resolution == 300
+    assert api.variables == {"tessedit_do_invert": "0"}
+    engine.image_to_string(gray, "-l deu")
+    assert len(FakeApi.created) == 2
+
+
+def test_incomplete_engine_is_rejected():
+    class IncompleteEngine(OcrEngine):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        register_ocr_engine(IncompleteEngine)
+    with pytest.raises(TypeError):
+        IncompleteEngine()
+    assert "incomplete" not in ocr_engines.OCR_ENGINES
+
+
+def test_join_words():
+    words = [{"text": "def", "left": 10, "width": 30, "line": (1, 1, 1)},
+             {"text": "f():", "left": 50, "width": 40, "line": (1, 1, 1)},
+             {"text": "pass", "left": 50, "width": 40, "line": (1, 1, 2)},
+             {"text": "f()", "left": 10, "width": 30, "line": (1, 2, 1)}]
+    assert join_words(words) == "def f():\npass\n\nf()"
+    assert join_words(words, indent=True) == "def f():\n    pass\n\nf()"
+    assert join_words([]) == ""
+
+
+def test_ctc_greedy_decode():
+    # Time steps a, a, blank, a, b, blank with class 0 the blank
+    best = [1, 1, 0, 1, 2, 0]
+    scores = numpy.full((len(best), 1, 3), -10.0)
+    for step, best_class in enumerate(best):
+        scores[step, 0, best_class] = 10.0
+    text, confidence = ctc_greedy_decode(scores, ["a", "b"])
+    assert text == "aab"
+    assert confidence > 99
+    assert ctc_greedy_decode(numpy.zeros((4, 3)), ["a", "b"]) == ("", 0.0)
+
+
+class FakeNet:
+    """
+    Stand-in for a CTC text recognition network reading every word as "ab"
+    """
+
+    def setPreferableBackend(self, backend):
+        pass
+
+    def setPreferableTarget(self, target):
+        pass
+
+    def setInput(self, blob):
+        assert blob.shape == (1, 1, 32, 100)
+
+    def forward(self):
+        scores = numpy.full((4, 1, 3), -10.0)
+        for step, best_class in enumerate([1, 0, 2, 2]):
+            scores[step, 0, best_class] = 10.0
+        return scores
+
+
+def test_opencv_dnn_engine(mocker, tmp_path):
+    vocabulary = tmp_path / "vocabulary.txt"
+    vocabulary.write_text("a\nb\n")
+    mocker.patch("cv2.dnn.readNet", return_value=FakeNet())
+    engine = get_ocr_engine("opencv_dnn", {"dnn_model": "model.onnx", "dnn_vocabulary": str(vocabulary)})
+    assert isinstance(engine, OpenCvDnnEngine)
+    image = numpy.full((120, 400), 255, numpy.uint8)
+    cv2.putText(image, "def add(a, b):", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    cv2.putText(image, "    return a + b", (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    result = engine.recognize(image)
+    lines = result.text.splitlines()
+    assert len(lines) == 2 and lines[0].startswith("ab") and lines[1].startswith("  ")
+    assert result.confidence > 99
+    assert all(box["text"] == "ab" and box["width"] > 0 for box in result.boxes)
+    assert result.elapsed > 0
+
+
+def test_opencv_dnn_engine_without_model_falls_back():
+    assert isinstance(get_ocr_engine("opencv_dnn"), PytesseractEngine)
@@ -0,0 +1,109 @@
+"""
+This module contains the unit tests for the OCR worker pool defined in app/ocr_worker_pool.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.ocr_worker_pool import OcrJobNotFoundError, OcrQueueFullError, OcrTimeoutError, OcrWorkerPool
+
+
+class BlockingOcr:
+    """
+    Stand in OCR function that blocks until released
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def __call__(self, text):
+        assert self.release.wait(5)
+        return text.upper()
+
+
+def thread_pool_factory(workers):
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def test_run_returns_result():
+    pool = OcrWorkerPool(workers=2, ocr_function=str.upper, executor_factory=thread_pool_factory)
+    assert pool.run("print(1)") == "PRINT(1)"
+    assert pool.stats()["completed"] == 1
+    pool.shutdown()
+
+
+def test_run_many_keeps_order():
+    pool = OcrWorkerPool(workers=4, ocr_function=str.upper, executor_factory=thread_pool_factory)
+    assert pool.run_many([("a",), ("b",), ("c",)]) == ["A", "B", "C"]
+    assert pool.stats()["pending"] == 0
+    pool.shutdown()
+
+
+def test_submit_many_and_collect():
+    ocr = BlockingOcr()
+    pool = OcrWorkerPool(workers=2, ocr_function=ocr, executor_factory=thread_pool_factory)
+    job_ids = pool.submit_many([("a",), ("b",)])
+    assert not pool.done(job_ids)
+    ocr.release.set()
+    assert pool.collect(job_ids) == ["A", "B"]
+    assert pool.get_job(job_ids[0]) is None
+    pool.shutdown()
+
+
+def test_run_in_process_pool():
+    pool = OcrWorkerPool(workers=1, ocr_function=str.upper)
+    assert pool.run("print(1)") == "PRINT(1)"
+    pool.shutdown()
+
+
+def test_submit_and_get_job():
+    ocr = BlockingOcr()
+    pool = OcrWorkerPool(workers=1, ocr_function=ocr, executor_factory=thread_pool_factory)
+    job_id = pool.submit("code", context={"filename": "video.mp4"})
+    job = pool.get_job(job_id)
+    assert job.status in ("queued", "running")
+    assert job.context == {"filename": "video.mp4"}
+    ocr.release.set()
+    assert job.future.result(5) == "CODE"
+    assert pool.get_job(job_id).status == "complete"
+    assert pool.get_job("unknown") is None
+    pool.shutdown()
+
+
+def test_submit_rejects_when_queue_full():
+    ocr = BlockingOcr()
+    pool = OcrWorkerPool(workers=1, max_pending=2, ocr_function=ocr, executor_factory=thread_pool_factory)
+    first_job = pool.submit("first")
+    pool.submit("second")
+    with pytest.raises(OcrQueueFullError):
+        pool.submit("third")
+    assert pool.stats()["rejected"] == 1
+    ocr.release.set()
+    pool.get_job(first_job).future.result(5)
+    pool.submit("fourth")
+    pool.shutdown()
+
+
+def test_run_timeout():
+    ocr = BlockingOcr()
+    pool = OcrWorkerPool(workers=1, timeout=0.1, ocr_function=ocr, executor_factory=thread_pool_factory)
+    with pytest.raises(OcrTimeoutError):
+        pool.run("code")
+    assert pool.stats()["timed_out"] == 1
+    ocr.release.set()
+    pool.shutdown()
+
+
+def test_collect_unknown_job():
+    pool = OcrWorkerPool(workers=1, ocr_function=str.upper, executor_factory=thread_pool_factory)
+    job_ids = pool.submit_many([("a",), ("b",)])
+    pool.forget(job_ids[1])
+    with pytest.raises(OcrJobNotFoundError):
+        pool.collect(job_ids)
+    assert pool.get_job(job_ids[0]) is None
+    pool.shutdown()
@@ -0,0 +1,87 @@
+"""
+This module contains the unit tests for the scene detecting pre-OCR job defined in app/pre_ocr.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import cv2
+import numpy as np
+import pytest
+
+from app.pre_ocr import PreOcrJob, PreOcrManager, Timeline
+
+
+@pytest.fixture
+def slide_video(tmp_path):
+    """
+    Write a 6 second video of three 2 second slides and return its path
+    """
+    video_path = str(tmp_path / "slides.mp4")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (320, 180))
+    for slide in range(3):
+        frame = np.zeros((180, 320, 3), np.uint8)
+        cv2.putText(frame, f"slide {slide}", (20, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+        for _ in range(20):
+            writer.write(frame)
+    writer.release()
+    return video_path
+
+
+def count_slide_ocr(frame):
+    """
+    Stand in OCR function returning the mean brightness of the frame
+    """
+    return str(int(frame.mean()))
+
+
+def test_timeline_lookup():
+    timeline = Timeline("key")
+    timeline.add_segment(0.0, 1.0, "first")
+    timeline.add_segment(2.0, 2.0, "second")
+    timeline.extend_last(3.0)
+    assert timeline.lookup(0.5) == "first"
+    assert timeline.lookup(1.5) is None
+    assert timeline.lookup(2.5) == "second"
+    assert timeline.lookup(3.5) is None
+    assert Timeline.from_dict(timeline.to_dict()).lookup(2.5) == "second"
+
+
+def test_job_only_ocrs_distinct_scenes(slide_video, mocker):
+    ocr_frame = mocker.Mock(side_effect=count_slide_ocr)
+    job = PreOcrJob("hash", slide_video, ocr_frame, "key", sample_interval=0.5)
+    job.run()
+    assert job.status == "complete"
+    assert job.progress == 1.0
+    assert job.frames_sampled == 12
+    assert ocr_frame.call_count == 3
+    assert [segment["start"] for segment in job.timeline.segments] == [0.0, 2.0, 4.0]
+    assert job.timeline.lookup(1.2) == job.timeline.segments[0]["text"]
+    assert job.timeline.lookup(5.5) == job.timeline.segments[2]["text"]
+
+
+def test_job_cancel(slide_video):
+    job = PreOcrJob("hash", slide_video, count_slide_ocr, "key")
+    job.cancel()
+    job.run()
+    assert job.status == "cancelled"
+    assert job.frames_sampled == 0
+
+
+def test_job_missing_video(tmp_path):
+    job = PreOcrJob("hash", str(tmp_path / "missing.mp4"), count_slide_ocr, "key")
+    job.run()
+    assert job.status == "failed"
+
+
+def test_manager_persists_timeline(slide_video, tmp_path):
+    manager = PreOcrManager(tmp_path / "timelines")
+    job = manager.start(PreOcrJob("hash", slide_video, count_slide_ocr, "key"))
+    assert job.finished.wait(10)
+    assert job.status == "complete"
+    assert manager.lookup("hash", 3.0, "key") is not None
+    assert manager.lookup("hash", 3.0, "other settings") is None
+    reloaded = PreOcrManager(tmp_path / "timelines")
+    assert reloaded.lookup("hash", 3.0, "key") == manager.lookup("hash", 3.0, "key")
+    manager.delete("hash")
+    assert PreOcrManager(tmp_path / "timelines").get_timeline("hash") is None
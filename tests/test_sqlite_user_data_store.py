@@ -0,0 +1,99 @@
+"""
+This module contains the unit tests for the SQLite storage engine defined in app/sqlite_user_data_store.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import json
+
+from app.sqlite_user_data_store import SqliteUserDataStore
+from tests.test_utils import load_dummy_user_data
+
+
+def load_dummy_sqlite_store(tmp_path):
+    """
+    SQLite store migrated from the dummy user data
+    :param tmp_path: Directory to create the database and json files in
+    :return: SqliteUserDataStore object
+    """
+    json_path = tmp_path / "userdata.json"
+    json_path.write_text(json.dumps(load_dummy_user_data()))
+    store = SqliteUserDataStore(tmp_path / "userdata.db")
+    store.migrate_from_json(json_path)
+    return store
+
+
+def test_sqlite_store_uses_wal_mode(tmp_path):
+    store = SqliteUserDataStore(tmp_path / "userdata.db")
+    assert store._connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_sqlite_store_migration_matches_json(tmp_path):
+    store = load_dummy_sqlite_store(tmp_path)
+    assert store.all_videos() == load_dummy_user_data()["all_videos"]
+
+
+def test_sqlite_store_migration_runs_once(tmp_path):
+    store = load_dummy_sqlite_store(tmp_path)
+    assert store.migrate_from_json(tmp_path / "userdata.json") == 0
+    assert len(store.filenames()) == 3
+
+
+def test_sqlite_store_lookups(tmp_path):
+    store = load_dummy_sqlite_store(tmp_path)
+    assert store.filename_exists("loops.mp4")
+    assert not store.filename_exists("missing.mp4")
+    assert store.hash_exists("b6a0f3d4d9d7f7f33fd53148e9a48d48")
+    assert not store.hash_exists("missing")
+    assert store.filename_for_hash("b6a0f3d4d9d7f7f33fd53148e9a48d48") == "oop.mp4"
+    assert store.filename_for_hash("missing") is None
+    assert store.get_video("missing.mp4") is None
+
+
+def test_sqlite_store_update_and_delete(tmp_path):
+    store = load_dummy_sqlite_store(tmp_path)
+    assert store.update_video("loops.mp4", progress=20.4, capture={"timestamp": 20, "capture_content": "y = 2"})
+    assert not store.update_video("missing.mp4", progress=1)
+    video = store.get_video("loops.mp4")
+    assert video["progress"] == 20
+    assert video["captures"] == [{"timestamp": 20, "capture_content": "y = 2"}]
+    assert store.delete_video("loops.mp4")
+    assert store.filenames() == ["oop.mp4", "list_ops_handwriting.mp4"]
+    assert store._connection().execute("SELECT COUNT(*) FROM captures").fetchone()[0] == 1
+
+
+def test_sqlite_store_keeps_extra_fields(tmp_path):
+    store = SqliteUserDataStore(tmp_path / "userdata.db")
+    store.add_video({"video_hash": "abc", "filename": "yt.mp4", "alias": "yt.mp4", "thumbnail": "1.png",
+                     "video_length": 10, "progress": 0, "captures": [], "youtube_url": "https://youtu.be/x",
+                     "custom": "value"})
+    video = store.get_video("yt.mp4")
+    assert video["youtube_url"] == "https://youtu.be/x"
+    assert video["custom"] == "value"
+
+
+def test_sqlite_store_sets_video_hash_once_computed(tmp_path):
+    store = SqliteUserDataStore(tmp_path / "userdata.db")
+    store.add_video({"video_hash": None, "filename": "new.mp4", "alias": "new.mp4", "thumbnail": "thumbnails/",
+                     "video_length": 10, "progress": 0, "captures": []})
+    assert store.get_video("new.mp4")["video_hash"] is None
+    assert store.set_video_hash("new.mp4", "abc", "thumbnails/abc.webp")
+    assert not store.set_video_hash("missing.mp4", "abc", "thumbnails/abc.webp")
+    assert store.filename_for_hash("abc") == "new.mp4"
+    assert store.get_video("new.mp4")["thumbnail"] == "thumbnails/abc.webp"
+
+
+def test_sqlite_store_lists_library_pages(tmp_path):
+    store = load_dummy_sqlite_store(tmp_path)
+    videos, total = store.list_videos(0, 2)
+    assert total == 3
+    assert [video["filename"] for video in videos] == ["list_ops_handwriting.mp4", "loops.mp4"]
+    assert videos[0]["capture_count"] == 1 and "captures" not in videos[0]
+    videos, _ = store.list_videos(0, 3, sort="alias")
+    assert [video["filename"] for video in videos] == ["list_ops_handwriting.mp4", "loops.mp4", "oop.mp4"]
+    videos, total = store.list_videos(0, 3, sort="oldest", in_progress=True)
+    assert total == 2 and [video["filename"] for video in videos] == ["oop.mp4", "loops.mp4"]
+    videos, total = store.list_videos(0, 3, search="LOOP")
+    assert total == 1 and videos[0]["filename"] == "loops.mp4"
+    assert store.list_videos(0, 3, search="%") == ([], 0)
@@ -0,0 +1,65 @@
+"""
+This module contains the unit tests for the background thumbnail generation defined in app/thumbnails.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import cv2
+import numpy as np
+import pytest
+
+from app.thumbnails import ThumbnailStore, encode_thumbnail
+
+
+@pytest.fixture
+def counting_video(tmp_path):
+    """
+    Write a 4 second video whose frames show their second and return its path
+    """
+    video_path = str(tmp_path / "counting.mp4")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (640, 360))
+    for second in range(4):
+        frame = np.full((360, 640, 3), second * 60, np.uint8)
+        for _ in range(10):
+            writer.write(frame)
+    writer.release()
+    return video_path
+
+
+def test_encode_thumbnail_downscales():
+    thumbnail = encode_thumbnail(np.zeros((720, 1280, 3), np.uint8), 320, "jpg", 80)
+    assert cv2.imdecode(np.frombuffer(thumbnail, np.uint8), cv2.IMREAD_COLOR).shape == (180, 320, 3)
+    small = encode_thumbnail(np.zeros((90, 160, 3), np.uint8), 320, "jpg", 80)
+    assert cv2.imdecode(np.frombuffer(small, np.uint8), cv2.IMREAD_COLOR).shape == (90, 160, 3)
+
+
+def test_generate_middle_frame(tmp_path, counting_video):
+    store = ThumbnailStore(tmp_path / "thumbnails", width=160, image_format="jpg")
+    assert not store.is_ready("abc")
+    assert store.generate("abc", counting_video)
+    assert store.is_ready("abc")
+    thumbnail = cv2.imread(str(store.path("abc")))
+    assert thumbnail.shape == (90, 160, 3)
+    assert abs(int(thumbnail.mean()) - 120) < 10
+    store.delete("abc")
+    assert not store.is_ready("abc")
+
+
+def test_generate_in_background(tmp_path, counting_video):
+    store = ThumbnailStore(tmp_path / "thumbnails")
+    assert not store.ensure("first", counting_video)
+    assert not store.ensure("second", counting_video)
+    store.wait()
+    assert store.path("first").name == f"first.{store.extension}"
+    assert store.ensure("first", counting_video)
+    assert store.ensure("second", counting_video)
+
+
+def test_failed_video_is_not_queued_again(tmp_path):
+    (tmp_path / "broken.mp4").write_bytes(b"not a video")
+    store = ThumbnailStore(tmp_path / "thumbnails")
+    assert not store.ensure("broken", str(tmp_path / "broken.mp4"))
+    store.wait()
+    assert not store.ensure("broken", str(tmp_path / "broken.mp4"))
+    assert store._executor is None
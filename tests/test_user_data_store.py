@@ -0,0 +1,218 @@
+"""
+This module contains the unit tests for the user data store defined in app/user_data_store.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import json
+import threading
+
+from app.user_data_store import UserDataStore, WriteBehindStore
+from tests.test_utils import load_dummy_user_data
+
+
+def test_store_creates_missing_data_file(tmp_path):
+    data_path = tmp_path / "data" / "userdata.json"
+    store = UserDataStore(data_path)
+    assert store.is_available()
+    assert json.loads(data_path.read_text()) == {"all_videos": []}
+
+
+def test_store_corrupt_data_file_is_unavailable(tmp_path):
+    data_path = tmp_path / "userdata.json"
+    data_path.write_text("")
+    store = UserDataStore(data_path)
+    assert not store.is_available()
+    assert store.all_videos() is None
+    assert not store.add_video({"filename": "new.mp4", "video_hash": "abc", "captures": []})
+    assert data_path.read_text() == ""
+
+
+def test_store_indexes_filename_and_hash():
+    store = UserDataStore.from_data(load_dummy_user_data())
+    assert store.filename_exists("loops.mp4")
+    assert store.hash_exists("a0c0194cb4c5531a030fe68c8db304f9")
+    assert not store.filename_exists("missing.mp4")
+    assert not store.hash_exists("missing")
+    assert store.filename_for_hash("a0c0194cb4c5531a030fe68c8db304f9") == "list_ops_handwriting.mp4"
+    assert store.filename_for_hash("missing") is None
+
+
+def test_store_returns_copies():
+    store = UserDataStore.from_data(load_dummy_user_data())
+    video = store.get_video("list_ops_handwriting.mp4")
+    video["video_length"] = "03:06"
+    video["captures"][0]["timestamp"] = "00:08"
+    stored_video = store.get_video("list_ops_handwriting.mp4")
+    assert stored_video["video_length"] == 186
+    assert stored_video["captures"][0]["timestamp"] == 8
+
+
+def test_store_persists_updates(tmp_path):
+    data_path = tmp_path / "userdata.json"
+    data_path.write_text(json.dumps(load_dummy_user_data()))
+    store = UserDataStore(data_path)
+    assert store.update_video("loops.mp4", progress=12.6, capture={"timestamp": 12, "capture_content": "x = 1"})
+    assert store.delete_video("oop.mp4")
+    reloaded_store = UserDataStore(data_path)
+    assert reloaded_store.filenames() == ["loops.mp4", "list_ops_handwriting.mp4"]
+    assert reloaded_store.get_video("loops.mp4")["progress"] == 13
+    assert reloaded_store.get_video("loops.mp4")["captures"] == [{"timestamp": 12, "capture_content": "x = 1"}]
+    assert list(tmp_path.iterdir()) == [data_path]
+
+
+def test_store_sets_video_hash_once_computed(tmp_path):
+    data_path = tmp_path / "userdata.json"
+    store = UserDataStore(data_path)
+    assert store.add_video({"filename": "new.mp4", "video_hash": None, "thumbnail": "thumbnails/", "video_length": 10,
+                            "progress": 0, "captures": []})
+    assert not store.hash_exists(None)
+    assert store.set_video_hash("new.mp4", "abc", "thumbnails/abc.webp")
+    assert not store.set_video_hash("missing.mp4", "abc", "thumbnails/abc.webp")
+    reloaded_store = UserDataStore(data_path)
+    assert reloaded_store.filename_for_hash("abc") == "new.mp4"
+    assert reloaded_store.get_video("new.mp4")["thumbnail"] == "thumbnails/abc.webp"
+
+
+def test_write_behind_store_coalesces_progress(mocker):
+    store = UserDataStore.from_data(load_dummy_user_data())
+    save = mocker.patch.object(store, "save")
+    write_behind_store = WriteBehindStore(store, flush_interval=3600)
+    for progress in range(10, 50):
+        assert write_behind_store.update_video("loops.mp4", progress=progress)
+    assert not write_behind_store.update_video("missing.mp4", progress=10)
+    assert write_behind_store.get_video("loops.mp4")["progress"] == 49
+    assert write_behind_store.all_videos()[1]["progress"] == 49
+    assert store.get_video("loops.mp4")["progress"] == 0
+    save.assert_not_called()
+    write_behind_store.close()
+    assert store.get_video("loops.mp4")["progress"] == 49
+    assert save.call_count == 1
+    assert write_behind_store.pending_progress("loops.mp4") is None
+
+
+def test_write_behind_store_capture_writes_pending_progress():
+    store = UserDataStore.from_data(load_dummy_user_data())
+    write_behind_store = WriteBehindStore(store, flush_interval=3600)
+    write_behind_store.update_video("oop.mp4", progress=400)
+    write_behind_store.update_video("oop.mp4", capture={"timestamp": 400, "capture_content": "class A: pass"})
+    assert store.get_video("oop.mp4")["progress"] == 400
+    assert len(store.get_video("oop.mp4")["captures"]) == 1
+    assert write_behind_store.pending_progress("oop.mp4") is None
+    write_behind_store.close()
+
+
+def test_write_behind_store_flush_does_not_overwrite_newer_progress(mocker):
+    store = UserDataStore.from_data(load_dummy_user_data())
+    mocker.patch.object(store, "save")
+    write_behind_store = WriteBehindStore(store, flush_interval=3600)
+    writing, release = threading.Event(), threading.Event()
+    update_progress = store.update_progress
+
+    def slow_update_progress(progress_by_filename):
+        writing.set()
+        release.wait(5)
+        update_progress(progress_by_filename)
+
+    mocker.patch.object(store, "update_progress", side_effect=slow_update_progress)
+    write_behind_store.update_video("oop.mp4", progress=400)
+    flush = threading.Thread(target=write_behind_store.flush)
+    flush.start()
+    assert writing.wait(5)
+    capture = threading.Thread(target=write_behind_store.update_video, args=("oop.mp4", 500),
+                               kwargs={"capture": {"timestamp": 500, "capture_content": "x = 1"}})
+    capture.start()
+    write_behind_store.update_video("loops.mp4", progress=100)
+    release.set()
+    flush.join(5)
+    capture.join(5)
+    assert store.get_video("oop.mp4")["progress"] == 500
+    assert write_behind_store.pending_progress("loops.mp4") == 100
+    write_behind_store.close()
+    assert store.get_video("loops.mp4")["progress"] == 100
+
+
+def test_write_behind_store_flush_thread_survives_errors(mocker):
+    store = UserDataStore.from_data(load_dummy_user_data())
+    mocker.patch.object(store, "save")
+    flushed = threading.Event()
+    update_progress = store.update_progress
+
+    def failing_update_progress(progress_by_filename):
+        if not failing_update_progress.failed:
+            failing_update_progress.failed = True
+            raise OSError("disk full")
+        update_progress(progress_by_filename)
+        flushed.set()
+
+    failing_update_progress.failed = False
+    mocker.patch.object(store, "update_progress", side_effect=failing_update_progress)
+    error = mocker.patch("app.user_data_store.logging.error")
+    write_behind_store = WriteBehindStore(store, flush_interval=0.01)
+    write_behind_store.update_video("oop.mp4", progress=400)
+    assert flushed.wait(5)
+    error.assert_called_once()
+    assert store.get_video("oop.mp4")["progress"] == 400
+    write_behind_store.close()
+
+
+def test_write_behind_store_delete_drops_pending_progress():
+    store = UserDataStore.from_data(load_dummy_user_data())
+    write_behind_store = WriteBehindStore(store, flush_interval=3600)
+    write_behind_store.update_video("oop.mp4", progress=400)
+    assert write_behind_store.delete_video("oop.mp4")
+    assert write_behind_store.pending_progress("oop.mp4") is None
+    assert not write_behind_store.filename_exists("oop.mp4")
+    write_behind_store.close()
+
+
+def test_store_lists_library_pages():
+    store = UserDataStore.from_data(load_dummy_user_data())
+    videos, total = store.list_videos(0, 2)
+    assert total == 3
+    assert [video["filename"] for video in videos] == ["list_ops_handwriting.mp4", "loops.mp4"]
+    assert videos[0]["capture_count"] == 1 and "captures" not in videos[0]
+    videos, _ = store.list_videos(2, 2)
+    assert [video["filename"] for video in videos] == ["oop.mp4"]
+    videos, _ = store.list_videos(0, 3, sort="oldest")
+    assert [video["filename"] for video in videos] == ["oop.mp4", "loops.mp4", "list_ops_handwriting.mp4"]
+    videos, _ = store.list_videos(0, 3, sort="alias")
+    assert [video["filename"] for video in videos] == ["list_ops_handwriting.mp4", "loops.mp4", "oop.mp4"]
+    videos, total = store.list_videos(0, 3, search="LOOP")
+    assert total == 1 and videos[0]["filename"] == "loops.mp4"
+    assert store.list_videos(5, 2) == ([], 3)
+
+
+def test_store_indexes_videos_in_progress():
+    store = UserDataStore.from_data(load_dummy_user_data())
+    videos, total = store.list_videos(0, 3, in_progress=True)
+    assert total == 2
+    assert [video["filename"] for video in videos] == ["loops.mp4", "oop.mp4"]
+    store.update_video("loops.mp4", progress=418)
+    store.update_progress({"list_ops_handwriting.mp4": 10})
+    videos, _ = store.list_videos(0, 3, in_progress=True)
+    assert [video["filename"] for video in videos] == ["list_ops_handwriting.mp4", "oop.mp4"]
+    videos, _ = store.list_videos(0, 3, sort="alias", in_progress=True, search="o")
+    assert [video["filename"] for video in videos] == ["list_ops_handwriting.mp4", "oop.mp4"]
+    store.update_progress({"loops.mp4": 1})
+    videos, _ = store.list_videos(0, 3, sort="oldest", in_progress=True)
+    assert [video["filename"] for video in videos] == ["oop.mp4", "loops.mp4", "list_ops_handwriting.mp4"]
+
+
+def test_write_behind_store_lists_with_pending_progress(mocker):
+    store = UserDataStore.from_data(load_dummy_user_data())
+    mocker.patch.object(store, "save")
+    write_behind_store = WriteBehindStore(store, flush_interval=3600)
+    write_behind_store.update_video("oop.mp4", progress=632)
+    flush = mocker.spy(write_behind_store, "flush")
+    videos, _ = write_behind_store.list_videos(0, 3)
+    assert [video["progress"] for video in videos if video["filename"] == "oop.mp4"] == [632]
+    flush.assert_not_called()
+    videos, total = write_behind_store.list_videos(0, 3, in_progress=True)
+    assert total == 1 and videos[0]["filename"] == "loops.mp4"
+    assert flush.call_count == 1
+    # Nothing is buffered any more, so listing again does not write
+    write_behind_store.list_videos(0, 3, in_progress=True)
+    assert flush.call_count == 1
+    write_behind_store.close()
@@ -10,7 +10,13 @@ tests remain fast and do not modify external state.
 """
 import os
 
+import pytest
+
 from app import utils
+from app.user_data_store import UserDataStore
+from app.thumbnails import ThumbnailStore
+from app.code_search import CodeSearchIndex
+from app.video_fingerprint import FingerprintCache, FingerprintIndex, fingerprint_file
 
 
 def load_dummy_user_data():
@@ -29,23 +35,31 @@ def load_dummy_user_data():
                             "progress": 186, "captures": [{"timestamp": 8, "capture_content": "dummy capture"}]}]}
 
 
+def load_dummy_user_data_store():
+    """
+    In memory user data store containing the dummy data for testing various functions in utils.py
+    :return: UserDataStore object that does not persist to disk
+    """
+    return UserDataStore.from_data(load_dummy_user_data())
+
+
 def test_file_exists_in_user_data_true(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     assert utils.filename_exists_in_userdata("loops.mp4")
 
 
 def test_file_exists_in_user_data_false(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     assert not utils.filename_exists_in_userdata("does_not_exist.mp4")
 
 
 def test_file_exists_in_user_data_empty_user_data(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=None)
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
     assert not utils.filename_exists_in_userdata("hello-world.mp4")
 
 
 def test_parse_video_data(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     parsed_video_data = utils.parse_video_data()
     assert len(parsed_video_data["all_videos"]) == 3
     assert len(parsed_video_data["continue_watching"]) == 2
@@ -56,29 +70,100 @@ def test_parse_video_data(mocker):
     assert parsed_video_data["all_videos"][2]["filename"] == "list_ops_handwriting.mp4"
 
 
+def test_parse_video_data_thumbnail_pending(mocker, tmp_path):
+    user_data = load_dummy_user_data()
+    user_data["all_videos"][1]["thumbnail"] = "thumbnails/8e3fed7fc8b8620469ea36703a5dfa94.jpg"
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(user_data))
+    mocker.patch("app.utils.get_vid_save_path", return_value=f"{tmp_path}{os.sep}")
+    mocker.patch("app.utils.get_thumbnail_store", return_value=ThumbnailStore(tmp_path / "thumbnails",
+                                                                              image_format="jpg"))
+    generate = mocker.patch.object(ThumbnailStore, "generate_in_background")
+    parsed_video_data = utils.parse_video_data()
+    assert parsed_video_data["all_videos"][0]["thumbnail_ready"]
+    assert not parsed_video_data["all_videos"][1]["thumbnail_ready"]
+    generate.assert_not_called()
+    (tmp_path / "loops.mp4").write_bytes(b"loops video")
+    assert not utils.parse_video_data()["all_videos"][1]["thumbnail_ready"]
+    generate.assert_called_once()
+
+
 def test_parse_video_data_empty_user_data(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=None)
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
     parsed_video_data = utils.parse_video_data()
     assert parsed_video_data["all_videos"] is None
     assert parsed_video_data["continue_watching"] is None
 
 
+def test_get_library_page(mocker):
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
+    mocker.patch("app.utils.config", side_effect=lambda section, option, fallback: "2")
+    library = utils.get_library_page(1, "oldest")
+    assert library["total"] == 3 and library["pages"] == 2 and library["page"] == 1
+    assert [video["filename"] for video in library["videos"]] == ["oop.mp4", "loops.mp4"]
+    assert library["videos"][0]["progress_percent"] == 54
+    library = utils.get_library_page(9, "oldest")
+    assert library["page"] == 2
+    assert [video["filename"] for video in library["videos"]] == ["list_ops_handwriting.mp4"]
+    assert utils.get_library_page(1, "unknown")["videos"][0]["filename"] == "list_ops_handwriting.mp4"
+
+
+def test_get_library_page_empty_user_data(mocker):
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
+    mocker.patch("app.utils.config", side_effect=lambda section, option, fallback: fallback)
+    assert utils.get_library_page(3) == {"videos": [], "total": 0, "page": 1, "pages": 1}
+
+
+def test_get_continue_watching(mocker):
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
+    mocker.patch("app.utils.config", side_effect=lambda section, option, fallback: fallback)
+    continue_watching = utils.get_continue_watching()
+    assert [video["filename"] for video in continue_watching] == ["loops.mp4", "oop.mp4"]
+
+
+def test_update_user_video_data_indexes_captures(mocker, tmp_path):
+    store = load_dummy_user_data_store()
+    mocker.patch.object(store, "save")
+    mocker.patch("app.utils.get_user_data_store", return_value=store)
+    mocker.patch("app.utils.config", side_effect=lambda section, option, fallback: fallback)
+    mocker.patch("app.utils.code_search_index", CodeSearchIndex(tmp_path / "code_search.db"))
+    mocker.patch.object(utils.code_search_index, "is_built", return_value=False)
+    utils.get_code_search_index()
+    utils.update_user_video_data("oop.mp4", capture={"timestamp": 30.5, "capture_content": "print(sum(values))"})
+    utils.update_user_video_data("missing.mp4", capture={"timestamp": 1, "capture_content": "print(1)"})
+    hits = utils.search_code("print sum")
+    assert [(hit["filename"], hit["formatted_timestamp"], hit["url"]) for hit in hits] == \
+           [("oop.mp4", "00:30", "/play_video/oop.mp4?t=30.5")]
+    utils.delete_video_from_userdata("oop.mp4")
+    assert utils.search_code("print") == []
+
+
+def test_get_code_search_index_builds_from_user_data(mocker, tmp_path):
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
+    mocker.patch("app.utils.config", side_effect=lambda section, option, fallback:
+                 str(tmp_path / "code_search.db") if option == "index_path" else fallback)
+    mocker.patch("app.utils.code_search_index", None)
+    build_in_background = mocker.spy(CodeSearchIndex, "build_in_background")
+    utils.get_code_search_index()
+    build_in_background.spy_return.join(5)
+    assert utils.get_code_search_index().count() == 1
+    assert utils.get_code_search_index().is_built()
+    build_in_background.assert_called_once()
+
+
 def test_delete_video_from_user_data(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
-    mocker.patch("app.utils.open")
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     utils.delete_video_from_userdata("loops.mp4")
     assert not utils.filename_exists_in_userdata("loops.mp4")
 
 
 def test_delete_video_from_user_data_video_not_exist(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
-    mocker.patch("app.utils.open")
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     utils.delete_video_from_userdata("ocr_training_video.mp4")
     assert not utils.filename_exists_in_userdata("ocr_training_video.mp4")
 
 
 def test_delete_video_from_user_data_no_user_data(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=None)
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
     utils.delete_video_from_userdata("hello_world.mp4")
     assert not utils.filename_exists_in_userdata("hello_world.mp4")
 
@@ -128,17 +213,17 @@ def test_get_output_path(mocker):
 
 
 def test_file_already_exists_true(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     assert utils.file_already_exists("8e3fed7fc8b8620469ea36703a5dfa94")
 
 
 def test_file_already_exists_false(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     assert not utils.file_already_exists("8ak5sa6sk4d5akj56dh7kdh9ad6648")
 
 
 def test_file_already_exists_no_user_data(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=None)
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
     assert not utils.file_already_exists("4aj3sdl5a4k2sjd091u091j")
 
 
@@ -169,3 +254,145 @@ def test_get_vid_save_path_from_config(mocker):
                  return_value="/home/runner/work/dip-programming-prj-advanced-gui-evolve/out/videos/")
     expected_vid_download_path = "/home/runner/work/dip-programming-prj-advanced-gui-evolve/out/videos/"
     assert utils.get_vid_save_path() == expected_vid_download_path
+
+
+def write_dummy_config(config_path, language: str = "Python"):
+    """
+    Write a minimal config file for testing the config cache
+    :param config_path: Path to write config file to
+    :param language: Programming language to store in the config file
+    """
+    config_path.write_text("[AppSettings]\nopenai_api_key = your_openai_api_key_here\n"
+                           "tesseract_executable = your_path_to_tesseract_here\n"
+                           f"[UserSettings]\nprogramming_language = {language}\n")
+
+
+def test_config_cache_hits_after_first_read(tmp_path):
+    config_path = tmp_path / "config.ini"
+    write_dummy_config(config_path)
+    config_cache = utils.ConfigCache(str(config_path))
+    assert config_cache.get("UserSettings", "programming_language") == "Python"
+    assert config_cache.get("UserSettings", "programming_language") == "Python"
+    assert config_cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_config_cache_reloads_on_file_change(tmp_path):
+    config_path = tmp_path / "config.ini"
+    write_dummy_config(config_path)
+    config_cache = utils.ConfigCache(str(config_path))
+    assert config_cache.get("UserSettings", "programming_language") == "Python"
+    write_dummy_config(config_path, "JavaScript")
+    stat = os.stat(config_path)
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert config_cache.get("UserSettings", "programming_language") == "JavaScript"
+    assert config_cache.misses == 2
+
+
+def test_config_cache_invalidate(tmp_path):
+    config_path = tmp_path / "config.ini"
+    write_dummy_config(config_path)
+    config_cache = utils.ConfigCache(str(config_path))
+    config_cache.get_parser()
+    config_cache.invalidate()
+    config_cache.get_parser()
+    assert config_cache.stats() == {"hits": 0, "misses": 2}
+
+
+def test_config_cache_copies_example_config(tmp_path):
+    example_path = tmp_path / "config.example.ini"
+    write_dummy_config(example_path)
+    config_cache = utils.ConfigCache(str(tmp_path / "config.ini"), str(example_path))
+    assert config_cache.get("UserSettings", "programming_language") == "Python"
+    assert (tmp_path / "config.ini").exists()
+
+
+def test_parse_timestamp():
+    assert utils.parse_timestamp("90") == 90
+    assert utils.parse_timestamp("1:30.5") == 90.5
+    assert utils.parse_timestamp("01:02:03") == 3723
+    for invalid in ["abc", "-5", "1:2:3:4", "inf", ""]:
+        with pytest.raises(ValueError):
+            utils.parse_timestamp(invalid)
+
+
+def setup_local_videos(mocker, tmp_path, dedupe_mode: str):
+    """
+    Point the video directory and fingerprint index at tmp_path, with oop.mp4 from the dummy user data on disk
+    """
+    (tmp_path / "oop.mp4").write_bytes(b"oop video")
+    mocker.patch("app.utils.get_vid_save_path", return_value=f"{tmp_path}{os.sep}")
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
+    mocker.patch("app.utils.get_dedupe_mode", return_value=dedupe_mode)
+    mocker.patch("app.utils.get_hash_algorithm", return_value="md5")
+    mocker.patch("app.utils.fingerprint_index", FingerprintIndex(tmp_path / "fingerprints.json"))
+    return mocker.patch("app.utils.add_video_to_user_data")
+
+
+def test_add_local_video_full_dedupe(mocker, tmp_path):
+    add_video = setup_local_videos(mocker, tmp_path, "full")
+    (tmp_path / "new.mp4").write_bytes(b"new video")
+    assert utils.add_local_video("new.mp4", "New") == "new.mp4"
+    assert add_video.call_args.args[2] == utils.hash_string("new video")
+    (tmp_path / "copy.mp4").write_bytes(b"oop video")
+    assert utils.add_local_video("copy.mp4", "Copy", full_hash="b6a0f3d4d9d7f7f33fd53148e9a48d48") == "oop.mp4"
+
+
+def test_add_local_video_fingerprint_dedupe(mocker, tmp_path):
+    add_video = setup_local_videos(mocker, tmp_path, "fingerprint")
+    thread = mocker.patch("app.utils.threading.Thread")
+    utils.index_library_fingerprints()
+    (tmp_path / "copy.mp4").write_bytes(b"oop video")
+    assert utils.add_local_video("copy.mp4", "Copy") == "oop.mp4"
+    assert thread.call_args.kwargs["target"] is utils.verify_duplicate
+    (tmp_path / "new.mp4").write_bytes(b"new video")
+    assert utils.add_local_video("new.mp4", "New") == "new.mp4"
+    # New videos are added straight away and fully hashed in the background
+    assert add_video.call_args.args[2] is None
+    assert thread.call_args.kwargs["target"] is utils.set_video_hash
+
+
+def test_set_video_hash(mocker, tmp_path):
+    setup_local_videos(mocker, tmp_path, "fingerprint")
+    mocker.patch("app.utils.get_thumbnail_store").return_value.name.side_effect = lambda video_hash: video_hash
+    build_keyframe_index = mocker.patch("app.utils.build_keyframe_index")
+    on_hashed = mocker.Mock()
+    (tmp_path / "new.mp4").write_bytes(b"new video")
+    utils.get_user_data_store().add_video({"video_hash": None, "filename": "new.mp4", "alias": "New",
+                                           "thumbnail": "thumbnails/", "video_length": 10, "progress": 0,
+                                           "captures": []})
+    utils.set_video_hash("new.mp4", on_hashed)
+    video_hash = utils.hash_string("new video")
+    assert utils.get_video_hash("new.mp4") == video_hash
+    assert utils.get_user_data_store().get_video("new.mp4")["thumbnail"] == f"thumbnails/{video_hash}"
+    build_keyframe_index.assert_called_once_with(video_hash, "new.mp4")
+    on_hashed.assert_called_once_with("new.mp4")
+
+
+def test_verify_duplicate(mocker, tmp_path):
+    add_video = setup_local_videos(mocker, tmp_path, "fingerprint")
+    (tmp_path / "copy.mp4").write_bytes(b"oop video")
+    utils.verify_duplicate("copy.mp4", "oop.mp4", "Copy", None, None, "fingerprint")
+    assert not (tmp_path / "copy.mp4").exists()
+    (tmp_path / "other.mp4").write_bytes(b"other video")
+    utils.verify_duplicate("other.mp4", "oop.mp4", "Other", None, None, "fingerprint")
+    add_video.assert_called_once_with("other.mp4", "Other", utils.hash_string("other video"), youtube_url=None,
+                                      fingerprint="fingerprint")
+
+
+def test_get_server_settings(mocker):
+    server_config = {"workers": "0", "threads": "16", "log_level": "warning"}
+    mocker.patch("app.utils.config", side_effect=lambda section, option, fallback: server_config.get(option, fallback))
+    settings = utils.get_server_settings()
+    assert settings["workers"] == 1
+    assert settings["threads"] == 16
+    assert settings["port"] == 5000
+    assert settings["log_level"] == "WARNING"
+
+
+def test_verify_video_file(mocker, tmp_path):
+    setup_local_videos(mocker, tmp_path, "full")
+    mocker.patch("app.utils.served_fingerprints", FingerprintCache())
+    assert utils.verify_video_file("oop.mp4")
+    assert utils.fingerprint_index.get("oop.mp4") == fingerprint_file(tmp_path / "oop.mp4")
+    (tmp_path / "oop.mp4").write_bytes(b"changed video")
+    assert not utils.verify_video_file("oop.mp4")
@@ -0,0 +1,124 @@
+"""
+This module contains the unit tests for the video decoder pool defined in app/video_capture_pool.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import threading
+
+import pytest
+
+from app.video_capture_pool import VideoCapturePool
+
+
+class FakeCapture:
+    """
+    Stand in for cv2.VideoCapture that records whether it was released
+    """
+
+    def __init__(self, video_path: str, opened: bool = True):
+        self.video_path = video_path
+        self.opened = opened
+        self.released = False
+
+    def isOpened(self):
+        return self.opened
+
+    def release(self):
+        self.released = True
+
+
+def create_pool(max_size: int = 2, idle_timeout: float = 300.0, opened: bool = True):
+    """
+    Create a pool using fake captures
+    :return: Tuple of pool and list of every capture opened
+    """
+    opened_captures = []
+
+    def opener(video_path):
+        capture = FakeCapture(video_path, opened)
+        opened_captures.append(capture)
+        return capture
+    return VideoCapturePool(max_size=max_size, idle_timeout=idle_timeout, opener=opener), opened_captures
+
+
+def test_pool_reuses_handles():
+    pool, opened_captures = create_pool()
+    with pool.acquire("a.mp4") as first:
+        pass
+    with pool.acquire("a.mp4") as second:
+        pass
+    assert first is second
+    assert len(opened_captures) == 1
+    assert pool.stats() == {"hits": 1, "misses": 1, "idle": 1}
+
+
+def test_pool_counts_concurrent_leases():
+    pool, _ = create_pool(max_size=4)
+
+    def lease():
+        for _ in range(500):
+            with pool.acquire("a.mp4"):
+                pass
+
+    threads = [threading.Thread(target=lease) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pool.stats()
+    assert stats["hits"] + stats["misses"] == 8 * 500
+
+
+def test_pool_never_shares_leased_handle():
+    pool, opened_captures = create_pool()
+    with pool.acquire("a.mp4") as first:
+        with pool.acquire("a.mp4") as second:
+            assert first is not second
+    assert len(opened_captures) == 2
+
+
+def test_pool_evicts_least_recently_used():
+    pool, opened_captures = create_pool(max_size=2)
+    for video_path in ["a.mp4", "b.mp4", "c.mp4"]:
+        with pool.acquire(video_path):
+            pass
+    assert [capture.released for capture in opened_captures] == [True, False, False]
+
+
+def test_pool_releases_idle_handles_after_timeout():
+    pool, opened_captures = create_pool(idle_timeout=-1)
+    with pool.acquire("a.mp4"):
+        pass
+    with pool.acquire("b.mp4"):
+        pass
+    assert opened_captures[0].released
+
+
+def test_pool_releases_unopened_capture():
+    pool, opened_captures = create_pool(opened=False)
+    with pool.acquire("missing.mp4") as capture:
+        assert capture is None
+    assert opened_captures[0].released
+    assert pool.stats()["idle"] == 0
+
+
+def test_pool_releases_handle_on_error():
+    pool, opened_captures = create_pool()
+    with pytest.raises(ValueError):
+        with pool.acquire("a.mp4"):
+            raise ValueError()
+    assert opened_captures[0].released
+    assert pool.stats()["idle"] == 0
+
+
+def test_pool_discard_and_close():
+    pool, opened_captures = create_pool()
+    for video_path in ["a.mp4", "b.mp4"]:
+        with pool.acquire(video_path):
+            pass
+    pool.discard("a.mp4")
+    assert opened_captures[0].released and not opened_captures[1].released
+    pool.close()
+    assert opened_captures[1].released
@@ -0,0 +1,53 @@
+"""
+This module contains the unit tests for the content fingerprints defined in app/video_fingerprint.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import os
+
+from app.video_fingerprint import FingerprintIndex, fingerprint_file
+
+
+def write_file(path, content: bytes):
+    path.write_bytes(content)
+    return path
+
+
+def test_fingerprint_samples_large_files(tmp_path):
+    content = bytearray(os.urandom(2_000_000))
+    fingerprint = fingerprint_file(write_file(tmp_path / "video.mp4", content), sample_blocks=4, block_size=1000)
+    assert fingerprint == fingerprint_file(write_file(tmp_path / "copy.mp4", content), sample_blocks=4,
+                                           block_size=1000)
+    # Changes to the head, tail or size change the fingerprint
+    for changed in (b"x" + content[1:], content[:-1] + b"x", content + b"x"):
+        assert fingerprint_file(write_file(tmp_path / "changed.mp4", changed), sample_blocks=4,
+                                block_size=1000) != fingerprint
+    # Bytes between sampled blocks are not read
+    content[1500] ^= 0xFF
+    assert fingerprint_file(write_file(tmp_path / "changed.mp4", content), sample_blocks=4,
+                            block_size=1000) == fingerprint
+
+
+def test_fingerprint_reads_small_files_whole(tmp_path):
+    content = bytearray(os.urandom(5000))
+    fingerprint = fingerprint_file(write_file(tmp_path / "video.mp4", content), sample_blocks=4, block_size=1000)
+    content[1500] ^= 0xFF
+    assert fingerprint_file(write_file(tmp_path / "video.mp4", content), sample_blocks=4,
+                            block_size=1000) != fingerprint
+
+
+def test_fingerprint_index(tmp_path):
+    index = FingerprintIndex(tmp_path / "fingerprints.json")
+    index.add("a.mp4", "fingerprint_1")
+    index.add("b.mp4", "fingerprint_1")
+    index.add("c.mp4", "fingerprint_2")
+    assert index.lookup("fingerprint_1") == ["a.mp4", "b.mp4"]
+    assert index.lookup("missing") == []
+    index.remove("a.mp4")
+    index.add("c.mp4", "fingerprint_3")
+    reloaded_index = FingerprintIndex(tmp_path / "fingerprints.json")
+    assert reloaded_index.lookup("fingerprint_1") == ["b.mp4"]
+    assert reloaded_index.lookup("fingerprint_2") == []
+    assert reloaded_index.get("c.mp4") == "fingerprint_3"
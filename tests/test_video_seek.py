@@ -0,0 +1,119 @@
+"""
+This module contains the unit tests for the keyframe index and seek functions defined in app/video_seek.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import cv2
+import numpy as np
+import pytest
+
+from app import video_seek
+from app.video_seek import KeyframeIndexStore, nearest_keyframe, seek_frame, seek_frames
+
+
+@pytest.fixture
+def sample_video(tmp_path):
+    """
+    Write a short video where every frame is different and return its path and sequentially decoded frames
+    """
+    video_path = str(tmp_path / "sample.mp4")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 64))
+    for index in range(60):
+        frame = np.zeros((64, 64, 3), np.uint8)
+        cv2.putText(frame, str(index), (5, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return video_path, frames
+
+
+def test_nearest_keyframe():
+    keyframes = [0.0, 2.0, 4.0]
+    assert nearest_keyframe(keyframes, 0.5) == 0.0
+    assert nearest_keyframe(keyframes, 2.0) == 2.0
+    assert nearest_keyframe(keyframes, 3.9) == 2.0
+    assert nearest_keyframe(keyframes, 10) == 4.0
+
+
+def test_seek_frame_matches_sequential_decode(sample_video):
+    video_path, frames = sample_video
+    capture = cv2.VideoCapture(video_path)
+    for timestamp in [4.0, 4.5, 1.0, 5.5]:
+        assert np.array_equal(seek_frame(capture, timestamp, [0.0]), frames[int(timestamp * 10)])
+    capture.release()
+
+
+class SeekCountingCapture:
+    """
+    Wraps cv2.VideoCapture and counts calls to set()
+    """
+
+    def __init__(self, video_path: str):
+        self.capture = cv2.VideoCapture(video_path)
+        self.seeks = 0
+
+    def set(self, *args):
+        self.seeks += 1
+        return self.capture.set(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.capture, name)
+
+
+def test_seek_frame_without_index_decodes_forward(sample_video):
+    video_path, frames = sample_video
+    capture = SeekCountingCapture(video_path)
+    assert np.array_equal(seek_frame(capture, 1.0), frames[10])
+    assert np.array_equal(seek_frame(capture, 2.0), frames[20])
+    assert capture.seeks == 0
+    assert np.array_equal(seek_frame(capture, 5.0), frames[50])
+    assert capture.seeks == 1
+    capture.release()
+
+
+def test_seek_frames_in_one_pass(sample_video):
+    video_path, frames = sample_video
+    capture = SeekCountingCapture(video_path)
+    read = list(seek_frames(capture, [1.5, 0.5, 1.0, 1.02, 2.5]))
+    assert [timestamp for timestamp, _ in read] == [0.5, 1.0, 1.02, 1.5, 2.5]
+    for timestamp, frame in read:
+        assert np.array_equal(frame, frames[int(timestamp * 10)])
+    assert capture.seeks == 0
+    capture.release()
+
+
+def test_seek_frame_past_end(sample_video):
+    video_path, _ = sample_video
+    capture = cv2.VideoCapture(video_path)
+    assert seek_frame(capture, 100.0, [0.0]) is None
+    capture.release()
+
+
+def test_build_keyframe_index_without_ffprobe(mocker):
+    mocker.patch("app.video_seek.shutil.which", return_value=None)
+    assert video_seek.build_keyframe_index("video.mp4") is None
+
+
+def test_build_keyframe_index_parses_ffprobe_output(mocker):
+    mocker.patch("app.video_seek.shutil.which", return_value="/usr/bin/ffprobe")
+    mocker.patch("app.video_seek.subprocess.run",
+                 return_value=mocker.Mock(stdout="0.000000,K__\n0.040000,___\n2.000000,K__\nN/A,K__\n"))
+    assert video_seek.build_keyframe_index("video.mp4") == [0.0, 2.0]
+
+
+def test_keyframe_index_store_round_trip(tmp_path):
+    KeyframeIndexStore(tmp_path).save("abc", [0.0, 2.0])
+    store = KeyframeIndexStore(tmp_path)
+    assert store.get("abc") == [0.0, 2.0]
+    store.delete("abc")
+    assert store.get("abc") is None
+    assert KeyframeIndexStore(tmp_path).get("missing") is None
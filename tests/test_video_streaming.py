@@ -0,0 +1,99 @@
+"""
+This module contains the unit tests for serving videos with byte ranges defined in app/video_streaming.py.
+
+Usage:
+Run these tests using the pytest framework from the root of the project directory:
+    $ pytest
+"""
+import io
+import os
+
+import pytest
+from flask import Flask, request
+
+from app.video_fingerprint import FingerprintCache
+from app.video_streaming import file_body, send_video
+
+VIDEO_BYTES = os.urandom(100_000)
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "video.mp4").write_bytes(VIDEO_BYTES)
+    app = Flask(__name__)
+
+    @app.route("/videos/<name>", methods=["GET", "HEAD"])
+    def videos(name):
+        return send_video(request, str(tmp_path / name), etag="video_hash", max_age=60, block_size=4096)
+
+    return app.test_client()
+
+
+def test_full_video(client):
+    response = client.get("/videos/video.mp4")
+    assert response.status_code == 200
+    assert response.data == VIDEO_BYTES
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["ETag"] == '"video_hash"'
+    assert response.headers["Cache-Control"] == "private, max-age=60"
+    assert response.mimetype == "video/mp4"
+
+
+def test_range_requests(client):
+    response = client.get("/videos/video.mp4", headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.data == VIDEO_BYTES[1000:2000]
+    assert response.headers["Content-Range"] == f"bytes 1000-1999/{len(VIDEO_BYTES)}"
+    assert response.content_length == 1000
+    assert client.get("/videos/video.mp4", headers={"Range": "bytes=99000-"}).data == VIDEO_BYTES[99000:]
+    assert client.get("/videos/video.mp4", headers={"Range": "bytes=-500"}).data == VIDEO_BYTES[-500:]
+    response = client.get("/videos/video.mp4", headers={"Range": "bytes=200000-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(VIDEO_BYTES)}"
+    # Multiple ranges are answered with the whole video
+    response = client.get("/videos/video.mp4", headers={"Range": "bytes=0-9,20-29"})
+    assert response.status_code == 200
+    assert response.data == VIDEO_BYTES
+
+
+def test_conditional_requests(client):
+    response = client.get("/videos/video.mp4", headers={"If-None-Match": '"video_hash"'})
+    assert response.status_code == 304
+    assert response.data == b""
+    response = client.get("/videos/video.mp4", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    response = client.get("/videos/video.mp4", headers={"If-Modified-Since": response.headers["Last-Modified"]})
+    assert response.status_code == 304
+    # A range of a cached copy that changed is answered with the whole video
+    response = client.get("/videos/video.mp4", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    response = client.get("/videos/video.mp4", headers={"Range": "bytes=0-9", "If-Range": '"video_hash"'})
+    assert response.status_code == 206
+
+
+def test_head_request(client):
+    response = client.head("/videos/video.mp4", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content_length == 10
+    assert response.data == b""
+
+
+def test_file_body_uses_server_file_wrapper():
+    file = io.BytesIO(VIDEO_BYTES)
+    file.seek(10)
+    assert file_body({"wsgi.file_wrapper": lambda wrapped, block_size: ("wrapped", wrapped)}, file, 5) == \
+        ("wrapped", file)
+    assert b"".join(file_body({}, file, 5, block_size=2)) == VIDEO_BYTES[10:15]
+    assert file.closed
+
+
+def test_fingerprint_cache(tmp_path, mocker):
+    video_path = tmp_path / "video.mp4"
+    video_path.write_bytes(VIDEO_BYTES)
+    cache = FingerprintCache()
+    fingerprint_file = mocker.patch("app.video_fingerprint.fingerprint_file", side_effect=["first", "second"])
+    assert cache.fingerprint(video_path) == "first"
+    assert cache.fingerprint(video_path) == "first"
+    os.utime(video_path, ns=(0, 0))
+    assert cache.fingerprint(video_path) == "second"
+    assert fingerprint_file.call_count == 2
@@ -1,5 +1,6 @@
 from app import web_cli
-from tests.test_utils import load_dummy_user_data
+from app.user_data_store import UserDataStore
+from tests.test_utils import load_dummy_user_data_store
 
 
 def test_parse_command_cls():
@@ -71,7 +72,7 @@ def test_parse_command_invalid_command():
 
 
 def test_available_videos(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     available_videos = web_cli.available_videos()
     assert available_videos[0] == "oop.mp4"
     assert available_videos[1] == "loops.mp4"
@@ -79,12 +80,12 @@ def test_available_videos(mocker):
 
 
 def test_available_videos_none(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=None)
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
     assert web_cli.available_videos() == {}
 
 
 def test_list_videos(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=load_dummy_user_data())
+    mocker.patch("app.utils.get_user_data_store", return_value=load_dummy_user_data_store())
     list_videos = web_cli.list_videos()
     assert "oop.mp4" in list_videos
     assert "loops.mp4" in list_videos
@@ -92,5 +93,34 @@ def test_list_videos(mocker):
 
 
 def test_list_videos_empty(mocker):
-    mocker.patch("app.utils.read_user_data", return_value=None)
+    mocker.patch("app.utils.get_user_data_store", return_value=UserDataStore.from_data(None))
     assert web_cli.list_videos() == "<p class='text-red-500'>No videos found in your library.<p>"
+
+
+def test_parse_command_capture_range():
+    assert web_cli.parse_command("capture-range 1:30 2:00 5") == {"capture_range": {"start": 90, "end": 120, "step": 5}}
+    assert web_cli.parse_command("capture-range 10 20") == {"capture_range": {"start": 10, "end": 20, "step": 1}}
+
+
+def test_parse_command_capture_range_invalid():
+    assert "Invalid usage of capture-range" in web_cli.parse_command("capture-range")
+    assert "Invalid usage of capture-range" in web_cli.parse_command("capture-range 10")
+    assert "Invalid usage of capture-range" in web_cli.parse_command("capture-range 20 10")
+    assert "Invalid timestamp" in web_cli.parse_command("capture-range 10 abc")
+
+
+def test_parse_command_search_code(mocker):
+    search_code = mocker.patch("app.utils.search_code", return_value=[
+        {"filename": "loops.mp4", "timestamp": 12, "formatted_timestamp": "00:12", "score": 1.5,
+         "snippet": "for i in range(10):\n    <mark>print</mark>(i)", "url": "/play_video/loops.mp4?t=12"}])
+    response = web_cli.parse_command("search-code Print(i)")
+    search_code.assert_called_once_with("Print(i)")
+    assert "href=\"/play_video/loops.mp4?t=12\"" in response
+    assert "<mark>print</mark>(i)" in response
+
+
+def test_parse_command_search_code_no_hits(mocker):
+    mocker.patch("app.utils.search_code", return_value=[])
+    assert web_cli.parse_command("search-code <b>") == \
+           "<p class='text-red-500'>No captured code found matching \"&lt;b&gt;\".<p>"
+    assert "Invalid usage of search-code" in web_cli.parse_command("search-code")